@@ -0,0 +1,28 @@
+from datahub.ingestion.source.dbt.dbt_core import DBTCoreConfig
+from pydantic import Field
+
+
+class CadetDBTConfig(DBTCoreConfig):
+    prune_hidden_nodes: bool = Field(
+        description="""
+            Drop nodes that will never be displayed in the catalogue before
+            their schemas, test results and workunits are generated. Tests of
+            displayed nodes are kept, and the upstreams of displayed nodes are
+            kept as lineage stubs that aren't emitted themselves. With stateful
+            ingestion, previously ingested hidden nodes will be soft deleted.
+            """,
+        default=False,
+    )
+    skip_unchanged_nodes: bool = Field(
+        description="""
+            Only emit nodes that are new or have changed since the last run,
+            going by their checksum, manifest definition and catalog columns.
+            Unchanged nodes are still marked as seen for stale entity removal.
+            Needs stateful ingestion.
+            """,
+        default=False,
+    )
+    unchanged_nodes_max_age_days: float = Field(
+        description="Emit unchanged nodes again once they are this old",
+        default=7,
+    )
@@ -0,0 +1,132 @@
+import hashlib
+import json
+from typing import Dict, Optional
+
+from datahub.configuration.common import ConfigModel
+from datahub.ingestion.api.ingestion_job_checkpointing_provider_base import JobId
+from datahub.ingestion.source.state.checkpoint import Checkpoint, CheckpointStateBase
+from datahub.ingestion.source.state.use_case_handler import (
+    StatefulIngestionUsecaseHandlerBase,
+)
+from pydantic import Field
+
+# Manifest fields that change each time the project is parsed or compiled,
+# whether or not the node has changed
+VOLATILE_MANIFEST_FIELDS = {"created_at", "compiled", "compiled_code", "compiled_path"}
+
+
+def _digest(value) -> str:
+    content = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def node_fingerprint(node, manifest_node: Optional[dict]) -> str:
+    """
+    Identifies everything the dbt source emits about a node: its checksum,
+    which covers only its code, the rest of its manifest definition, such as
+    descriptions, tags and meta set in yaml, and its columns once merged
+    with the catalog
+    """
+    manifest_node = manifest_node or {}
+    return _digest(
+        [
+            manifest_node.get("checksum", {}).get("checksum"),
+            _digest(
+                {
+                    key: value
+                    for key, value in manifest_node.items()
+                    if key not in VOLATILE_MANIFEST_FIELDS
+                }
+            ),
+            _digest(
+                [
+                    (
+                        column.name,
+                        column.data_type,
+                        column.comment,
+                        column.description,
+                        column.index,
+                        column.meta,
+                        column.tags,
+                    )
+                    for column in node.columns
+                ]
+            ),
+            node.row_count,
+            node.size_in_bytes,
+        ]
+    )
+
+
+class NodeFingerprint(ConfigModel):
+    fingerprint: str
+    # seconds since the epoch
+    emitted_at: float
+
+
+class NodeFingerprintState(CheckpointStateBase):
+    # of the source config and transformers, which affect every node
+    config_hash: Optional[str] = None
+    nodes: Dict[str, NodeFingerprint] = Field(default_factory=dict)
+
+
+class NodeFingerprintHandler(StatefulIngestionUsecaseHandlerBase[NodeFingerprintState]):
+    """
+    Keeps the fingerprint of each dbt node emitted in the stateful ingestion
+    checkpoint, next to the state used for stale entity removal
+    """
+
+    def __init__(self, source, enabled: bool, pipeline_name: Optional[str], run_id):
+        self.state_provider = source.state_provider
+        self.pipeline_name = pipeline_name
+        self.run_id = run_id
+        self.checkpointing_enabled = bool(
+            enabled and self.state_provider.is_stateful_ingestion_configured()
+        )
+        self.state_provider.register_stateful_ingestion_usecase_handler(self)
+
+    @property
+    def job_id(self) -> JobId:
+        return JobId("cadet_dbt_node_fingerprints")
+
+    def is_checkpointing_enabled(self) -> bool:
+        return self.checkpointing_enabled
+
+    def create_checkpoint(self) -> Optional[Checkpoint[NodeFingerprintState]]:
+        if not self.is_checkpointing_enabled():
+            return None
+        assert self.pipeline_name is not None
+        return Checkpoint(
+            job_name=self.job_id,
+            pipeline_name=self.pipeline_name,
+            run_id=self.run_id,
+            state=NodeFingerprintState(),
+        )
+
+    def last_state(self) -> Optional[NodeFingerprintState]:
+        if not self.is_checkpointing_enabled():
+            return None
+        checkpoint = self.state_provider.get_last_checkpoint(
+            self.job_id, NodeFingerprintState
+        )
+        return checkpoint.state if checkpoint else None
+
+    def current_state(self) -> Optional[NodeFingerprintState]:
+        checkpoint = self.state_provider.get_current_checkpoint(self.job_id)
+        return checkpoint.state if checkpoint else None
+
+
+def recipe_hash(config, pipeline_config) -> str:
+    """
+    Of the source config and the transformers that run after it, leaving
+    out the run results, which change every run
+    """
+    transformers = pipeline_config.transformers if pipeline_config else None
+    return _digest(
+        [
+            config.model_dump(
+                mode="json", exclude={"run_results_paths", "stateful_ingestion"}
+            ),
+            [transformer.model_dump(mode="json") for transformer in transformers or []],
+        ]
+    )
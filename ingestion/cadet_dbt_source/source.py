@@ -1,48 +1,352 @@
 import logging
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set
 
 from datahub.ingestion.api.common import PipelineContext
 from datahub.ingestion.api.decorators import config_class
-from datahub.ingestion.source.dbt.dbt_core import DBTCoreConfig, DBTCoreSource
+from datahub.ingestion.api.source_helpers import auto_workunit
+from datahub.ingestion.api.workunit import MetadataWorkUnit
+from datahub.ingestion.source.aws.aws_common import AwsConnectionConfig
+from datahub.ingestion.source.aws.s3_util import is_s3_uri
+from datahub.ingestion.source.dbt.dbt_common import DBT_PLATFORM
+from datahub.ingestion.source.dbt.dbt_core import DBTCoreReport, DBTCoreSource
+from datahub.ingestion.source.state.entity_removal_state import GenericCheckpointState
+from datahub.utilities.urns.urn import guess_entity_type
 
-from ingestion.ingestion_utils import is_excluded_name
+from ingestion.cadet_dbt_source.config import CadetDBTConfig
+from ingestion.cadet_dbt_source.incremental import (
+    NodeFingerprint,
+    NodeFingerprintHandler,
+    node_fingerprint,
+    recipe_hash,
+)
+from ingestion.cadet_run_results import CONSOLIDATED_RUN_RESULTS_SUFFIX
+from ingestion.ingestion_utils import EXCLUDED_NAME_MATCHER, get_cadet_metadata_json
 
 logger = logging.getLogger(__name__)
 
 
-@config_class(DBTCoreConfig)
+@dataclass
+class CadetDBTSourceReport(DBTCoreReport):
+    hidden_nodes_pruned: int = 0
+    lineage_stubs: int = 0
+    changed_nodes: int = 0
+    unchanged_nodes_skipped: int = 0
+
+
+@config_class(CadetDBTConfig)
 class CadetDBTSource(DBTCoreSource):
-    def __init__(self, config: DBTCoreConfig, ctx: PipelineContext):
+    def __init__(self, config: CadetDBTConfig, ctx: PipelineContext):
         super().__init__(config, ctx)
+        self.config: CadetDBTConfig = config
+        self.report: CadetDBTSourceReport = CadetDBTSourceReport()
+        # run_results documents unpacked from consolidated files, by the
+        # path they are loaded with
+        self.run_results_documents: Dict[str, Dict] = {}
+        # dbt names of hidden nodes kept only so that the lineage of
+        # displayed nodes can be resolved, see _prune_hidden_nodes
+        self.lineage_stubs: Set[str] = set()
+        # dbt names of nodes that haven't changed since the last run, see
+        # _find_unchanged_nodes
+        self.unchanged_nodes: Set[str] = set()
+        # the raw manifest sources and nodes, kept from loading the manifest
+        # for _find_unchanged_nodes to fingerprint
+        self.manifest_nodes: Optional[Dict[str, Dict]] = None
+        self.fingerprint_handler = NodeFingerprintHandler(
+            self, config.skip_unchanged_nodes, ctx.pipeline_name, ctx.run_id
+        )
 
     @classmethod
     def create(cls, config_dict, ctx):
-        config = DBTCoreConfig.parse_obj(config_dict)
+        config = CadetDBTConfig.parse_obj(config_dict)
         return cls(config, ctx)
 
+    def load_file_as_json(
+        self, uri: str, aws_connection: Optional[AwsConnectionConfig]
+    ) -> Dict:
+        if uri in self.run_results_documents:
+            return self.run_results_documents.pop(uri)
+        if uri != self.config.manifest_path:
+            return DBTCoreSource.load_file_as_json(uri, aws_connection)
+
+        # The manifest is also loaded by our transformers, so share the on-disk
+        # copy. The parsed manifest is only needed once, so isn't kept.
+        if is_s3_uri(uri):
+            manifest = get_cadet_metadata_json(
+                uri,
+                s3=aws_connection.get_s3_client() if aws_connection else None,
+                memoize=False,
+            )
+        else:
+            manifest = DBTCoreSource.load_file_as_json(uri, aws_connection)
+        if self.config.skip_unchanged_nodes:
+            self.manifest_nodes = {
+                **manifest.get("sources", {}),
+                **manifest.get("nodes", {}),
+            }
+        return manifest
+
+    def _expand_run_results_paths(self) -> List[str]:
+        """
+        Unpack consolidated run results files, written by
+        consolidate_run_results, into a path for each document they hold
+        """
+        paths = []
+        for path in super()._expand_run_results_paths():
+            if not path.endswith(CONSOLIDATED_RUN_RESULTS_SUFFIX):
+                paths.append(path)
+                continue
+
+            consolidated = DBTCoreSource.load_file_as_json(
+                path, self.config.aws_connection
+            )
+            for index, document in enumerate(consolidated["run_results"]):
+                document_path = f"{path}#{index}"
+                self.run_results_documents[document_path] = document
+                paths.append(document_path)
+        return paths
+
     def loadManifestAndCatalog(self):
         nodes, *metadata = super().loadManifestAndCatalog()
 
         display_tag = f"{self.config.tag_prefix}dc_display_in_catalogue"
+        exclusions = EXCLUDED_NAME_MATCHER.match_nodes(
+            (
+                index,
+                {
+                    "dbt_name": node.dbt_name,
+                    "database": node.database,
+                    "schema": node.schema,
+                    "name": node.name,
+                    "alias": node.alias,
+                },
+            )
+            for index, node in enumerate(nodes)
+        )
+
+        removed: Counter = Counter()
+        for index, (field_name, pattern) in exclusions.items():
+            node = nodes[index]
+            if display_tag in node.tags:
+                node.tags = [tag for tag in node.tags if tag != display_tag]
+                removed[(field_name, pattern)] += 1
+                logger.debug(
+                    "Removing %s from dbt node %s because %s matched an excluded keyword: %s",
+                    display_tag,
+                    node.dbt_name,
+                    field_name,
+                    pattern,
+                )
+
+        if removed:
+            logger.info(
+                "Removed %s from %d dbt nodes matching excluded keywords: %s",
+                display_tag,
+                sum(removed.values()),
+                ", ".join(
+                    f"{field_name} matched {pattern!r} {count} times"
+                    for (field_name, pattern), count in removed.most_common()
+                ),
+            )
+
+        if self.config.prune_hidden_nodes:
+            nodes = self._prune_hidden_nodes(nodes, display_tag, set(exclusions))
+
+        if self.config.skip_unchanged_nodes:
+            self._find_unchanged_nodes(nodes)
+
+        return (nodes, *metadata)
+
+    def _prune_hidden_nodes(self, nodes, display_tag: str, excluded: Set[int]):
+        """
+        Drop nodes that will never be displayed, so that no schemas, test
+        results or workunits are generated for them. Seeds are displayed
+        unless excluded, as they are tagged by CreateCadetDatabases, and
+        tests are kept if they test a displayed node.
+
+        The upstreams of the nodes kept stay as lineage stubs, which are
+        filtered out before anything is emitted for them. Lineage passes
+        through ephemeral models, so their upstreams are stubs too.
+        """
+        nodes_by_name = {node.dbt_name: node for node in nodes}
+        kept = {
+            node.dbt_name
+            for index, node in enumerate(nodes)
+            if display_tag in node.tags
+            or (node.node_type == "seed" and index not in excluded)
+        }
+        kept.update(
+            [
+                node.dbt_name
+                for node in nodes
+                if node.node_type == "test"
+                and any(upstream in kept for upstream in node.upstream_nodes)
+            ]
+        )
+
+        stubs: Set[str] = set()
+        upstreams = [
+            upstream for name in kept for upstream in nodes_by_name[name].upstream_nodes
+        ]
+        while upstreams:
+            name = upstreams.pop()
+            if name in kept or name in stubs or name not in nodes_by_name:
+                continue
+            stubs.add(name)
+            stub = nodes_by_name[name]
+            if stub.is_ephemeral_model():
+                upstreams.extend(stub.upstream_nodes)
+            else:
+                stub.upstream_nodes = []
+
+        self.lineage_stubs = stubs
+        self.report.lineage_stubs = len(stubs)
+        self.report.hidden_nodes_pruned = len(nodes) - len(kept) - len(stubs)
+        logger.info(
+            "Pruned %d dbt nodes that won't be displayed, keeping %d as lineage stubs",
+            self.report.hidden_nodes_pruned,
+            len(stubs),
+        )
+        kept |= stubs
+        return [node for node in nodes if node.dbt_name in kept]
+
+    def _is_allowed_node(self, node) -> bool:
+        if node.dbt_name in self.lineage_stubs:
+            return False
+        return super()._is_allowed_node(node)
+
+    def _find_unchanged_nodes(self, nodes) -> None:
+        """
+        Compare each node with its fingerprint from the last run, see
+        node_fingerprint, and keep the fingerprints for the next run.
+
+        Tests are always emitted, with their new results, as are nodes
+        missing from the catalog, whose columns are inferred from their
+        upstreams. Every node is emitted if the recipe has changed, and
+        unchanged nodes are emitted again once unchanged_nodes_max_age_days
+        have passed since they last were.
+        """
+        current = self.fingerprint_handler.current_state()
+        if current is None:
+            logger.warning(
+                "skip_unchanged_nodes needs stateful ingestion, emitting every node"
+            )
+            return
+        last = self.fingerprint_handler.last_state()
+        current.config_hash = recipe_hash(self.config, self.ctx.pipeline_config)
+        if last and last.config_hash != current.config_hash:
+            logger.info(
+                "The recipe has changed since the last run, emitting every node"
+            )
+            last = None
+
+        if self.manifest_nodes is None:
+            self.load_file_as_json(self.config.manifest_path, self.config.aws_connection)
+        manifest_nodes, self.manifest_nodes = self.manifest_nodes, None
+        now = time.time()
+        max_age = self.config.unchanged_nodes_max_age_days * 24 * 60 * 60
         for node in nodes:
-            excluded_values = {
-                "dbt_name": node.dbt_name,
-                "database": node.database,
-                "schema": node.schema,
-                "name": node.name,
-                "alias": node.alias,
-            }
+            if (
+                node.node_type == "test"
+                or node.missing_from_catalog
+                or node.dbt_name in self.lineage_stubs
+            ):
+                continue
+            fingerprint = node_fingerprint(node, manifest_nodes.get(node.dbt_name))
+            previous = last.nodes.get(node.dbt_name) if last else None
+            if (
+                previous
+                and previous.fingerprint == fingerprint
+                and now - previous.emitted_at < max_age
+            ):
+                self.unchanged_nodes.add(node.dbt_name)
+                current.nodes[node.dbt_name] = previous
+            else:
+                current.nodes[node.dbt_name] = NodeFingerprint(
+                    fingerprint=fingerprint, emitted_at=now
+                )
+
+        self.report.unchanged_nodes_skipped = len(self.unchanged_nodes)
+        self.report.changed_nodes = len(current.nodes) - len(self.unchanged_nodes)
+        logger.info(
+            "%d dbt nodes are new or have changed since the last run, skipping %d",
+            self.report.changed_nodes,
+            self.report.unchanged_nodes_skipped,
+        )
+
+    def _mark_unchanged_nodes_seen(self, nodes) -> None:
+        """
+        Add the datasets of unchanged nodes to the stale entity removal
+        state, as they would have been if the nodes were emitted. Entities
+        that are emitted alongside nodes, like tags, can't be traced back to
+        a node, so all of those from the last run are kept.
+        """
+        last = self.state_provider.get_last_checkpoint(
+            self.stale_entity_removal_handler.job_id, GenericCheckpointState
+        )
+        if last is None or not nodes:
+            return
+        last_urns = set(last.state.urns)
+        for node in nodes:
+            for urn in (
+                node.get_urn(
+                    DBT_PLATFORM, self.config.env, self.config.platform_instance
+                ),
+                node.get_urn(
+                    self.config.target_platform,
+                    self.config.env,
+                    self.config.target_platform_instance,
+                ),
+            ):
+                if urn in last_urns:
+                    self.stale_entity_removal_handler.add_entity_to_state(
+                        "dataset", urn
+                    )
+        for urn in last_urns:
+            entity_type = guess_entity_type(urn)
+            if entity_type not in ("dataset", "assertion"):
+                self.stale_entity_removal_handler.add_entity_to_state(entity_type, urn)
+
+    def create_dbt_platform_mces(
+        self, dbt_nodes, additional_custom_props_filtered, all_nodes_map
+    ) -> Iterable[MetadataWorkUnit]:
+        changed = [
+            node for node in dbt_nodes if node.dbt_name not in self.unchanged_nodes
+        ]
+        unchanged = [
+            node for node in dbt_nodes if node.dbt_name in self.unchanged_nodes
+        ]
+        yield from super().create_dbt_platform_mces(
+            changed, additional_custom_props_filtered, all_nodes_map
+        )
+        self._mark_unchanged_nodes_seen(unchanged)
 
-            for field_name, value in excluded_values.items():
-                if is_excluded_name(value):
-                    if display_tag in node.tags:
-                        node.tags = [tag for tag in node.tags if tag != display_tag]
-                        logger.info(
-                            "Removing %s from dbt node %s because %s matched an excluded keyword: %s",
-                            display_tag,
-                            node.dbt_name,
-                            field_name,
-                            value,
+        # runs of unchanged models are still new
+        if self.config.entities_enabled.can_emit_model_performance:
+            for node in unchanged:
+                if node.model_performances:
+                    yield from auto_workunit(
+                        self._create_dataprocess_instance_mcps(
+                            node,
+                            self._create_lineage_aspect_for_dbt_node(
+                                node, all_nodes_map
+                            ),
                         )
-                    break
+                    )
+
+    def create_target_platform_mces(self, dbt_nodes) -> Iterable[MetadataWorkUnit]:
+        return super().create_target_platform_mces(
+            [node for node in dbt_nodes if node.dbt_name not in self.unchanged_nodes]
+        )
 
-        return (nodes, *metadata)
\ No newline at end of file
+    def close(self) -> None:
+        # A failed run keeps the fingerprints of the last run, so that nodes
+        # that failed to be emitted are tried again
+        current = self.fingerprint_handler.current_state()
+        if current is not None and self.report.failures:
+            last = self.fingerprint_handler.last_state()
+            current.config_hash = last.config_hash if last else None
+            current.nodes = dict(last.nodes) if last else {}
+        super().close()
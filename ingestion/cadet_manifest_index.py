@@ -0,0 +1,248 @@
+import json
+import logging
+import struct
+from dataclasses import astuple, dataclass
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+import boto3
+
+from ingestion import urns
+from ingestion.config import ENV, INSTANCE, PLATFORM
+from ingestion.ingestion_utils import (
+    STREAMING_JSON_DECODER,
+    FqnValidationSummary,
+    decode_json,
+    ensure_metadata_cache_dir,
+    get_cadet_manifest_nodes,
+    get_s3_etag,
+    get_tags,
+    metadata_cache_path,
+    metadata_cache_writer,
+    parse_database_and_table_names,
+    should_display_dbt_manifest_node,
+)
+from ingestion.utils import report_time
+
+# Only these resource types are created as tables in the catalogue
+INDEXED_RESOURCE_TYPES = ("model", "seed")
+
+# Snapshots start with a magic string and a format version, which must be
+# bumped whenever CadetManifestEntry changes. The rest is JSON, so that loading
+# a snapshot can never run code.
+SNAPSHOT_MAGIC = b"CADETIDX"
+SNAPSHOT_FORMAT_VERSION = 3
+SNAPSHOT_HEADER = struct.Struct(f"<{len(SNAPSHOT_MAGIC)}sH")
+SNAPSHOT_EXTENSION = ".index"
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file can't be used"""
+
+
+@dataclass(frozen=True)
+class CadetManifestEntry:
+    """
+    Everything the catalogue needs to know about a single CaDeT model or seed
+    """
+
+    unique_id: str
+    resource_type: str
+    # Glue database and table names
+    database: str
+    table: str
+    dataset_urn: str
+    database_urn: str
+    domain: str
+    # whether the node passes the excluded name checks
+    display: bool
+    # tags to assign in datahub, see get_tags
+    tags: frozenset[str]
+
+
+class CadetManifestIndex:
+    """
+    Models and seeds from a CaDeT dbt manifest, validated and resolved to
+    datahub urns in a single pass, with lookups by dataset urn, database
+    and domain.
+    """
+
+    def __init__(
+        self,
+        entries: Iterable[CadetManifestEntry],
+        fqn_summary: Optional[FqnValidationSummary] = None,
+    ):
+        # names of the models and seeds that were skipped or look suspicious
+        self.fqn_summary = fqn_summary or FqnValidationSummary()
+        self.entries: List[CadetManifestEntry] = []
+        self.by_urn: Dict[str, CadetManifestEntry] = {}
+        self.by_database: Dict[str, List[CadetManifestEntry]] = {}
+        self.by_domain: Dict[str, List[CadetManifestEntry]] = {}
+
+        for entry in entries:
+            self.entries.append(entry)
+            self.by_urn[entry.dataset_urn] = entry
+            self.by_database.setdefault(entry.database, []).append(entry)
+            self.by_domain.setdefault(entry.domain, []).append(entry)
+
+    @classmethod
+    @report_time
+    def from_manifest(cls, manifest: dict) -> "CadetManifestIndex":
+        """
+        Build the index from a dbt manifest. Tables must be named
+        {database}__{table} like create a derived table, other nodes are skipped.
+
+        dbt unique ids start with the resource type, so other nodes are
+        skipped without being looked at.
+
+        Invalid names are collected in fqn_summary and logged once at the end,
+        rather than a warning per node.
+        """
+        fqn_summary = FqnValidationSummary()
+        entries = []
+        nodes = manifest["nodes"]
+        for unique_id in nodes:
+            if unique_id.split(".", 1)[0] not in INDEXED_RESOURCE_TYPES:
+                continue
+
+            node = nodes[unique_id]
+            if node["resource_type"] not in INDEXED_RESOURCE_TYPES:
+                continue
+
+            # fqn = fully qualified name
+            fqn = node["fqn"]
+            if not fqn_summary.validate(fqn):
+                continue
+
+            database, table = parse_database_and_table_names(node)
+
+            entries.append(
+                CadetManifestEntry(
+                    unique_id=unique_id,
+                    resource_type=node["resource_type"],
+                    database=database,
+                    table=table,
+                    dataset_urn=urns.dataset_urn(f"{database}.{table}"),
+                    database_urn=urns.database_urn(database),
+                    domain=fqn[1],
+                    display=should_display_dbt_manifest_node(node),
+                    tags=frozenset(get_tags(node)),
+                )
+            )
+
+        fqn_summary.log()
+        return cls(entries, fqn_summary)
+
+    def write_snapshot(self, snapshot_file: BinaryIO):
+        """
+        Write the index as a versioned snapshot. The urns depend on the
+        platform instance, so that is recorded and checked when loading.
+        """
+        snapshot_file.write(
+            SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION)
+        )
+        rows = [astuple(entry)[:-1] + (sorted(entry.tags),) for entry in self]
+        payload = {
+            "urn_config": [PLATFORM, INSTANCE, ENV],
+            "rows": rows,
+            "fqn_summary": [self.fqn_summary.checked, self.fqn_summary.problems],
+        }
+        snapshot_file.write(json.dumps(payload).encode("utf-8"))
+
+    @classmethod
+    @report_time
+    def load_snapshot(cls, path: str) -> "CadetManifestIndex":
+        """Load an index from a file written by write_snapshot"""
+        with open(path, "rb") as snapshot_file:
+            content = snapshot_file.read()
+
+        if len(content) < SNAPSHOT_HEADER.size:
+            raise SnapshotError(f"{path} is truncated")
+        magic, version = SNAPSHOT_HEADER.unpack_from(content)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_FORMAT_VERSION:
+            raise SnapshotError(
+                f"{path} is not a version {SNAPSHOT_FORMAT_VERSION} snapshot"
+            )
+
+        try:
+            payload = decode_json(content[SNAPSHOT_HEADER.size :])
+            urn_config = tuple(payload["urn_config"])
+            checked, problems = payload["fqn_summary"]
+            entries = [
+                CadetManifestEntry(*row[:-1], tags=frozenset(row[-1]))
+                for row in payload["rows"]
+            ]
+        except (ValueError, TypeError, KeyError) as e:
+            raise SnapshotError(f"{path} is not a valid snapshot: {e}") from e
+
+        if urn_config != (PLATFORM, INSTANCE, ENV):
+            raise SnapshotError(f"{path} was built for {urn_config}")
+
+        return cls(entries, FqnValidationSummary(checked, problems))
+
+    def __iter__(self) -> Iterator[CadetManifestEntry]:
+        return iter(self.entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, dataset_urn: str) -> Optional[CadetManifestEntry]:
+        return self.by_urn.get(dataset_urn)
+
+    def for_database(self, database: str) -> List[CadetManifestEntry]:
+        return self.by_database.get(database, [])
+
+    def for_domain(self, domain: str) -> List[CadetManifestEntry]:
+        return self.by_domain.get(domain, [])
+
+    def of_type(self, resource_type: str) -> List[CadetManifestEntry]:
+        return [entry for entry in self.entries if entry.resource_type == resource_type]
+
+
+# The latest index loaded for each manifest uri, along with the manifest etag,
+# so that all consumers in a process share one index.
+_index_memo: Dict[str, tuple[str, CadetManifestIndex]] = {}
+
+
+def clear_index_memo() -> None:
+    """Forget all indexes loaded by this process"""
+    _index_memo.clear()
+
+
+def get_cadet_manifest_index(
+    s3_uri: str, decoder: str = STREAMING_JSON_DECODER
+) -> CadetManifestIndex:
+    """
+    Returns the index for the manifest at the given s3 path. If the manifest
+    needs to be read, it's read with the given decoder, see get_cadet_manifest_nodes.
+
+    The index is only built once per version of the manifest. It's shared
+    within a process, and also written to a snapshot in the metadata cache
+    directory so that later steps of the workflow can load it without
+    downloading the manifest again.
+    """
+    etag = get_s3_etag(boto3.client("s3"), s3_uri)
+    memoized = _index_memo.get(s3_uri)
+    if memoized and memoized[0] == etag:
+        return memoized[1]
+
+    index = None
+    snapshot_path = metadata_cache_path(s3_uri, etag, SNAPSHOT_EXTENSION)
+    try:
+        ensure_metadata_cache_dir()
+        index = CadetManifestIndex.load_snapshot(snapshot_path)
+        logging.info(f"Loaded manifest index snapshot for {s3_uri} ({etag=})")
+    except FileNotFoundError:
+        pass
+    except (SnapshotError, OSError) as e:
+        logging.warning(f"Ignoring unusable manifest index snapshot: {e}")
+
+    if index is None:
+        index = CadetManifestIndex.from_manifest(
+            get_cadet_manifest_nodes(s3_uri, decoder)
+        )
+        with metadata_cache_writer(s3_uri, etag, SNAPSHOT_EXTENSION) as snapshot_file:
+            if snapshot_file:
+                index.write_snapshot(snapshot_file)
+
+    _index_memo[s3_uri] = (etag, index)
+    return index
@@ -1,32 +1,124 @@
+import argparse
+import json
+import logging
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import unquote_plus
 
 import boto3
 import yaml
+from botocore.exceptions import ClientError
 
+RUN_ARTEFACTS_PREFIX = "prod/run_artefacts/"
 
-def inject_run_result_paths_into_yaml_template(yaml_path):
+# Ways of finding run_results.json files, see get_cadet_run_result_paths
+FULL_DISCOVERY = "full"
+PRUNED_DISCOVERY = "pruned"
+
+# Consolidated run results files must be named like this, so that
+# CadetDBTSource knows to unpack them, see consolidate_run_results
+CONSOLIDATED_RUN_RESULTS_SUFFIX = "run_results.consolidated.json"
+
+# A date in a directory name, like 2024-05-14, 20240514 or
+# run_time=2024-05-14T02:00:00, that isn't part of a longer number
+EMBEDDED_DATE = re.compile(r"(?<!\d)(\d{4})-?(\d{2})-?(\d{2})(?!\d)")
+
+
+def inject_run_result_paths_into_yaml_template(
+    yaml_path, consolidate_to=None, **kwargs
+):
     with open(yaml_path) as f:
         template = yaml.safe_load(f)
 
-    template["source"]["config"]["run_results_paths"] = get_cadet_run_result_paths()
+    run_results_paths = get_cadet_run_result_paths(**kwargs)
+    if consolidate_to and run_results_paths:
+        run_results_paths = [
+            consolidate_run_results(
+                run_results_paths, consolidate_to, kwargs.get("s3_client")
+            )
+        ]
+    template["source"]["config"]["run_results_paths"] = run_results_paths
 
     # Overwite the original file with updated the run results paths.
     with open(yaml_path, "w") as f:
         yaml.dump(template, f, indent=2, sort_keys=False, default_flow_style=False)
 
 
-def get_cadet_run_result_paths(bucket_name="mojap-derived-tables", days=1):
+def is_wanted_run_result(key: str, last_modified: datetime, since: datetime) -> bool:
+    return (
+        key.endswith("run_results.json")
+        and "deploy-docs" not in key
+        and last_modified >= since
+    )
+
+
+def get_cadet_run_result_paths(
+    bucket_name="mojap-derived-tables",
+    days=1,
+    discovery=FULL_DISCOVERY,
+    s3_client=None,
+    date_margin=timedelta(days=1),
+    max_workers=16,
+    cursor_location=None,
+    full=False,
+    event_index=None,
+    event_source=None,
+):
     """
     Find all keys in an S3 bucket that have a 'run_results.json' file.
     for last given amount of days
+
+    The full discovery lists every artefact ever uploaded. The pruned
+    discovery gives the same result by walking the run directories instead,
+    and skipping any named with a date that ended more than date_margin
+    before the cutoff, see find_recent_run_results.
+
+    With a cursor_location, the pruned discovery resumes listing each
+    directory after whatever it skipped last time, see DiscoveryCursor.
+    full ignores the saved cursor, and starts a new one.
+
+    With an event_index, the files are found from S3 event notifications,
+    after adding any new ones from event_source, and the bucket is only
+    listed if the index is stale, see RunResultsEventIndex.
     """
-    s3_client = boto3.client("s3")
-    keys_with_run_results = []
+    s3_client = s3_client or boto3.client("s3")
     date_to_return = datetime.now(timezone.utc) - timedelta(days=days)
+    if event_index is not None:
+        paths = _paths_from_event_index(
+            event_index, event_source, bucket_name, date_to_return
+        )
+        if paths is not None:
+            return paths
+    if discovery == PRUNED_DISCOVERY:
+        cursor = (
+            DiscoveryCursor(cursor_location, s3_client) if cursor_location else None
+        )
+        start_after = {}
+        if cursor and not full:
+            start_after = cursor.load(date_to_return, date_margin)
+        keys = find_recent_run_results(
+            s3_client,
+            bucket_name,
+            date_to_return,
+            date_margin,
+            max_workers,
+            start_after,
+        )
+        if cursor:
+            cursor.save(date_to_return, date_margin, start_after)
+        return [os.path.join("s3://", bucket_name, key) for key in keys]
+    if discovery != FULL_DISCOVERY:
+        raise ValueError(f"Unknown run results discovery {discovery}")
+    if cursor_location:
+        raise ValueError("A cursor can only be used with the pruned discovery")
+
+    keys_with_run_results = []
     paginator = s3_client.get_paginator("list_objects_v2")
     response_iterator = paginator.paginate(
-        Bucket=bucket_name, Prefix="prod/run_artefacts/"
+        Bucket=bucket_name, Prefix=RUN_ARTEFACTS_PREFIX
     )
 
     for page in response_iterator:
@@ -34,11 +126,7 @@ def get_cadet_run_result_paths(bucket_name="mojap-derived-tables", days=1):
             for obj in page["Contents"]:
                 key = obj["Key"]
                 last_modified = obj["LastModified"]
-                if (
-                    key.endswith("run_results.json")
-                    and "deploy-docs" not in key
-                    and last_modified >= date_to_return
-                ):
+                if is_wanted_run_result(key, last_modified, date_to_return):
                     keys_with_run_results.append(
                         os.path.join("s3://", bucket_name, key)
                     )
@@ -46,5 +134,626 @@ def get_cadet_run_result_paths(bucket_name="mojap-derived-tables", days=1):
     return keys_with_run_results
 
 
+def _paths_from_event_index(
+    event_index, event_source, bucket_name: str, since: datetime
+) -> Optional[List[str]]:
+    try:
+        event_index.load()
+        if event_source is not None:
+            added = event_index.add(event_source.receive())
+            event_index.save()
+            event_source.acknowledge()
+            logging.info(
+                f"Added {added} run results files to the event index, "
+                f"skipped {event_index.skipped_records} malformed events"
+            )
+    except (ClientError, OSError, ValueError):
+        logging.warning("Couldn't update the run results event index", exc_info=True)
+    paths = event_index.recent_paths(bucket_name, since)
+    if paths is None:
+        logging.info("The run results event index is stale, listing instead")
+    return paths
+
+
+def embedded_date(directory: str) -> Optional[datetime]:
+    """The date in a directory name, if there is a valid one"""
+    match = EMBEDDED_DATE.search(directory)
+    if not match:
+        return None
+    try:
+        return datetime(*map(int, match.groups()), tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def find_recent_run_results(
+    s3_client,
+    bucket_name: str,
+    since: datetime,
+    date_margin: timedelta = timedelta(days=1),
+    max_workers: int = 16,
+    start_after: Optional[Dict[str, str]] = None,
+) -> List[str]:
+    """
+    Keys of the run_results.json files modified since the given time, in the
+    order S3 lists them.
+
+    Run directories are found by listing one level at a time with a
+    delimiter, and the directories at each level are listed in parallel.
+    Directories with deploy-docs in their name are skipped, as are those
+    named with a date that ended more than date_margin before since, which
+    assumes artefacts are uploaded within date_margin of the date their
+    directory is named with. Once a directory with a recent date is found
+    all of it is listed, without a delimiter.
+
+    start_after gives, for each directory, the last entry in it to skip
+    without listing. It is updated in place to skip the pruned directories at
+    the start of each directory this time, stopping at the first object as
+    objects can be overwritten. Skipped directories stay skipped as since
+    moves on, assuming new directories sort after old ones.
+    """
+    keys: List[str] = []
+    start_after = {} if start_after is None else start_after
+    # only read and written from the calling thread
+    next_start_after: Dict[str, str] = {}
+
+    def list_directory(
+        prefix: str,
+    ) -> tuple[List[str], List[str], List[str], Optional[str]]:
+        """
+        Wanted keys directly under the prefix, the recent run directories
+        under it, other directories to walk into, and the last of the entries
+        at the start of the directory that were all skipped
+        """
+        directory_keys, runs, directories = [], [], []
+        resume_after = start_after.get(prefix)
+        entries = []
+        for page in _iter_pages(
+            s3_client, bucket_name, prefix, delimiter="/", start_after=resume_after
+        ):
+            entries += [(obj["Key"], obj) for obj in page.get("Contents", [])]
+            entries += [
+                (common_prefix["Prefix"], None)
+                for common_prefix in page.get("CommonPrefixes", [])
+            ]
+
+        cursor = resume_after
+        skipping = True
+        for name, obj in sorted(entries, key=lambda entry: entry[0]):
+            if resume_after is not None and name <= resume_after:
+                # s3 repeats the directory the cursor is on
+                continue
+            if obj is not None:
+                wanted = is_wanted_run_result(name, obj["LastModified"], since)
+                if wanted:
+                    directory_keys.append(name)
+            else:
+                directory = name[len(prefix) :]
+                directory_date = embedded_date(directory)
+                if "deploy-docs" in directory:
+                    wanted = False
+                elif directory_date is None:
+                    wanted = True
+                    directories.append(name)
+                else:
+                    wanted = directory_date + timedelta(days=1) + date_margin > since
+                    if wanted:
+                        runs.append(name)
+            # objects can be overwritten, so only pruned directories are
+            # skipped for good
+            skipping = skipping and not wanted and obj is None
+            if skipping:
+                cursor = name
+        return directory_keys, runs, directories, cursor
+
+    def list_run(prefix: str) -> List[str]:
+        return [
+            obj["Key"]
+            for page in _iter_pages(s3_client, bucket_name, prefix)
+            for obj in page.get("Contents", [])
+            if is_wanted_run_result(obj["Key"], obj["LastModified"], since)
+        ]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        level = [RUN_ARTEFACTS_PREFIX]
+        runs: List[str] = []
+        while level:
+            next_level = []
+            for prefix, (directory_keys, directory_runs, directories, cursor) in zip(
+                level, executor.map(list_directory, level)
+            ):
+                keys.extend(directory_keys)
+                runs.extend(directory_runs)
+                next_level.extend(directories)
+                if cursor is not None:
+                    next_start_after[prefix] = cursor
+            level = next_level
+
+        for run_keys in executor.map(list_run, runs):
+            keys.extend(run_keys)
+
+    start_after.clear()
+    start_after.update(next_start_after)
+    return sorted(keys)
+
+
+class DiscoveryCursor:
+    """
+    Where find_recent_run_results can resume listing each directory, kept in
+    a local JSON file or an s3 object between runs. A cursor is only used
+    if everything it skips would still be skipped, ie. the cutoff and the
+    date pruning haven't moved back since it was saved.
+    """
+
+    def __init__(self, location: str, s3_client=None):
+        self.location = location
+        self.s3_client = s3_client
+
+    def load(self, since: datetime, date_margin: timedelta) -> Dict[str, str]:
+        saved = _read_json_if_exists(self.location, self.s3_client)
+        if saved is None:
+            logging.info(f"No discovery cursor at {self.location}, listing everything")
+            return {}
+        if since < datetime.fromisoformat(saved["since"]) or since - (
+            date_margin
+        ) < datetime.fromisoformat(saved["pruned_before"]):
+            logging.info(
+                f"Discovery cursor at {self.location} is for a later cutoff, "
+                "listing everything"
+            )
+            return {}
+        return saved["start_after"]
+
+    def save(
+        self, since: datetime, date_margin: timedelta, start_after: Dict[str, str]
+    ) -> None:
+        content = json.dumps(
+            {
+                "since": since.isoformat(),
+                "pruned_before": (since - date_margin).isoformat(),
+                "start_after": start_after,
+            },
+            indent=2,
+            sort_keys=True,
+        )
+        _write(self.location, content.encode("utf-8"), self.s3_client)
+
+
+def iter_event_records(message: dict) -> Iterator[dict]:
+    """
+    The S3 event records in a notification message, which may have been
+    wrapped by SNS on its way. Test events, sent when notifications are
+    configured, have no records.
+    """
+    if message.get("Type") == "Notification" and "Message" in message:
+        message = json.loads(message["Message"])
+    yield from message.get("Records", [])
+
+
+class EventFile:
+    """
+    S3 event notification messages appended to a local file, one JSON
+    message per line. The file is read in full each time, which is fine as
+    the index ignores events it already has.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def receive(self) -> List[dict]:
+        with open(self.path) as event_file:
+            return [json.loads(line) for line in event_file if line.strip()]
+
+    def acknowledge(self) -> None:
+        pass
+
+
+class SqsEventQueue:
+    """
+    S3 event notification messages sent to an SQS queue. Messages are only
+    deleted once acknowledged, ie. once the index holding them is saved,
+    so that they are received again if saving fails.
+    """
+
+    def __init__(self, sqs_client, queue_url: str, max_messages: int = 10_000):
+        self.sqs_client = sqs_client
+        self.queue_url = queue_url
+        self.max_messages = max_messages
+        self.receipt_handles: List[str] = []
+
+    def receive(self) -> List[dict]:
+        messages = []
+        while len(messages) < self.max_messages:
+            response = self.sqs_client.receive_message(
+                QueueUrl=self.queue_url, MaxNumberOfMessages=10
+            )
+            if not response.get("Messages"):
+                break
+            for message in response["Messages"]:
+                messages.append(json.loads(message["Body"]))
+                self.receipt_handles.append(message["ReceiptHandle"])
+        return messages
+
+    def acknowledge(self) -> None:
+        for start in range(0, len(self.receipt_handles), 10):
+            self.sqs_client.delete_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[
+                    {"Id": str(index), "ReceiptHandle": receipt_handle}
+                    for index, receipt_handle in enumerate(
+                        self.receipt_handles[start : start + 10]
+                    )
+                ],
+            )
+        self.receipt_handles = []
+
+
+class RunResultsEventIndex:
+    """
+    The run_results.json files created in the last window, fed by S3
+    ObjectCreated event notifications instead of listing the bucket, and
+    kept in a local JSON file or an s3 object between runs.
+
+    The index can only answer for cutoffs after it started receiving
+    events and within its window, and only while it is being fed. It is
+    stale if it hasn't been updated for max_staleness, eg. because reading
+    the events failed, and get_cadet_run_result_paths lists the bucket
+    instead.
+    """
+
+    def __init__(
+        self,
+        location: str,
+        s3_client=None,
+        window: timedelta = timedelta(days=7),
+        max_staleness: timedelta = timedelta(hours=6),
+    ):
+        self.location = location
+        self.s3_client = s3_client
+        self.window = window
+        self.max_staleness = max_staleness
+        self.started_at: Optional[datetime] = None
+        self.updated_at: Optional[datetime] = None
+        # the s3 uri of each run_results.json, and when it was created
+        self.created: Dict[str, datetime] = {}
+        # malformed messages and records that add couldn't index
+        self.skipped_records = 0
+
+    def load(self) -> None:
+        saved = _read_json_if_exists(self.location, self.s3_client)
+        if saved is None:
+            logging.info(f"No run results event index at {self.location}")
+            return
+        self.started_at = datetime.fromisoformat(saved["started_at"])
+        self.updated_at = datetime.fromisoformat(saved["updated_at"])
+        self.created = {
+            path: datetime.fromisoformat(created_at)
+            for path, created_at in saved["created"].items()
+        }
+
+    def save(self) -> None:
+        content = json.dumps(
+            {
+                "started_at": self.started_at.isoformat(),
+                "updated_at": self.updated_at.isoformat(),
+                "created": {
+                    path: created_at.isoformat()
+                    for path, created_at in sorted(self.created.items())
+                },
+            },
+            indent=2,
+        )
+        _write(self.location, content.encode("utf-8"), self.s3_client)
+
+    def add(self, messages: List[dict], now: Optional[datetime] = None) -> int:
+        """
+        Index the run_results.json files created in the notification
+        messages, and forget those that were deleted or are older than the
+        window. Returns how many were added. Messages and records that
+        can't be read are logged and counted in skipped_records.
+        """
+        now = now or datetime.now(timezone.utc)
+        added = 0
+        for message in messages:
+            try:
+                records = list(iter_event_records(message))
+            except (AttributeError, TypeError, ValueError):
+                self._skip("message", message)
+                continue
+            for record in records:
+                try:
+                    key = unquote_plus(record["s3"]["object"]["key"])
+                    bucket_name = record["s3"]["bucket"]["name"]
+                    event_name = record.get("eventName", "")
+                    created_at = _parse_dbt_time(record["eventTime"])
+                except (AttributeError, KeyError, TypeError, ValueError):
+                    self._skip("record", record)
+                    continue
+                if not key.startswith(RUN_ARTEFACTS_PREFIX):
+                    continue
+                path = os.path.join("s3://", bucket_name, key)
+                if event_name.startswith("ObjectRemoved"):
+                    self.created.pop(path, None)
+                    continue
+                if event_name.startswith("ObjectCreated") and is_wanted_run_result(
+                    key, created_at, now - self.window
+                ):
+                    if path not in self.created:
+                        added += 1
+                    self.created[path] = max(
+                        created_at, self.created.get(path, created_at)
+                    )
+
+        self.created = {
+            path: created_at
+            for path, created_at in self.created.items()
+            if created_at >= now - self.window
+        }
+        self.started_at = self.started_at or now
+        self.updated_at = now
+        return added
+
+    def _skip(self, kind: str, event) -> None:
+        self.skipped_records += 1
+        logging.warning(f"Skipping malformed S3 event {kind}: {event!r:.500}")
+
+    def recent_paths(
+        self, bucket_name: str, since: datetime, now: Optional[datetime] = None
+    ) -> Optional[List[str]]:
+        """
+        The run_results.json files in the bucket created since the given
+        time, or None if the index can't tell
+        """
+        now = now or datetime.now(timezone.utc)
+        if self.updated_at is None or now - self.updated_at > self.max_staleness:
+            return None
+        if since < max(self.started_at, self.updated_at - self.window):
+            return None
+        bucket_path = os.path.join("s3://", bucket_name, "")
+        return sorted(
+            path
+            for path, created_at in self.created.items()
+            if path.startswith(bucket_path) and created_at >= since
+        )
+
+
+def _read_json(path: str, s3_client=None) -> dict:
+    if path.startswith("s3://"):
+        bucket_name, key = path[len("s3://") :].split("/", 1)
+        return json.load(s3_client.get_object(Bucket=bucket_name, Key=key)["Body"])
+    with open(path) as json_file:
+        return json.load(json_file)
+
+
+def _read_json_if_exists(path: str, s3_client=None) -> Optional[dict]:
+    try:
+        return _read_json(path, s3_client)
+    except FileNotFoundError:
+        return None
+    except ClientError as error:
+        if error.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            return None
+        raise
+
+
+def _write(path: str, content: bytes, s3_client=None) -> None:
+    if path.startswith("s3://"):
+        bucket_name, key = path[len("s3://") :].split("/", 1)
+        s3_client.put_object(Bucket=bucket_name, Key=key, Body=content)
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "wb") as output_file:
+        output_file.write(content)
+
+
+def _parse_dbt_time(timestamp: str) -> datetime:
+    parsed = datetime.fromisoformat(timestamp)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def merge_run_results(documents: List[dict]) -> dict:
+    """
+    Keep only the latest result for each unique_id across several
+    run_results.json documents. A result's time is when it started
+    executing, or when its document was generated.
+
+    Each document keeps its own metadata, as the dbt source takes the
+    invocation id of every result, and the time of test results without
+    timings, from the metadata of the file it is in. Documents left without
+    results are dropped, as are those from dbt docs generate, which the dbt
+    source ignores.
+    """
+    latest: Dict[str, tuple[datetime, datetime, int]] = {}
+    for index, document in enumerate(documents):
+        if document.get("args", {}).get("which") == "generate":
+            continue
+        generated_at = _parse_dbt_time(document["metadata"]["generated_at"])
+        for result in document.get("results", []):
+            started_at = next(
+                (
+                    timing["started_at"]
+                    for timing in result.get("timing", [])
+                    if timing.get("name") == "execute" and timing.get("started_at")
+                ),
+                None,
+            )
+            result_time = (
+                _parse_dbt_time(started_at) if started_at else generated_at,
+                # ties go to the later document
+                generated_at,
+                index,
+            )
+            unique_id = result["unique_id"]
+            if unique_id not in latest or result_time > latest[unique_id]:
+                latest[unique_id] = result_time
+
+    merged = []
+    for index, document in enumerate(documents):
+        results = [
+            result
+            for result in document.get("results", [])
+            if latest.get(result["unique_id"], (None, None, None))[2] == index
+        ]
+        if results:
+            merged.append(
+                {
+                    "metadata": document["metadata"],
+                    "args": {
+                        key: value
+                        for key, value in document.get("args", {}).items()
+                        if key == "which"
+                    },
+                    "results": results,
+                }
+            )
+    return {"run_results": merged}
+
+
+def consolidate_run_results(
+    paths: List[str], output_path: str, s3_client=None, max_workers: int = 16
+) -> str:
+    """
+    Download run_results.json files concurrently, and write the latest
+    result for each unique_id to one compact file, see merge_run_results.
+    The file can be local or in s3, and is read by CadetDBTSource with a
+    single request. Returns the output path.
+    """
+    if not output_path.endswith(CONSOLIDATED_RUN_RESULTS_SUFFIX):
+        raise ValueError(
+            f"Consolidated run results must end with {CONSOLIDATED_RUN_RESULTS_SUFFIX}"
+        )
+    s3_client = s3_client or boto3.client("s3")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        documents = list(executor.map(lambda path: _read_json(path, s3_client), paths))
+
+    merged = merge_run_results(documents)
+    logging.info(
+        f"Consolidated {len(paths)} run results files into "
+        f"{len(merged['run_results'])} documents with "
+        f"{sum(len(document['results']) for document in merged['run_results'])} "
+        f"results at {output_path}"
+    )
+    content = json.dumps(merged, separators=(",", ":")).encode("utf-8")
+    _write(output_path, content, s3_client)
+    return output_path
+
+
+def _iter_pages(
+    s3_client,
+    bucket_name: str,
+    prefix: str,
+    delimiter: Optional[str] = None,
+    start_after: Optional[str] = None,
+) -> Iterator[dict]:
+    request = {"Bucket": bucket_name, "Prefix": prefix}
+    if delimiter:
+        request["Delimiter"] = delimiter
+    if start_after:
+        request["StartAfter"] = start_after
+    while True:
+        page = s3_client.list_objects_v2(**request)
+        yield page
+        if not page.get("IsTruncated"):
+            return
+        request["ContinuationToken"] = page["NextContinuationToken"]
+
+
 if __name__ == "__main__":
-    inject_run_result_paths_into_yaml_template("ingestion/cadet.yaml")
+    parser = argparse.ArgumentParser(
+        description="Add recent run_results.json files to the CaDeT recipe"
+    )
+    parser.add_argument("--recipe", default="ingestion/cadet.yaml")
+    parser.add_argument("--bucket", default="mojap-derived-tables")
+    parser.add_argument("--days", type=int, default=1)
+    parser.add_argument(
+        "--discovery",
+        choices=[FULL_DISCOVERY, PRUNED_DISCOVERY],
+        default=FULL_DISCOVERY,
+        help="list every artefact, or skip run directories named with old dates",
+    )
+    parser.add_argument(
+        "--date-margin-days",
+        type=float,
+        default=1,
+        help="how long after the date in its name a run directory can be written to",
+    )
+    parser.add_argument(
+        "--cursor",
+        help="a local file or s3 uri to resume pruned discovery from",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="ignore the saved cursor and list everything",
+    )
+    parser.add_argument(
+        "--consolidate-to",
+        help=(
+            "merge the run results into one local or s3 file, ending with "
+            f"{CONSOLIDATED_RUN_RESULTS_SUFFIX}, and inject that instead. Only "
+            "the latest result for each node is kept, so earlier runs of a node "
+            "in the same window (including earlier test failures) are not ingested"
+        ),
+    )
+    parser.add_argument(
+        "--event-index",
+        help=(
+            "a local file or s3 uri of an index of run results fed by s3 "
+            "event notifications, used instead of listing unless it is stale"
+        ),
+    )
+    events = parser.add_mutually_exclusive_group()
+    events.add_argument(
+        "--events-file", help="a local JSONL file of s3 event notifications"
+    )
+    events.add_argument(
+        "--events-queue", help="the url of an SQS queue of s3 event notifications"
+    )
+    parser.add_argument(
+        "--event-window-days",
+        type=float,
+        default=7,
+        help="how long run results are kept in the event index",
+    )
+    parser.add_argument(
+        "--max-event-staleness-hours",
+        type=float,
+        default=6,
+        help="how long the event index can go without updates before listing",
+    )
+    args = parser.parse_args()
+    if args.cursor and args.discovery != PRUNED_DISCOVERY:
+        parser.error("--cursor needs --discovery pruned")
+    if (args.events_file or args.events_queue) and not args.event_index:
+        parser.error("--events-file and --events-queue need --event-index")
+
+    s3_client = boto3.client("s3")
+    event_index = None
+    if args.event_index:
+        event_index = RunResultsEventIndex(
+            args.event_index,
+            s3_client,
+            window=timedelta(days=args.event_window_days),
+            max_staleness=timedelta(hours=args.max_event_staleness_hours),
+        )
+    event_source = None
+    if args.events_file:
+        event_source = EventFile(args.events_file)
+    elif args.events_queue:
+        event_source = SqsEventQueue(boto3.client("sqs"), args.events_queue)
+
+    inject_run_result_paths_into_yaml_template(
+        args.recipe,
+        bucket_name=args.bucket,
+        days=args.days,
+        discovery=args.discovery,
+        date_margin=timedelta(days=args.date_margin_days),
+        cursor_location=args.cursor,
+        full=args.full,
+        consolidate_to=args.consolidate_to,
+        s3_client=s3_client,
+        event_index=event_index,
+        event_source=event_source,
+    )
@@ -1,6 +1,7 @@
 import logging
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Iterable, List, Optional
+from typing import Dict, Iterable, List, Optional
 
 import datahub.emitter.mce_builder as mce_builder
 import datahub.emitter.mcp_builder as mcp_builder
@@ -18,19 +19,17 @@ from datahub.ingestion.source.state.stateful_ingestion_base import (
     StatefulIngestionSourceBase,
 )
 from datahub.metadata.schema_classes import GlobalTagsClass, TagAssociationClass
+from datahub.utilities.lossy_collections import LossyList
 
-from ingestion.config import ENV, INSTANCE, PLATFORM
+from ingestion import urns
+from ingestion.cadet_manifest_index import CadetManifestIndex, get_cadet_manifest_index
 from ingestion.create_cadet_databases_source.config import CreateCadetDatabasesConfig
 from ingestion.ingestion_utils import (
-    NodeLookup,
+    FqnValidationSummary,
     domains_to_subject_areas,
     get_cadet_metadata_json,
     get_subject_areas,
-    get_tags,
     make_user_mcp,
-    parse_database_and_table_names,
-    should_display_dbt_manifest_node,
-    validate_fqn,
 )
 from ingestion.utils import report_generator_time, report_time
 
@@ -41,6 +40,20 @@ properties_to_add = {
 }
 
 
+@dataclass
+class CreateCadetDatabasesReport(StaleEntityRemovalSourceReport):
+    manifest_tables_checked: int = 0
+    # problem -> table names, see FqnValidationSummary
+    invalid_table_names: Dict[str, LossyList[str]] = field(default_factory=dict)
+    databases_without_subject_area: LossyList[str] = field(default_factory=LossyList)
+
+    def report_fqn_summary(self, fqn_summary: FqnValidationSummary) -> None:
+        self.manifest_tables_checked = fqn_summary.checked
+        for problem, table_names in fqn_summary.problems.items():
+            self.invalid_table_names[problem] = LossyList()
+            self.invalid_table_names[problem].extend(table_names)
+
+
 @config_class(CreateCadetDatabasesConfig)
 class CreateCadetDatabases(StatefulIngestionSourceBase):
 
@@ -48,7 +61,7 @@ class CreateCadetDatabases(StatefulIngestionSourceBase):
     def __init__(self, config: CreateCadetDatabasesConfig, ctx: PipelineContext):
         super().__init__(config, ctx)
         self.source_config = config
-        self.report = StaleEntityRemovalSourceReport()
+        self.report = CreateCadetDatabasesReport()
 
     @classmethod
     def create(cls, config_dict, ctx):
@@ -65,7 +78,8 @@ class CreateCadetDatabases(StatefulIngestionSourceBase):
 
     @report_generator_time
     def get_workunits(self) -> Iterable[MetadataWorkUnit]:
-        manifest = get_cadet_metadata_json(self.source_config.manifest_s3_uri)
+        manifest_index = get_cadet_manifest_index(self.source_config.manifest_s3_uri)
+        self.report.report_fqn_summary(manifest_index.fqn_summary)
         databases_metadata = get_cadet_metadata_json(
             self.source_config.database_metadata_s3_uri
         )
@@ -73,9 +87,9 @@ class CreateCadetDatabases(StatefulIngestionSourceBase):
         mcps: list[MetadataChangeProposalWrapper] = []
 
         # Get database metadata from the manifest and database metadata dicts
-        databases_with_metadata, domain_lookup, display_tags = (
+        databases_with_metadata, display_tags = (
             self._get_databases_with_domains_and_display_tags(
-                manifest, databases_metadata
+                manifest_index, databases_metadata
             )
         )
 
@@ -83,7 +97,7 @@ class CreateCadetDatabases(StatefulIngestionSourceBase):
         mcps.extend(self.create_database_owner_mcps(databases_with_metadata))
 
         # create mcps to tag seed datasets with dc_display_in_catalogue
-        mcps.extend(self.create_display_tag_for_seed_mcps(manifest, domain_lookup))
+        mcps.extend(self.create_display_tag_for_seed_mcps(manifest_index))
 
         # create the cadet databases tagged to display
         yield from self.create_database_mcps(databases_with_metadata, display_tags)
@@ -93,6 +107,8 @@ class CreateCadetDatabases(StatefulIngestionSourceBase):
             logging.info(f"creating {wu.metadata.aspect} for {wu.metadata.entityUrn}")
             yield wu
 
+        urns.log_urn_cache_stats()
+
     def create_database_owner_mcps(
         self, databases_with_metadata: set
     ) -> list[MetadataChangeProposalWrapper]:
@@ -112,13 +128,7 @@ class CreateCadetDatabases(StatefulIngestionSourceBase):
         last_modified = int(datetime.now().timestamp())
 
         for database_name, database_metadata in databases_with_metadata:
-            database_container_key = mcp_builder.DatabaseKey(
-                database=database_name,
-                platform=PLATFORM,
-                instance=INSTANCE,
-                env=ENV,
-                backcompat_env_as_instance=True,
-            )
+            database_container_key = urns.database_key(database_name)
             db_meta_dict = dict(database_metadata)
             db_meta_dict.update(properties_to_add)
             domain_name = db_meta_dict["domain"]
@@ -154,41 +164,30 @@ class CreateCadetDatabases(StatefulIngestionSourceBase):
             )
 
     def create_display_tag_for_seed_mcps(
-        self, manifest, domain_lookup
+        self, manifest_index: CadetManifestIndex
     ) -> list[MetadataChangeProposalWrapper]:
         seed_domain_mcps = []
 
-        seed_nodes = [
-            manifest["nodes"][node]
-            for node in manifest["nodes"]
-            if manifest["nodes"][node]["resource_type"] == "seed"
-        ]
-        for node in seed_nodes:
-            database, table = parse_database_and_table_names(node)
-            domain = domain_lookup.get(database, table)
+        for entry in manifest_index.of_type("seed"):
+            domain = entry.domain
             tag_names = [
                 "Miscellaneous",
                 "Reference data",
             ]
-            if should_display_dbt_manifest_node(node):
+            if entry.display:
                 tag_names.append("dc_display_in_catalogue")
             if domains_to_subject_areas.get(domain.lower()):
                 tag_names.append(domains_to_subject_areas.get(domain.lower()))
 
             tags_aspect = GlobalTagsClass(
                 tags=[
-                    TagAssociationClass(tag=mce_builder.make_tag_urn(tag_name))
+                    TagAssociationClass(tag=urns.tag_urn(tag_name))
                     for tag_name in tag_names
                 ]
             )
 
-            dataset_urn = mce_builder.make_dataset_urn_with_platform_instance(
-                platform=PLATFORM,
-                name=f"{database}.{table}",
-                platform_instance=INSTANCE,
-            )
             mcp: MetadataChangeProposalWrapper = MetadataChangeProposalWrapper(
-                entityUrn=dataset_urn,
+                entityUrn=entry.dataset_urn,
                 aspect=tags_aspect,
             )
 
@@ -197,63 +196,62 @@ class CreateCadetDatabases(StatefulIngestionSourceBase):
 
     @report_time
     def _get_databases_with_domains_and_display_tags(
-        self, manifest: dict, databases_metadata: dict
-    ) -> tuple[set[tuple[str, tuple[str, str]]], NodeLookup[str], dict[str, list[str]]]:
+        self, manifest_index: CadetManifestIndex, databases_metadata: dict
+    ) -> tuple[set[tuple[str, tuple[str, str]]], dict[str, set[str]]]:
         """
         These mappings will only work with tables named {database}__{table}
         like create a derived table.
 
         Returns:
             - database_mappings: a set of databases with associated metadata
-            - domain_lookup: a domain lookup for tables and databases
             - tag_mappings: a dict for display tags, where key is database and
             value is the desired tags, including dc_display_in_catalogue if
             any model is to be displayed.
         """
         database_mappings = set()
-        domain_lookup = NodeLookup()
         tag_mappings = {}
+        databases_without_subject_area = set()
         top_level_subject_areas = get_subject_areas()
-        for node in manifest["nodes"]:
-            if manifest["nodes"][node]["resource_type"] in ["model", "seed"]:
-                # fqn = fully qualified name
-                fqn = manifest["nodes"][node]["fqn"]
-                if validate_fqn(fqn):
-                    database, table = parse_database_and_table_names(
-                        manifest["nodes"][node]
-                    )
-                    database_metadata_dict = {}
-
-                    try:
-                        database_metadata_dict = databases_metadata["databases"][
-                            database
-                        ].copy()
-                    except KeyError:
-                        logging.debug(f"{database} - has no database level metadata")
-
-                    database_metadata_dict["domain"] = fqn[1]
-                    database_tags = database_metadata_dict.get("tags", [])
-                    if "tags" in database_metadata_dict:
-                        database_metadata_dict.pop("tags")
-                    database_metadata_tuple = tuple(database_metadata_dict.items())
-                    database_mappings.add((database, database_metadata_tuple))
-                    domain_lookup.set(database, table, database_metadata_dict["domain"])
-
-                    tags = get_tags(manifest["nodes"][node])
-                    if database_tags:
-                        tags.update(database_tags)
-                    if not any(tag in top_level_subject_areas for tag in tags):
-                        logging.warning(
-                            f"No top level tags found in database metadata file for {database}"
-                        )
-
-                    if tags:
-                        if tag_mappings.get(database):
-                            tag_mappings[database].update(tags)
-                        else:
-                            tag_mappings[database] = tags
-
-        return database_mappings, domain_lookup, tag_mappings
+        for entry in manifest_index:
+            database = entry.database
+            database_metadata_dict = {}
+
+            try:
+                database_metadata_dict = databases_metadata["databases"][
+                    database
+                ].copy()
+            except KeyError:
+                logging.debug(f"{database} - has no database level metadata")
+
+            database_metadata_dict["domain"] = entry.domain
+            database_tags = database_metadata_dict.get("tags", [])
+            if "tags" in database_metadata_dict:
+                database_metadata_dict.pop("tags")
+            database_metadata_tuple = tuple(database_metadata_dict.items())
+            database_mappings.add((database, database_metadata_tuple))
+
+            tags = set(entry.tags)
+            if database_tags:
+                tags.update(database_tags)
+            if not any(tag in top_level_subject_areas for tag in tags):
+                databases_without_subject_area.add(database)
+
+            if tags:
+                if tag_mappings.get(database):
+                    tag_mappings[database].update(tags)
+                else:
+                    tag_mappings[database] = tags
+
+        if databases_without_subject_area:
+            logging.warning(
+                f"No top level tags found in database metadata file for "
+                f"{len(databases_without_subject_area)} databases"
+            )
+            self.report.databases_without_subject_area.extend(
+                sorted(databases_without_subject_area)
+            )
+
+        return database_mappings, tag_mappings
 
     def get_report(self) -> SourceReport:
         return self.report
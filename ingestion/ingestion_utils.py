@@ -1,12 +1,18 @@
+import hashlib
 import json
 import logging
 import os
 import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from enum import StrEnum
-from typing import Dict, Generic, TypeVar
+from typing import BinaryIO, Dict, Iterator, List, Optional
 
 import boto3
 import datahub.emitter.mce_builder as mce_builder
+import ijson
 import yaml
 from botocore.exceptions import ClientError, NoCredentialsError
 from datahub.emitter.mcp import MetadataChangeProposalWrapper
@@ -14,6 +20,11 @@ from datahub.metadata.schema_classes import ChangeTypeClass, CorpUserInfoClass
 
 from ingestion.utils import report_time
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logging.basicConfig(level=logging.DEBUG)
 
 EXCLUDED_NAME_PATTERNS = (
@@ -62,20 +73,292 @@ class FindMojDataEntityTypes(StrEnum):
     PUBLICATION_DATASET = "Publication dataset"
 
 
+# The manifest node fields used by the catalogue. Everything else in a node
+# (compiled code, column docs, depends_on etc) is dropped when streaming.
+MANIFEST_NODE_FIELDS = (
+    "resource_type",
+    "fqn",
+    "schema",
+    "tags",
+    "name",
+    "alias",
+    "identifier",
+    "database",
+    "unique_id",
+)
+
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Large metadata files are downloaded as concurrent byte range requests
+DOWNLOAD_PART_SIZE = int(os.getenv("CADET_DOWNLOAD_PART_SIZE", 16 * 1024 * 1024))
+DOWNLOAD_MAX_CONCURRENCY = int(os.getenv("CADET_DOWNLOAD_MAX_CONCURRENCY", 8))
+
+# Name of the decoder that streams manifest nodes, rather than decoding the
+# whole manifest, see get_cadet_manifest_nodes
+STREAMING_JSON_DECODER = "ijson"
+DEFAULT_JSON_DECODER = os.getenv("CADET_JSON_DECODER", "json")
+
+# Parsed metadata files keyed by (s3 uri, etag). Several CaDeT components load
+# the same manifest in one process, so we only want to download and parse it once.
+_metadata_memo: Dict[tuple[str, str], Dict] = {}
+_manifest_nodes_memo: Dict[tuple[str, str], Dict] = {}
+
+
+def split_s3_uri(s3_uri: str) -> tuple[str, str]:
+    """Split an s3://bucket/key uri into its bucket name and key"""
+    s3_parts = s3_uri.split("/")
+    bucket_name = s3_parts[2]
+    file_key = "/".join(s3_parts[3:])
+    return bucket_name, file_key
+
+
+def get_metadata_cache_dir() -> str:
+    """
+    Directory used to share downloaded metadata files between the processes
+    of a workflow run. Can be overridden with CADET_METADATA_CACHE_DIR.
+    """
+    return os.getenv(
+        "CADET_METADATA_CACHE_DIR",
+        os.path.join(tempfile.gettempdir(), "cadet-metadata-cache"),
+    )
+
+
+def ensure_metadata_cache_dir() -> str:
+    """
+    Create the metadata cache directory, readable and writable only by this
+    user. Cached files are trusted, so an existing directory is only used if
+    this user owns it. Raises OSError if it can't be used.
+    """
+    cache_dir = get_metadata_cache_dir()
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    cache_dir_stat = os.stat(cache_dir)
+    if cache_dir_stat.st_uid != os.getuid():
+        raise PermissionError(f"{cache_dir} is owned by another user")
+    if cache_dir_stat.st_mode & 0o077:
+        os.chmod(cache_dir, 0o700)
+    return cache_dir
+
+
+def metadata_cache_path(s3_uri: str, etag: str, extension: str = ".json") -> str:
+    """
+    Path of a file in the on-disk cache derived from a version of an s3 object.
+    Files for other versions of the object are removed when it is written.
+    """
+    uri_digest = hashlib.sha256(s3_uri.encode("utf-8")).hexdigest()
+    etag_digest = hashlib.sha256(etag.encode("utf-8")).hexdigest()
+    return os.path.join(
+        get_metadata_cache_dir(), f"{uri_digest}.{etag_digest}{extension}"
+    )
+
+
+def get_s3_etag(s3, s3_uri: str) -> str:
+    bucket_name, file_key = split_s3_uri(s3_uri)
+    return s3.head_object(Bucket=bucket_name, Key=file_key)["ETag"]
+
+
+def download_s3_object(
+    s3,
+    s3_uri: str,
+    size: int,
+    etag: Optional[str] = None,
+    part_size: int = DOWNLOAD_PART_SIZE,
+    max_concurrency: int = DOWNLOAD_MAX_CONCURRENCY,
+) -> bytearray:
+    """
+    Download an object of a known size with concurrent byte range requests,
+    each written straight into its own slice of a preallocated buffer.
+    If an etag is given, every request fails if the object has changed.
+    """
+    buffer = bytearray(size)
+    buffer_view = memoryview(buffer)
+    bucket_name, file_key = split_s3_uri(s3_uri)
+    conditions = {"IfMatch": etag} if etag else {}
+
+    def download_part(start: int):
+        end = min(start + part_size, size)
+        response = s3.get_object(
+            Bucket=bucket_name,
+            Key=file_key,
+            Range=f"bytes={start}-{end - 1}",
+            **conditions,
+        )
+        part_view = buffer_view[start:end]
+        offset = 0
+        while chunk := response["Body"].read(STREAM_CHUNK_SIZE):
+            part_view[offset : offset + len(chunk)] = chunk
+            offset += len(chunk)
+        if offset != end - start:
+            raise IOError(
+                f"Expected {end - start} bytes from {s3_uri} at {start=}, got {offset}"
+            )
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        # list() so that any failed part raises here
+        list(executor.map(download_part, range(0, size, part_size)))
+
+    buffer_view.release()
+    return buffer
+
+
+def _open_metadata_cache(s3_uri: str, etag: str) -> Optional[BinaryIO]:
+    try:
+        ensure_metadata_cache_dir()
+        return open(metadata_cache_path(s3_uri, etag), "rb")
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        logging.warning(f"Unable to read metadata cache for {s3_uri}: {e}")
+        return None
+
+
+@contextmanager
+def metadata_cache_writer(
+    s3_uri: str, etag: str, extension: str = ".json"
+) -> Iterator[Optional[BinaryIO]]:
+    """
+    Yields a file to write a downloaded object, or something derived from it,
+    to. It is moved into the on-disk cache, replacing files for older versions
+    of the same object, only once the block has completed, so other processes
+    never see a partial file. Yields None if the cache can't be written to.
+    """
+    cache_path = metadata_cache_path(s3_uri, etag, extension)
+    cache_dir = os.path.dirname(cache_path)
+    try:
+        ensure_metadata_cache_dir()
+        tmp_file = tempfile.NamedTemporaryFile(dir=cache_dir, delete=False)
+    except OSError as e:
+        logging.warning(f"Unable to write metadata cache for {s3_uri}: {e}")
+        yield None
+        return
+
+    try:
+        with tmp_file:
+            yield tmp_file
+    except BaseException:
+        os.remove(tmp_file.name)
+        raise
+
+    uri_digest, etag_digest = os.path.basename(cache_path).split(".")[:2]
+    try:
+        for file_name in os.listdir(cache_dir):
+            if file_name.startswith(f"{uri_digest}.") and not file_name.startswith(
+                f"{uri_digest}.{etag_digest}."
+            ):
+                os.remove(os.path.join(cache_dir, file_name))
+        os.replace(tmp_file.name, cache_path)
+    except OSError as e:
+        logging.warning(f"Unable to write metadata cache for {s3_uri}: {e}")
+
+
+def _remember(memo: Dict[tuple[str, str], Dict], memo_key: tuple[str, str], value):
+    """Store a parsed file, keeping only the latest version of each uri"""
+    for stale_key in [key for key in memo if key[0] == memo_key[0]]:
+        del memo[stale_key]
+    memo[memo_key] = value
+
+
+def clear_metadata_memo() -> None:
+    """Forget all metadata parsed by this process"""
+    _metadata_memo.clear()
+    _manifest_nodes_memo.clear()
+
+
+def _load_json_stdlib(content: bytes | bytearray):
+    return json.loads(content, strict=False)
+
+
+def _load_json_orjson(content: bytes | bytearray):
+    try:
+        return orjson.loads(content)
+    except orjson.JSONDecodeError:
+        # orjson rejects raw control characters in strings, which we need to
+        # accept in the same way json.loads(strict=False) does
+        logging.info("orjson could not decode metadata, retrying with json")
+        return _load_json_stdlib(content)
+
+
+# Backends that can decode a whole metadata file. orjson is optional, and
+# isn't a dependency of this project, so only json is always available.
+JSON_DECODERS = {"json": _load_json_stdlib}
+if orjson is not None:
+    JSON_DECODERS["orjson"] = _load_json_orjson
+
+if DEFAULT_JSON_DECODER not in JSON_DECODERS:
+    logging.warning(
+        f"CADET_JSON_DECODER={DEFAULT_JSON_DECODER} is not installed, metadata "
+        f"files will be decoded with json. Available: {', '.join(JSON_DECODERS)}"
+    )
+
+
+def decode_json(content: bytes | bytearray, decoder: Optional[str] = None):
+    """
+    Decode a metadata file with the named backend from JSON_DECODERS,
+    defaulting to CADET_JSON_DECODER or the standard library. Backends that
+    aren't installed fall back to the standard library, with a warning.
+    """
+    decoder = decoder or DEFAULT_JSON_DECODER
+    if decoder not in JSON_DECODERS:
+        logging.warning(f"JSON decoder {decoder} is not available, using json")
+        decoder = "json"
+    return JSON_DECODERS[decoder](content)
+
+
+def _read_metadata_content(s3, s3_uri: str, head: dict) -> bytes | bytearray:
+    """
+    Read a version of an s3 object from the on-disk cache, or download it
+    and add it to the cache
+    """
+    etag = head["ETag"]
+    cache_file = _open_metadata_cache(s3_uri, etag)
+    if cache_file:
+        logging.info(f"Using cached download of {s3_uri} ({etag=})")
+        with cache_file:
+            return cache_file.read()
+
+    content = download_s3_object(s3, s3_uri, head["ContentLength"], etag)
+    with metadata_cache_writer(s3_uri, etag) as sink:
+        if sink:
+            sink.write(content)
+    return content
+
+
 @report_time
-def get_cadet_metadata_json(s3_uri: str) -> Dict:
+def get_cadet_metadata_json(
+    s3_uri: str,
+    decoder: Optional[str] = None,
+    s3=None,
+    memoize: bool = True,
+) -> Dict:
     """
     Returns dict object containing metadata from the json file at the given s3 path.
     Examples are the manifest file or the database_metadata file
+
+    The object's ETag is checked with a HEAD request, and the file is only
+    downloaded if it is not already in the on-disk cache, and only parsed if
+    this process has not already parsed it. The returned dict is shared
+    between callers so must not be modified. Callers that only need a large
+    file once should pass memoize=False, so the parsed copy isn't kept for
+    the rest of the process.
+
+    The s3 client defaults to one from the environment's credentials.
+
+    Downloads use concurrent byte range requests, see download_s3_object, and
+    the downloaded bytes are handed to the decoder without being decoded to a
+    str first. The decoder backend can be chosen, see decode_json.
     """
     try:
-        s3 = boto3.client("s3")
-        s3_parts = s3_uri.split("/")
-        bucket_name = s3_parts[2]
-        file_key = "/".join(s3_parts[3:])
-        response = s3.get_object(Bucket=bucket_name, Key=file_key)
-        content = response["Body"].read().decode("utf-8")
-        metadata = json.loads(content, strict=False)
+        s3 = s3 or boto3.client("s3")
+        bucket_name, file_key = split_s3_uri(s3_uri)
+        head = s3.head_object(Bucket=bucket_name, Key=file_key)
+        etag = head["ETag"]
+
+        memo_key = (s3_uri, etag)
+        if memo_key in _metadata_memo:
+            logging.info(f"Using already parsed metadata for {s3_uri} ({etag=})")
+            return _metadata_memo[memo_key]
+
+        content = _read_metadata_content(s3, s3_uri, head)
+        metadata = decode_json(content, decoder)
     except NoCredentialsError:
         print("Credentials not available.")
         raise
@@ -91,25 +374,183 @@ def get_cadet_metadata_json(s3_uri: str) -> Dict:
         # Catch any other exceptions
         print(f"An error occurred: {str(e)}")
         raise
+
+    if memoize:
+        _remember(_metadata_memo, memo_key, metadata)
+
     return metadata
 
 
-def validate_fqn(fqn: list[str]) -> bool:
-    """The table name for CaDeT models should be of form {database}__{table}"""
+class _ControlCharacterFilter:
+    """
+    Binary file-like wrapper replacing raw control characters with spaces.
+
+    ijson rejects raw control characters inside strings, which
+    json.loads(strict=False) accepts. None of the fields in
+    MANIFEST_NODE_FIELDS contain them, and outside of strings they are
+    only ever whitespace.
+    """
+
+    _CONTROL_CHARACTERS = bytes.maketrans(bytes(range(32)), b" " * 32)
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def read(self, size: int = -1) -> bytes:
+        return self.stream.read(size).translate(self._CONTROL_CHARACTERS)
+
+
+class _TeeStream:
+    """Binary file-like wrapper that copies everything read to a sink"""
+
+    def __init__(self, stream, sink: Optional[BinaryIO]):
+        self.stream = stream
+        self.sink = sink
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.stream.read(size) if size >= 0 else self.stream.read()
+        if self.sink:
+            self.sink.write(chunk)
+        return chunk
+
+    def drain(self):
+        """Read whatever the parser didn't need, so the sink gets the whole file"""
+        while self.read(STREAM_CHUNK_SIZE):
+            pass
+
+
+def iter_manifest_nodes(
+    stream, fields: tuple[str, ...] = MANIFEST_NODE_FIELDS
+) -> Iterator[tuple[str, dict]]:
+    """
+    Incrementally parse manifest["nodes"] from a binary stream, yielding the
+    unique id of each node and a slim record with only the given fields.
+    Only one full node is held in memory at a time.
+    """
+    for unique_id, node in ijson.kvitems(
+        _ControlCharacterFilter(stream), "nodes", use_float=True
+    ):
+        yield unique_id, {field: node[field] for field in fields if field in node}
+
+
+def _slim_nodes(manifest: dict) -> Dict[str, dict]:
+    return {
+        unique_id: {
+            field: node[field] for field in MANIFEST_NODE_FIELDS if field in node
+        }
+        for unique_id, node in manifest["nodes"].items()
+    }
+
+
+@report_time
+def get_cadet_manifest_nodes(
+    s3_uri: str, decoder: str = STREAMING_JSON_DECODER, s3=None
+) -> Dict:
+    """
+    Returns a slim version of the dbt manifest at the given s3 path, of the form
+    {"nodes": {unique_id: node}}, where each node only has MANIFEST_NODE_FIELDS.
+
+    By default nodes are streamed from the s3 body (or the on-disk cache) so
+    the full manifest is never held in memory. Naming one of JSON_DECODERS
+    instead decodes the whole manifest, which uses more memory but can be
+    faster. Like get_cadet_metadata_json the result is shared by all callers
+    in the process, and must not be modified, and the s3 client defaults to
+    one from the environment's credentials.
+    """
+    try:
+        s3 = s3 or boto3.client("s3")
+        bucket_name, file_key = split_s3_uri(s3_uri)
+        head = s3.head_object(Bucket=bucket_name, Key=file_key)
+        etag = head["ETag"]
+
+        memo_key = (s3_uri, etag)
+        if memo_key in _manifest_nodes_memo:
+            return _manifest_nodes_memo[memo_key]
+
+        if memo_key in _metadata_memo:
+            nodes = _slim_nodes(_metadata_memo[memo_key])
+        elif decoder != STREAMING_JSON_DECODER:
+            content = _read_metadata_content(s3, s3_uri, head)
+            nodes = _slim_nodes(decode_json(content, decoder))
+        elif cache_file := _open_metadata_cache(s3_uri, etag):
+            with cache_file:
+                nodes = dict(iter_manifest_nodes(cache_file))
+        else:
+            response = s3.get_object(Bucket=bucket_name, Key=file_key, IfMatch=etag)
+            with metadata_cache_writer(s3_uri, etag) as sink:
+                stream = _TeeStream(response["Body"], sink)
+                nodes = dict(iter_manifest_nodes(stream))
+                stream.drain()
+    except ClientError as e:
+        error_code = e.response["Error"]["Code"]
+        print(f"Client error occurred: {error_code}")
+        raise
+    except (ijson.JSONError, json.JSONDecodeError):
+        print("Error decoding manifest JSON.")
+        raise
+
+    manifest = {"nodes": nodes}
+    _remember(_manifest_nodes_memo, memo_key, manifest)
+
+    return manifest
+
+
+# Problems with CaDeT model names, see fqn_problems. Only the second makes a
+# name invalid.
+FQN_MULTIPLE_DOUBLE_UNDERSCORES = (
+    "has multiple double underscores which will confuse parsing"
+)
+FQN_NOT_DATABASE_TABLE = "does not match database__table format"
+
+_DATABASE_TABLE_NAME = re.compile(r"\w+__\w+")
+
+
+def fqn_problems(fqn: list[str]) -> list[str]:
+    """The problems with a CaDeT model's fully qualified name, if any"""
     table_name = fqn[-1]
+    problems = []
+    if table_name.count("__") > 1:
+        problems.append(FQN_MULTIPLE_DOUBLE_UNDERSCORES)
+    if not _DATABASE_TABLE_NAME.match(table_name):
+        problems.append(FQN_NOT_DATABASE_TABLE)
+    return problems
+
+
+def validate_fqn(fqn: list[str], log: bool = True) -> bool:
+    """The table name for CaDeT models should be of form {database}__{table}"""
+    problems = fqn_problems(fqn)
+    if log:
+        table_name = fqn[-1]
+        for problem in problems:
+            logging.warning(f"{table_name=} {problem}")
+
+    return FQN_NOT_DATABASE_TABLE not in problems
 
-    double_underscores = re.findall("__", table_name)
-    if len(double_underscores) > 1:
-        logging.warning(
-            f"{table_name=} has multiple double underscores which will confuse parsing"
-        )
 
-    match: re.Match[str] | None = re.match(r"\w+__\w+", table_name)
-    if match:
-        return True
-    if not match:
-        logging.warning(f"{table_name=} does not match database__table format")
-        return False
+@dataclass
+class FqnValidationSummary:
+    """
+    Validates many fqns, see validate_fqn, collecting the table names with
+    each problem instead of logging every one.
+    """
+
+    checked: int = 0
+    problems: Dict[str, List[str]] = field(default_factory=dict)
+
+    def validate(self, fqn: list[str]) -> bool:
+        self.checked += 1
+        problems = fqn_problems(fqn)
+        for problem in problems:
+            self.problems.setdefault(problem, []).append(fqn[-1])
+        return FQN_NOT_DATABASE_TABLE not in problems
+
+    def log(self, examples: int = 5) -> None:
+        """Log one line per problem, with a few example names"""
+        for problem, table_names in self.problems.items():
+            logging.warning(
+                f"{len(table_names)} of {self.checked} table names {problem}, "
+                f"eg. {table_names[:examples]}"
+            )
 
 
 def parse_database_and_table_names(node: dict) -> tuple[str, str]:
@@ -128,28 +569,94 @@ def parse_database_and_table_names(node: dict) -> tuple[str, str]:
     return node_database_name, node_table_name
 
 
-def is_excluded_name(name: str | None) -> bool:
-    if not name:
-        return False
+class ExcludedNameMatcher:
+    """
+    Finds EXCLUDED_NAME_PATTERNS in names using a single compiled regex, so
+    all of a node's names, or all the names of many nodes, are checked in
+    one scan. Matching is case insensitive.
+    """
 
-    return any(pattern in name.lower() for pattern in EXCLUDED_NAME_PATTERNS)
+    # Joins names so a pattern can't match across two of them
+    SEPARATOR = "\0"
 
+    def __init__(self, patterns: tuple[str, ...] = EXCLUDED_NAME_PATTERNS):
+        # longest first, so that eg. "testing" is reported rather than "test"
+        alternatives = sorted(patterns, key=len, reverse=True)
+        self.regex = re.compile("|".join(re.escape(p.lower()) for p in alternatives))
+
+    def search(self, name: str | None) -> Optional[str]:
+        """The excluded pattern found in the name, if any"""
+        if not name:
+            return None
+        match = self.regex.search(name.lower())
+        return match.group() if match else None
+
+    def match_fields(self, fields: dict[str, str | None]) -> Optional[tuple[str, str]]:
+        """
+        The first field (in the order given) containing an excluded pattern,
+        and the pattern, or None if no field does
+        """
+        return self.match_nodes([(None, fields)]).get(None)
+
+    def match_nodes(self, nodes) -> Dict:
+        """
+        Check a collection of (key, fields) pairs, where fields is a dict of
+        field name to value as for match_fields. Returns a dict of key to
+        (field, pattern) for the nodes that contain an excluded pattern.
+        """
+        segments = []
+        segment_starts = []
+        position = 0
+        for key, fields in nodes:
+            for field_name, value in fields.items():
+                if value:
+                    segments.append(value)
+                    segment_starts.append((position, key, field_name))
+                    position += len(value) + len(self.SEPARATOR)
+
+        matches: Dict = {}
+        text = self.SEPARATOR.join(segments).lower()
+        segment = 0
+        for match in self.regex.finditer(text):
+            # matches are in order, so walk forward to the matching segment
+            while (
+                segment + 1 < len(segment_starts)
+                and segment_starts[segment + 1][0] <= match.start()
+            ):
+                segment += 1
+            _, key, field_name = segment_starts[segment]
+            matches.setdefault(key, (field_name, match.group()))
+
+        return matches
+
+
+EXCLUDED_NAME_MATCHER = ExcludedNameMatcher()
+
+
+def is_excluded_name(name: str | None) -> bool:
+    return EXCLUDED_NAME_MATCHER.search(name) is not None
 
-def should_display_dbt_manifest_node(node: dict) -> bool:
-    candidate_values = [
-        node.get("unique_id"),
-        node.get("database"),
-        node.get("schema"),
-        node.get("name"),
-        node.get("alias"),
-        node.get("identifier"),
-    ]
+
+def dbt_manifest_node_names(node: dict) -> dict[str, str | None]:
+    """The names of a manifest node that are checked for excluded patterns"""
+    names = {
+        "unique_id": node.get("unique_id"),
+        "database": node.get("database"),
+        "schema": node.get("schema"),
+        "name": node.get("name"),
+        "alias": node.get("alias"),
+        "identifier": node.get("identifier"),
+    }
 
     fqn = node.get("fqn", [])
     if fqn:
-        candidate_values.append(fqn[-1])
+        names["fqn"] = fqn[-1]
+
+    return names
 
-    return not any(is_excluded_name(value) for value in candidate_values)
+
+def should_display_dbt_manifest_node(node: dict) -> bool:
+    return EXCLUDED_NAME_MATCHER.match_fields(dbt_manifest_node_names(node)) is None
 
 
 def get_tags(dbt_manifest_node: dict) -> set[str]:
@@ -184,41 +691,6 @@ def make_user_mcp(email: str) -> MetadataChangeProposalWrapper:
     return user_mcp
 
 
-ValueType = TypeVar("ValueType")
-
-
-class NodeLookup(Generic[ValueType]):
-    """
-    Container class for storing values associated with a node.
-    Values can be fetched by database and table, or iterated over.
-    """
-
-    def __init__(self):
-        self.database_lookup = {}
-        self.table_lookup = {}
-
-    def get(self, database: str, table: str = "") -> ValueType:
-        """
-        Get the value associated with a database/table.
-        If table is ommitted, return the value from the last added
-        node matching the database.
-        """
-        if table:
-            return self.table_lookup[(database, table)]
-        else:
-            return self.database_lookup[database]
-
-    def set(self, database: str, table: str, value: ValueType):
-        self.database_lookup[database] = value
-        self.table_lookup[(database, table)] = value
-
-    def __iter__(self):
-        return (
-            (database, table, domain)
-            for ((database, table), domain) in self.table_lookup.items()
-        )
-
-
 def get_subject_areas():
     """
     Returns a list of top level subject areas from the subject_areas_template.yaml file
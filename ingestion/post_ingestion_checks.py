@@ -3,18 +3,11 @@ import json
 import logging
 import os
 
-import datahub.emitter.mce_builder as mce_builder
-import datahub.emitter.mcp_builder as mcp_builder
 from datahub.ingestion.graph.client import DataHubGraph
 from datahub.ingestion.graph.config import DatahubClientConfig
 
-from ingestion.config import ENV, INSTANCE, PLATFORM
-from ingestion.ingestion_utils import (
-    get_cadet_metadata_json,
-    get_tags,
-    parse_database_and_table_names,
-    validate_fqn,
-)
+from ingestion.cadet_manifest_index import CadetManifestIndex, get_cadet_manifest_index
+from ingestion.ingestion_utils import JSON_DECODERS, STREAMING_JSON_DECODER
 
 logging.basicConfig(level=logging.INFO)
 
@@ -47,35 +40,13 @@ query isPartOfRelationship($urn: String!) {
 """
 
 
-def _get_table_database_mappings(manifest):
+def _get_table_database_mappings(manifest_index: CadetManifestIndex):
     # mappings is a dictionary where the key is the dataset urn and the value is the database urn
-    mappings = {}
-    for node in manifest["nodes"]:
-        if manifest["nodes"][node]["resource_type"] in ["model", "seed"]:
-            fqn = manifest["nodes"][node]["fqn"]
-            if validate_fqn(fqn):
-                database, table_name = parse_database_and_table_names(
-                    manifest["nodes"][node]
-                )
-
-                dataset_urn = mce_builder.make_dataset_urn_with_platform_instance(
-                    name=f"{database}.{table_name}",
-                    platform=PLATFORM,
-                    platform_instance=INSTANCE,
-                    env=ENV,
-                )
-                database_key = mcp_builder.DatabaseKey(
-                    database=database,
-                    platform=PLATFORM,
-                    instance=INSTANCE,
-                    env=ENV,
-                    backcompat_env_as_instance=True,
-                )
-                database_urn = database_key.as_urn()
-                if "dc_display_in_catalogue" in get_tags(manifest["nodes"][node]):
-                    mappings[dataset_urn] = database_urn
-
-    return mappings
+    return {
+        entry.dataset_urn: entry.database_urn
+        for entry in manifest_index
+        if "dc_display_in_catalogue" in entry.tags
+    }
 
 
 def _remove_empty_dicts(d):
@@ -194,10 +165,14 @@ def counts_by_platform(env: str, platforms: list, graph: DataHubGraph):
         output_file.write(f"{env.lower()}_results={json.dumps(query_results)}\n")
 
 
-def relations_check(s3_manifest_path: str, graph: DataHubGraph):
-    manifest = get_cadet_metadata_json(s3_manifest_path)
+def relations_check(
+    s3_manifest_path: str,
+    graph: DataHubGraph,
+    json_decoder: str = STREAMING_JSON_DECODER,
+):
+    manifest_index = get_cadet_manifest_index(s3_manifest_path, json_decoder)
 
-    mappings = _get_table_database_mappings(manifest)
+    mappings = _get_table_database_mappings(manifest_index)
 
     missing_is_part_of = check_is_part_of_relationships(mappings, graph)
 
@@ -291,6 +266,12 @@ if __name__ == "__main__":
         required=False,
         help="path to the dbt manifest file in s3",
     )
+    parser.add_argument(
+        "--json-decoder",
+        choices=[STREAMING_JSON_DECODER, *JSON_DECODERS],
+        default=STREAMING_JSON_DECODER,
+        help="how to read the dbt manifest. ijson streams it, the others decode it whole",
+    )
     parser.add_argument(
         "--prod-results",
         required=False,
@@ -314,7 +295,11 @@ if __name__ == "__main__":
             server=os.environ["DATAHUB_GMS_URL"], token=os.environ["DATAHUB_GMS_TOKEN"]
         )
         graph = DataHubGraph(server_config)
-        FUNCTION_MAP[args.command](s3_manifest_path=args.s3_manifest_path, graph=graph)
+        FUNCTION_MAP[args.command](
+            s3_manifest_path=args.s3_manifest_path,
+            graph=graph,
+            json_decoder=args.json_decoder,
+        )
     elif args.command == "compare":
         comparison_results = FUNCTION_MAP[args.command](
             platforms=args.platforms,
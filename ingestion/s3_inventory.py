@@ -0,0 +1,160 @@
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import unquote_plus
+
+from ingestion.s3_location_scanner import max_last_modified
+from ingestion.s3_scan_planner import LocationTrie, parse_s3_location
+
+# Used for local inventory files that don't come with a manifest.json
+DEFAULT_INVENTORY_SCHEMA = "Bucket, Key, Size, LastModifiedDate"
+
+
+@dataclass
+class InventoryFile:
+    name: str
+    open: Callable[[], io.RawIOBase]
+
+
+@dataclass
+class Inventory:
+    """
+    An S3 Inventory report, see
+    https://docs.aws.amazon.com/AmazonS3/latest/userguide/storage-inventory.html
+    """
+
+    file_format: str
+    # column names of CSV files
+    schema: List[str]
+    files: List[InventoryFile] = field(default_factory=list)
+
+
+def _parse_schema(file_schema: str) -> List[str]:
+    return [column.strip() for column in file_schema.split(",")]
+
+
+def load_inventory(source: str, s3_client=None) -> Inventory:
+    """
+    Find the data files of an inventory. The source is either the s3 uri of
+    an inventory manifest.json, a local manifest.json, or a local directory
+    of inventory files (.csv or .csv.gz), optionally with a manifest.json
+    describing them. Only CSV inventories are supported.
+    """
+    if parse_s3_location(source):
+        bucket, key = parse_s3_location(source)
+        manifest = json.load(s3_client.get_object(Bucket=bucket, Key=key)["Body"])
+        # data file keys are relative to the destination bucket
+        destination = manifest["destinationBucket"].split(":::")[-1]
+        files = [
+            InventoryFile(
+                f"s3://{destination}/{data_file['key']}",
+                lambda data_key=data_file["key"]: s3_client.get_object(
+                    Bucket=destination, Key=data_key
+                )["Body"],
+            )
+            for data_file in manifest["files"]
+        ]
+        return Inventory(
+            manifest["fileFormat"], _parse_schema(manifest["fileSchema"]), files
+        )
+
+    if os.path.isfile(source):
+        with open(source) as manifest_file:
+            manifest = json.load(manifest_file)
+        directory = os.path.dirname(source)
+        paths = [
+            os.path.join(directory, os.path.basename(data_file["key"]))
+            for data_file in manifest["files"]
+        ]
+        inventory = Inventory(
+            manifest["fileFormat"], _parse_schema(manifest["fileSchema"])
+        )
+    else:
+        manifest_path = os.path.join(source, "manifest.json")
+        if os.path.exists(manifest_path):
+            return load_inventory(manifest_path)
+        paths = sorted(
+            os.path.join(source, name)
+            for name in os.listdir(source)
+            if name.endswith((".csv", ".csv.gz"))
+        )
+        inventory = Inventory("CSV", _parse_schema(DEFAULT_INVENTORY_SCHEMA))
+
+    inventory.files = [
+        InventoryFile(path, lambda path=path: open(path, "rb")) for path in paths
+    ]
+    return inventory
+
+
+def _iter_csv_rows(
+    inventory: Inventory, inventory_file: InventoryFile
+) -> Iterator[tuple[str, str, Optional[datetime]]]:
+    bucket_column = inventory.schema.index("Bucket")
+    key_column = inventory.schema.index("Key")
+    last_modified_column = inventory.schema.index("LastModifiedDate")
+
+    with inventory_file.open() as raw:
+        stream = raw
+        if inventory_file.name.endswith(".gz"):
+            stream = gzip.GzipFile(fileobj=raw)
+        for row in csv.reader(line.decode("utf-8") for line in stream):
+            last_modified = row[last_modified_column]
+            yield (
+                row[bucket_column],
+                # keys are url encoded in inventory reports
+                unquote_plus(row[key_column]),
+                datetime.fromisoformat(last_modified) if last_modified else None,
+            )
+
+
+def iter_inventory_rows(
+    inventory: Inventory,
+) -> Iterator[tuple[str, str, Optional[datetime]]]:
+    """Stream (bucket, key, last modified) for every object in the inventory"""
+    for inventory_file in inventory.files:
+        logging.info(f"Reading inventory file {inventory_file.name}")
+        if inventory.file_format.upper() == "CSV":
+            yield from _iter_csv_rows(inventory, inventory_file)
+        else:
+            raise ValueError(
+                f"{inventory.file_format} inventory files are not supported"
+            )
+
+
+class InventoryIndex:
+    """
+    The latest LastModified of each table location, built from inventory
+    rows. Like a listing, each object counts towards the deepest table
+    location containing it, so db/table_old isn't part of db/table, see
+    LocationTrie.
+    """
+
+    def __init__(self, locations: Iterable[str]):
+        self.tries: Dict[str, LocationTrie] = {}
+        self.latest: Dict[str, Optional[datetime]] = {}
+        self.rows = 0
+        for location in sorted(set(locations)):
+            self.latest[location] = None
+            bucket_and_prefix = parse_s3_location(location)
+            if bucket_and_prefix:
+                bucket, prefix = bucket_and_prefix
+                self.tries.setdefault(bucket, LocationTrie()).add(prefix, location)
+
+    def add(self, bucket: str, key: str, last_modified: Optional[datetime]) -> None:
+        self.rows += 1
+        trie = self.tries.get(bucket)
+        location = trie.route(key) if trie else None
+        if location:
+            self.latest[location] = max_last_modified(
+                self.latest[location], last_modified
+            )
+
+    def add_inventory(self, inventory: Inventory) -> None:
+        for bucket, key, last_modified in iter_inventory_rows(inventory):
+            self.add(bucket, key, last_modified)
@@ -0,0 +1,384 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from functools import partial
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import unquote
+
+from botocore.exceptions import ClientError
+
+from ingestion.s3_scan_planner import (
+    ScanListing,
+    ScanPlanner,
+    parse_s3_location,
+    table_prefix,
+)
+from ingestion.scan_metrics import LocationScanCost
+from ingestion.utils import Stopwatch
+
+# S3 error codes that mean we should slow down and retry
+THROTTLING_ERROR_CODES = {
+    "SlowDown",
+    "Throttling",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+    "TooManyRequestsException",
+    "503",
+}
+
+
+class _BucketThrottle:
+    """
+    Limits the requests in flight to one bucket, and adapts a delay between
+    them. The delay doubles each time the bucket throttles us, and halves
+    after each successful request.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        initial_backoff_seconds: float,
+        max_backoff_seconds: float,
+    ):
+        self.in_flight = threading.BoundedSemaphore(max_in_flight)
+        self.initial_backoff_seconds = initial_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.delay_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def throttled(self) -> None:
+        with self.lock:
+            self.delay_seconds = min(
+                self.max_backoff_seconds,
+                max(self.initial_backoff_seconds, self.delay_seconds * 2),
+            )
+
+    def succeeded(self) -> None:
+        with self.lock:
+            self.delay_seconds /= 2
+            if self.delay_seconds < self.initial_backoff_seconds:
+                self.delay_seconds = 0.0
+
+
+class S3LocationScanner:
+    """
+    Finds the latest LastModified time of the objects under many s3
+    locations, listing several locations at once.
+
+    The number of listings in flight to any one bucket is limited, and
+    requests are retried with an adaptive backoff when S3 asks us to slow
+    down. Results don't depend on the order the listings complete in.
+
+    With a planner, tables under a common prefix can share a listing, see
+    ScanPlanner, otherwise each location is listed separately.
+
+    Locations with Hive style partitions (eg. snapshot_date=2024-01-01/) can
+    be scanned by walking down the newest partition of each partition key
+    with delimited listings, and only listing the objects under that
+    partition. This assumes the newest partition holds the newest objects.
+    """
+
+    def __init__(
+        self,
+        s3_client,
+        max_workers: int = 16,
+        max_in_flight_per_bucket: int = 8,
+        max_retries: int = 5,
+        initial_backoff_seconds: float = 0.2,
+        max_backoff_seconds: float = 20.0,
+        planner: Optional[ScanPlanner] = None,
+    ):
+        self.s3_client = s3_client
+        self.planner = planner
+        self.max_workers = max_workers
+        self.max_in_flight_per_bucket = max_in_flight_per_bucket
+        self.max_retries = max_retries
+        self.initial_backoff_seconds = initial_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.throttles: Dict[str, _BucketThrottle] = {}
+        self.throttles_lock = threading.Lock()
+        self.list_calls = 0
+        self.throttled_calls = 0
+        self.shared_listings = 0
+        self.partitioned_scans = 0
+        # the number and total size of the objects under each location that
+        # was listed successfully, or None if only a partition was listed
+        self.object_stats: Dict[str, Optional[tuple[int, int]]] = {}
+        self.costs: Dict[str, LocationScanCost] = {}
+        self.counts_lock = threading.Lock()
+        # pages and objects listed by the scan running in each worker thread
+        self.current_scan = threading.local()
+
+    def latest_last_modified(
+        self,
+        locations: Iterable[str],
+        partition_keys: Optional[Dict[str, List[tuple[str, str]]]] = None,
+        on_scanned: Optional[Callable[[Dict[str, Optional[datetime]]], None]] = None,
+    ) -> Dict[str, Optional[datetime]]:
+        """
+        The latest LastModified for each s3 uri, or None if there are no
+        objects, it isn't an s3 uri, or it couldn't be listed. The result is
+        sorted by location.
+
+        partition_keys gives the (name, type) of the partition keys of any
+        partitioned locations, which are scanned by partition.
+
+        on_scanned is called with the results of each listing as soon as it
+        completes, from the calling thread.
+        """
+        partition_keys = partition_keys or {}
+        unique_locations = sorted(set(locations))
+        partitioned = [
+            location for location in unique_locations if partition_keys.get(location)
+        ]
+        listings = self.plan(
+            [
+                location
+                for location in unique_locations
+                if location not in partition_keys
+            ]
+        )
+        self.shared_listings += sum(listing.is_shared for listing in listings)
+
+        scans = [
+            (listing.locations, partial(self._scan_listing, listing))
+            for listing in listings
+        ]
+        scans += [
+            (
+                (location,),
+                partial(self._scan_partitions, location, partition_keys[location]),
+            )
+            for location in partitioned
+        ]
+        results: Dict[str, Optional[datetime]] = dict.fromkeys(unique_locations)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(self._measure, scan_locations, scan)
+                for scan_locations, scan in scans
+            ]
+            for future in as_completed(futures):
+                scan_results = future.result()
+                results.update(scan_results)
+                if on_scanned:
+                    on_scanned(scan_results)
+        return results
+
+    def _measure(
+        self,
+        locations: tuple[str, ...],
+        scan: Callable[[], Dict[str, Optional[datetime]]],
+    ) -> Dict[str, Optional[datetime]]:
+        """Runs a scan, recording its cost against the locations it covers"""
+        self.current_scan.pages = 0
+        self.current_scan.objects = 0
+        with Stopwatch() as stopwatch:
+            scan_results = scan()
+
+        share = len(locations)
+        with self.counts_lock:
+            for location in locations:
+                self.costs[location] = LocationScanCost(
+                    pages=self.current_scan.pages / share,
+                    objects=self.current_scan.objects / share,
+                    seconds=stopwatch.elapsed / share,
+                )
+        return scan_results
+
+    def plan(self, locations: List[str]) -> List[ScanListing]:
+        if self.planner:
+            return self.planner.plan(locations)
+
+        listings = []
+        for location in locations:
+            bucket_and_prefix = parse_s3_location(location)
+            if bucket_and_prefix:
+                bucket, prefix = bucket_and_prefix
+                listings.append(ScanListing(bucket, table_prefix(prefix), (location,)))
+        return listings
+
+    def _throttle(self, bucket: str) -> _BucketThrottle:
+        with self.throttles_lock:
+            if bucket not in self.throttles:
+                self.throttles[bucket] = _BucketThrottle(
+                    self.max_in_flight_per_bucket,
+                    self.initial_backoff_seconds,
+                    self.max_backoff_seconds,
+                )
+            return self.throttles[bucket]
+
+    def _scan_listing(self, listing: ScanListing) -> Dict[str, Optional[datetime]]:
+        """The latest LastModified of each location covered by the listing"""
+        route = listing.router()
+        latest: Dict[str, Optional[datetime]] = dict.fromkeys(listing.locations)
+        stats = {location: (0, 0) for location in listing.locations}
+        try:
+            for page in self._iter_pages(listing.bucket, listing.prefix):
+                for s3_object in page.get("Contents", []):
+                    location = route(s3_object["Key"])
+                    if location:
+                        latest[location] = max_last_modified(
+                            latest[location], s3_object.get("LastModified")
+                        )
+                        objects, size = stats[location]
+                        stats[location] = (objects + 1, size + s3_object.get("Size", 0))
+        except ClientError as error:
+            logging.warning(
+                "Could not list objects in s3://%s/%s: %s",
+                listing.bucket,
+                listing.prefix,
+                error,
+            )
+            return dict.fromkeys(listing.locations)
+
+        with self.counts_lock:
+            self.object_stats.update(stats)
+        return latest
+
+    def _scan_partitions(
+        self, location: str, partition_keys: List[tuple[str, str]]
+    ) -> Dict[str, Optional[datetime]]:
+        bucket_and_prefix = parse_s3_location(location)
+        if not bucket_and_prefix:
+            return {location: None}
+        bucket, prefix = bucket_and_prefix
+        prefix = table_prefix(prefix)
+
+        with self.counts_lock:
+            self.partitioned_scans += 1
+        try:
+            latest = self._latest_in_partition(bucket, prefix, partition_keys)
+        except ClientError as error:
+            logging.warning("Could not list objects in %s: %s", location, error)
+            return {location: None}
+
+        with self.counts_lock:
+            self.object_stats[location] = None
+        return {location: latest}
+
+    def _latest_in_partition(
+        self, bucket: str, prefix: str, partition_keys: List[tuple[str, str]]
+    ) -> Optional[datetime]:
+        """
+        The latest LastModified under the prefix, descending into the newest
+        partition for each of the partition keys. Falls back to listing
+        everything under the prefix if it isn't laid out in partitions.
+        """
+        if not partition_keys:
+            return self._latest_under(bucket, prefix)
+
+        key_name, key_type = partition_keys[0]
+        latest_file = None
+        partitions: Dict[str, str] = {}
+        for page in self._iter_pages(bucket, prefix, delimiter="/"):
+            for s3_object in page.get("Contents", []):
+                latest_file = max_last_modified(
+                    latest_file, s3_object.get("LastModified")
+                )
+            for common_prefix in page.get("CommonPrefixes", []):
+                partition = common_prefix["Prefix"][len(prefix) :].rstrip("/")
+                name, separator, value = partition.partition("=")
+                if not separator or name != key_name:
+                    logging.info(
+                        "s3://%s/%s isn't partitioned by %s, listing all of it",
+                        bucket,
+                        prefix,
+                        key_name,
+                    )
+                    return self._latest_under(bucket, prefix)
+                partitions[value] = common_prefix["Prefix"]
+
+        sort_key = partial(_partition_sort_key, key_type)
+        for value in sorted(partitions, key=sort_key, reverse=True):
+            latest = self._latest_in_partition(
+                bucket, partitions[value], partition_keys[1:]
+            )
+            # empty partitions are skipped in favour of the next newest
+            if latest:
+                return max_last_modified(latest_file, latest)
+        return latest_file
+
+    def _latest_under(self, bucket: str, prefix: str) -> Optional[datetime]:
+        latest = None
+        for page in self._iter_pages(bucket, prefix):
+            for s3_object in page.get("Contents", []):
+                latest = max_last_modified(latest, s3_object.get("LastModified"))
+        return latest
+
+    def _iter_pages(
+        self, bucket: str, prefix: str, delimiter: Optional[str] = None
+    ) -> Iterator[dict]:
+        request = {"Bucket": bucket, "Prefix": prefix}
+        if delimiter:
+            request["Delimiter"] = delimiter
+        while True:
+            page = self._list_objects(request)
+            yield page
+            if not page.get("IsTruncated"):
+                return
+            request["ContinuationToken"] = page["NextContinuationToken"]
+
+    def _list_objects(self, request: dict) -> dict:
+        """One list_objects_v2 call, retried while the bucket is throttling us"""
+        throttle = self._throttle(request["Bucket"])
+        attempt = 0
+        while True:
+            if throttle.delay_seconds:
+                time.sleep(throttle.delay_seconds)
+            with throttle.in_flight:
+                with self.counts_lock:
+                    self.list_calls += 1
+                try:
+                    page = self.s3_client.list_objects_v2(**request)
+                except ClientError as error:
+                    error_code = error.response.get("Error", {}).get("Code")
+                    if error_code not in THROTTLING_ERROR_CODES:
+                        raise
+                    with self.counts_lock:
+                        self.throttled_calls += 1
+                    throttle.throttled()
+                    attempt += 1
+                    if attempt > self.max_retries:
+                        raise
+                    continue
+            throttle.succeeded()
+            if hasattr(self.current_scan, "pages"):
+                self.current_scan.pages += 1
+                self.current_scan.objects += len(page.get("Contents", []))
+            return page
+
+
+def max_last_modified(
+    latest: Optional[datetime], last_modified: Optional[datetime]
+) -> Optional[datetime]:
+    if last_modified and (latest is None or last_modified > latest):
+        return last_modified
+    return latest
+
+
+# Glue column types whose partition values sort as numbers or dates
+NUMERIC_PARTITION_TYPES = {"tinyint", "smallint", "int", "integer", "bigint"}
+DATE_PARTITION_TYPES = {"date", "timestamp"}
+HIVE_DEFAULT_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+def _partition_sort_key(key_type: str, value: str) -> tuple:
+    """
+    Sorts partition values of the given Glue type oldest first. Values that
+    can't be parsed, and the hive default partition, sort before the rest.
+    """
+    value = unquote(value)
+    if value == HIVE_DEFAULT_PARTITION:
+        return (0, "")
+
+    key_type = key_type.lower()
+    try:
+        if key_type in NUMERIC_PARTITION_TYPES:
+            return (2, int(value))
+        if key_type in DATE_PARTITION_TYPES:
+            return (2, datetime.fromisoformat(value).replace(tzinfo=None))
+    except ValueError:
+        return (1, value)
+    return (2, value)
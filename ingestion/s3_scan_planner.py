@@ -0,0 +1,190 @@
+import math
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+# list_objects_v2 returns at most this many keys per call
+S3_LIST_PAGE_SIZE = 1000
+
+
+def parse_s3_location(s3_uri: str) -> Optional[tuple[str, str]]:
+    """The bucket and prefix of an s3 uri, or None if it isn't one"""
+    parsed_s3_uri = urlparse(s3_uri)
+    if parsed_s3_uri.scheme != "s3" or not parsed_s3_uri.netloc:
+        return None
+    return parsed_s3_uri.netloc, parsed_s3_uri.path.lstrip("/")
+
+
+def table_prefix(prefix: str) -> str:
+    """
+    The prefix a table's objects are listed with, ending in / so that
+    sibling prefixes like db/table_old aren't mistaken for db/table
+    """
+    return prefix if not prefix or prefix.endswith("/") else prefix + "/"
+
+
+@dataclass(frozen=True)
+class ScanListing:
+    """
+    One paginated listing of a bucket prefix, covering one or more table
+    locations. Keys are routed to the deepest location containing them.
+    """
+
+    bucket: str
+    prefix: str
+    locations: tuple[str, ...]
+
+    @property
+    def is_shared(self) -> bool:
+        return len(self.locations) > 1
+
+    def router(self) -> Callable[[str], Optional[str]]:
+        """
+        Returns a function giving the location of a key from this listing.
+        Keys are routed the same way whether or not the listing is shared,
+        so sharing only changes the cost of a scan, never its results.
+        """
+        trie = LocationTrie()
+        for location in self.locations:
+            trie.add(parse_s3_location(location)[1], location)
+        return trie.route
+
+
+class _TrieNode:
+    __slots__ = ("children", "location", "prefix")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        # the s3 uri and prefix of the table stored at this node, if any
+        self.location: Optional[str] = None
+        self.prefix: Optional[str] = None
+
+
+def _segments(prefix: str) -> List[str]:
+    return [segment for segment in prefix.split("/") if segment]
+
+
+class LocationTrie:
+    """Table locations in one bucket, stored by path segment"""
+
+    def __init__(self):
+        self.root = _TrieNode()
+
+    def add(self, prefix: str, location: str) -> None:
+        node = self.root
+        for segment in _segments(prefix):
+            node = node.children.setdefault(segment, _TrieNode())
+        node.location = location
+        node.prefix = table_prefix(prefix)
+
+    def route(self, key: str) -> Optional[str]:
+        """The deepest location whose path contains the key, if any"""
+        node = self.root
+        deepest = self.root.location
+        # the last segment is the object's name, not a directory
+        for segment in _segments(key.rpartition("/")[0]):
+            node = node.children.get(segment)
+            if node is None:
+                break
+            if node.location is not None:
+                deepest = node.location
+        return deepest
+
+
+class ScanPlanner:
+    """
+    Decides how to list a set of table locations. Tables under a common
+    prefix can share one listing of that prefix, which is cheaper when they
+    each hold few objects, as every listing costs at least one request.
+
+    The cost of a plan is the estimated number of list requests. Object
+    counts come from estimate_objects where it knows the location, otherwise
+    default_objects_per_location. A shared listing also returns objects that
+    aren't in any table location, so its estimate is scaled up by
+    shared_listing_overhead. Whole buckets are never listed.
+    """
+
+    def __init__(
+        self,
+        estimate_objects: Callable[[str], Optional[int]] = lambda location: None,
+        default_objects_per_location: int = 100,
+        shared_listing_overhead: float = 1.5,
+        page_size: int = S3_LIST_PAGE_SIZE,
+    ):
+        self.estimate_objects = estimate_objects
+        self.default_objects_per_location = default_objects_per_location
+        self.shared_listing_overhead = shared_listing_overhead
+        self.page_size = page_size
+
+    def plan(self, locations: Iterable[str]) -> List[ScanListing]:
+        """
+        Listings covering each s3 location exactly once. Anything that
+        isn't an s3 uri is left out.
+        """
+        tries: Dict[str, LocationTrie] = {}
+        for location in sorted(set(locations)):
+            bucket_and_prefix = parse_s3_location(location)
+            if bucket_and_prefix:
+                bucket, prefix = bucket_and_prefix
+                tries.setdefault(bucket, LocationTrie()).add(prefix, location)
+
+        listings: List[ScanListing] = []
+        for bucket, trie in tries.items():
+            if trie.root.location is not None:
+                # a table at the root of the bucket covers everything
+                listings.append(self._listing(bucket, trie.root, []))
+                continue
+            for segment, child in sorted(trie.root.children.items()):
+                listings.extend(self._plan_node(bucket, child, [segment])[1])
+        return listings
+
+    def _pages(self, objects: float) -> int:
+        return max(1, math.ceil(objects / self.page_size))
+
+    def _listing(self, bucket: str, node: _TrieNode, path: List[str]) -> ScanListing:
+        locations = []
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current.location is not None:
+                locations.append(current.location)
+            stack.extend(current.children.values())
+
+        if node.location is not None:
+            # list with the table's own prefix, as it would be on its own
+            prefix = node.prefix
+        else:
+            prefix = "/".join(path) + "/"
+        return ScanListing(bucket, prefix, tuple(sorted(locations)))
+
+    def _plan_node(
+        self, bucket: str, node: _TrieNode, path: List[str]
+    ) -> tuple[int, List[ScanListing], float]:
+        """The cost, listings and estimated objects of the subtree at node"""
+        objects = 0.0
+        if node.location is not None:
+            estimate = self.estimate_objects(node.location)
+            objects = (
+                estimate if estimate is not None else self.default_objects_per_location
+            )
+
+        split_cost = 0
+        split_listings: List[ScanListing] = []
+        for segment, child in sorted(node.children.items()):
+            child_cost, child_listings, child_objects = self._plan_node(
+                bucket, child, path + [segment]
+            )
+            split_cost += child_cost
+            split_listings.extend(child_listings)
+            objects += child_objects
+
+        if not node.children:
+            return self._pages(objects), [self._listing(bucket, node, path)], objects
+
+        shared_cost = self._pages(objects * self.shared_listing_overhead)
+        # a table's listing includes the tables under it, so they can't be
+        # split out, and otherwise prefer separate listings as they run in
+        # parallel
+        if node.location is not None or shared_cost < split_cost:
+            return shared_cost, [self._listing(bucket, node, path)], objects
+        return split_cost, split_listings, objects
@@ -0,0 +1,131 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS location_scans (
+    location TEXT PRIMARY KEY,
+    latest_last_modified TEXT,
+    objects INTEGER,
+    bytes INTEGER,
+    scanned_at REAL NOT NULL,
+    glue_update_time TEXT
+)
+"""
+
+
+@dataclass(frozen=True)
+class CachedScan:
+    """The result of the last scan of an s3 location"""
+
+    location: str
+    latest_last_modified: Optional[datetime]
+    # None if only the newest partition was listed
+    objects: Optional[int]
+    bytes: Optional[int]
+    # seconds since the epoch
+    scanned_at: float
+    # the Glue table's UpdateTime when it was scanned
+    glue_update_time: Optional[datetime]
+
+
+def _to_text(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _from_text(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+class LocationTimestampCache:
+    """
+    The latest LastModified of each s3 location, kept in a SQLite database
+    between runs so that unchanged locations needn't be listed again.
+
+    This is a TTL cache: a cached scan is used while it is younger than
+    ttl_seconds, so a timestamp can be up to ttl_seconds out of date.
+    Writing new files to a table doesn't change its Glue UpdateTime, so
+    checking that only catches changes to the table definition (such as a
+    new location), not new data. Older scans are only used for their object
+    counts, to estimate the cost of listings, see ScanPlanner.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # written to from the scanner's calling thread only, but the lock
+        # keeps it safe to share
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.execute(SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def load(self, locations: Iterable[str]) -> Dict[str, CachedScan]:
+        """Every cached scan of the locations, however old"""
+        scans = {}
+        with self.lock:
+            for location in set(locations):
+                row = self.connection.execute(
+                    "SELECT latest_last_modified, objects, bytes, scanned_at,"
+                    " glue_update_time FROM location_scans WHERE location = ?",
+                    (location,),
+                ).fetchone()
+                if row is None:
+                    continue
+                latest, objects, size, scanned_at, glue_update_time = row
+                scans[location] = CachedScan(
+                    location,
+                    _from_text(latest),
+                    objects,
+                    size,
+                    scanned_at,
+                    _from_text(glue_update_time),
+                )
+        return scans
+
+    def is_fresh(
+        self,
+        scan: CachedScan,
+        glue_update_time: Optional[datetime],
+        now: Optional[float] = None,
+    ) -> bool:
+        """
+        Whether the scan can be used instead of listing the location again:
+        it is younger than the ttl and the Glue table definition hasn't been
+        updated since. Files added since the scan are not detected.
+        """
+        now = time.time() if now is None else now
+        if now - scan.scanned_at >= self.ttl_seconds:
+            return False
+        if glue_update_time and glue_update_time != scan.glue_update_time:
+            logging.debug("%s changed in Glue since it was scanned", scan.location)
+            return False
+        return True
+
+    def store(self, scans: Iterable[CachedScan]) -> None:
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO location_scans VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        scan.location,
+                        _to_text(scan.latest_last_modified),
+                        scan.objects,
+                        scan.bytes,
+                        scan.scanned_at,
+                        _to_text(scan.glue_update_time),
+                    )
+                    for scan in scans
+                ],
+            )
@@ -0,0 +1,102 @@
+import json
+import os
+import tempfile
+from dataclasses import asdict, dataclass
+from typing import Iterable, List
+
+# Prefix of the metric names in the Prometheus text format
+PROMETHEUS_METRIC_PREFIX = "cadet_latest_file_timestamp"
+
+
+@dataclass
+class LocationScanCost:
+    """
+    What it cost to scan one s3 location. A shared listing's cost is split
+    evenly between the locations it covers.
+    """
+
+    pages: float = 0.0
+    objects: float = 0.0
+    seconds: float = 0.0
+
+
+@dataclass
+class TableScanMetrics:
+    """What it cost to find the latest file timestamp of one table"""
+
+    # database.table
+    table: str
+    location: str
+    # the Glue calls that found the table, the time of a database's get_tables
+    # calls is split evenly between the tables looked up in it
+    glue_seconds: float = 0.0
+    pages: float = 0.0
+    objects: float = 0.0
+    scan_seconds: float = 0.0
+    cached: bool = False
+
+    @property
+    def total_seconds(self) -> float:
+        return self.glue_seconds + self.scan_seconds
+
+
+def top_tables(metrics: Iterable[TableScanMetrics], n: int) -> List[dict]:
+    """The n most expensive tables, slowest first"""
+    slowest = sorted(
+        metrics,
+        key=lambda table: (table.total_seconds, table.pages, table.table),
+        reverse=True,
+    )
+    return [asdict(table) for table in slowest[:n]]
+
+
+def _escape_label(value: str) -> str:
+    """Escape a label value for the Prometheus text format"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def write_metrics(metrics: Iterable[TableScanMetrics], path: str) -> None:
+    """
+    Write the metrics of every table for dashboards. Paths ending in .prom
+    are written in the Prometheus text format, for node exporter's textfile
+    collector, anything else as a JSON list. The file is written alongside
+    and moved into place, so readers never see it half written.
+    """
+    metrics = list(metrics)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    tmp_file = tempfile.NamedTemporaryFile(
+        "w", dir=directory or ".", suffix=".tmp", delete=False
+    )
+    try:
+        with tmp_file as metrics_file:
+            if path.endswith(".prom"):
+                _write_prometheus(metrics, metrics_file)
+            else:
+                json.dump([asdict(table) for table in metrics], metrics_file, indent=2)
+        # temporary files are only readable by us, unlike the file replaced
+        os.chmod(tmp_file.name, 0o644)
+        os.replace(tmp_file.name, path)
+    except BaseException:
+        os.remove(tmp_file.name)
+        raise
+
+
+def _write_prometheus(metrics: List[TableScanMetrics], metrics_file) -> None:
+    for name, help_text in [
+        ("glue_seconds", "Time spent finding the table in Glue"),
+        ("pages", "S3 list requests made for the table"),
+        ("objects", "S3 objects listed for the table"),
+        ("scan_seconds", "Time spent listing the table in S3"),
+    ]:
+        metric = f"{PROMETHEUS_METRIC_PREFIX}_{name}"
+        metrics_file.write(f"# HELP {metric} {help_text}\n")
+        metrics_file.write(f"# TYPE {metric} gauge\n")
+        for table in metrics:
+            labels = (
+                f'table="{_escape_label(table.table)}",'
+                f'location="{_escape_label(table.location)}"'
+            )
+            metrics_file.write(f"{metric}{{{labels}}} {getattr(table, name)}\n")
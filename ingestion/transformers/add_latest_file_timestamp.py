@@ -1,44 +1,131 @@
 import logging
+import threading
+import time
 from abc import ABCMeta
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, Optional, cast
-from urllib.parse import urlparse
+from typing import Callable, Dict, Iterable, List, Optional, cast
 
 import boto3
-import datahub.emitter.mce_builder as mce_builder
 from botocore.exceptions import ClientError
-from datahub.configuration.common import ConfigModel
+from datahub.configuration.common import AllowDenyPattern, ConfigModel
 from datahub.emitter.mce_builder import Aspect
 from datahub.ingestion.api.common import PipelineContext
+from datahub.ingestion.api.report import Report
 from datahub.ingestion.transformer.dataset_transformer import DatasetTransformer
 from datahub.metadata.schema_classes import DatasetPropertiesClass
 
-from ingestion.config import ENV, INSTANCE, PLATFORM
-from ingestion.ingestion_utils import (
-    get_cadet_metadata_json,
-    parse_database_and_table_names,
-    validate_fqn,
+from ingestion.cadet_manifest_index import (
+    CadetManifestEntry,
+    CadetManifestIndex,
+    get_cadet_manifest_index,
 )
+from ingestion.ingestion_utils import STREAMING_JSON_DECODER
+from ingestion.s3_inventory import InventoryIndex, load_inventory
+from ingestion.s3_location_scanner import S3LocationScanner
+from ingestion.s3_scan_planner import ScanPlanner
+from ingestion.s3_timestamp_cache import CachedScan, LocationTimestampCache
+from ingestion.scan_metrics import TableScanMetrics, top_tables, write_metrics
+from ingestion.utils import Stopwatch
 
 logging.basicConfig(level=logging.INFO)
 
 
+@dataclass
+class AddLatestFileTimestampReport(Report):
+    models: int = 0
+    glue_get_tables_calls: int = 0
+    glue_get_table_calls: int = 0
+    # every Glue call made, and how many a get_table call per table would take
+    glue_calls: int = 0
+    glue_calls_baseline: int = 0
+    # models that won't be displayed, so weren't looked up or scanned
+    s3_locations_skipped: int = 0
+    s3_locations_scanned: int = 0
+    s3_list_calls: int = 0
+    s3_shared_listings: int = 0
+    s3_partitioned_scans: int = 0
+    inventory_files: int = 0
+    inventory_rows: int = 0
+    s3_throttled_calls: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    cache_hit_ratio: float = 0.0
+    # objects under the cached locations, that didn't need listing again
+    cache_objects_saved: int = 0
+    cache_bytes_saved: int = 0
+    lookup_seconds: float = 0.0
+    # the tables that took longest to look up, see TableScanMetrics
+    slowest_tables: List[dict] = field(default_factory=list)
+    # time transform_aspect spent waiting for timestamps to be resolved
+    aspects_waited_seconds: float = 0.0
+    aspects_timed_out: int = 0
+
+
 class AddLatestFileTimestampConfig(ConfigModel):
     manifest_s3_uri: str
+    # how to read the manifest, see get_cadet_manifest_nodes
+    manifest_decoder: str = STREAMING_JSON_DECODER
     aws_region: str = "eu-west-1"
+    # how many table locations to list at once, see S3LocationScanner
+    scan_max_workers: int = 16
+    scan_max_in_flight_per_bucket: int = 8
+    scan_max_retries: int = 5
+    scan_initial_backoff_seconds: float = 0.2
+    scan_max_backoff_seconds: float = 20.0
+    # whether tables under a common prefix can share a listing, see ScanPlanner
+    scan_share_listings: bool = True
+    scan_default_objects_per_location: int = 100
+    scan_shared_listing_overhead: float = 1.5
+    # whether to only list the newest partition of partitioned tables. This
+    # assumes the newest partition holds the newest file, so a backfill or
+    # rewrite of an older partition won't be reflected in the timestamp.
+    scan_partitions: bool = False
+    # an S3 Inventory to read timestamps from instead of listing table
+    # locations, see load_inventory
+    inventory: Optional[str] = None
+    # how long each datasetProperties aspect may wait for its timestamp to
+    # be resolved before passing through without it. None waits as long as
+    # it takes.
+    lookup_wait_seconds: Optional[float] = None
+    # only scan models that are displayed in the catalogue, and aren't
+    # denied by the source's node_name_pattern
+    scan_displayed_only: bool = False
+    # a SQLite file to keep scans in between runs, see LocationTimestampCache.
+    # This is a TTL cache: scans younger than cache_ttl_seconds are reused
+    # (unless the Glue table definition has changed), so the latest file
+    # timestamp can be up to cache_ttl_seconds out of date. New files don't
+    # update a Glue table, so they aren't detected until the scan expires.
+    cache_path: Optional[str] = None
+    cache_ttl_seconds: float = 24 * 60 * 60
+    # how many of the slowest tables to include in the report
+    metrics_top_n: int = 10
+    # a file to write the metrics of every table to, see write_metrics
+    metrics_path: Optional[str] = None
 
 
 class AddLatestFileTimestamp(DatasetTransformer, metaclass=ABCMeta):
     """Adds latest_file_timestamp to dbt model dataset properties.
 
     For each dbt model in the manifest we resolve the underlying Glue table,
-    then inspect objects in its S3 location to find the latest LastModified
-    timestamp.
+    listing the tables of each database in bulk, then inspect objects in its
+    S3 location to find the latest LastModified timestamp. Locations are
+    listed concurrently, see S3LocationScanner, and tables under a common
+    prefix can share a listing, see ScanPlanner. Optionally only the newest
+    partition of a partitioned table is listed. Scans can be kept between
+    runs, see LocationTimestampCache. Alternatively timestamps can be read
+    from an S3 Inventory report without listing anything.
+
+    The lookup runs in the background from when the transformer is created,
+    so it overlaps with the source reading the dbt manifest. Each aspect
+    only waits for the timestamp of its own dataset, see _TimestampFutures.
     """
 
     ctx: PipelineContext
     config: AddLatestFileTimestampConfig
-    latest_file_timestamp_lookup: Dict[str, str]
+    report: AddLatestFileTimestampReport
 
     def __init__(self, config: AddLatestFileTimestampConfig, ctx: PipelineContext):
         super().__init__()
@@ -46,8 +133,37 @@ class AddLatestFileTimestamp(DatasetTransformer, metaclass=ABCMeta):
         self.config = config
         self.glue_client = boto3.client("glue", region_name=self.config.aws_region)
         self.s3_client = boto3.client("s3", region_name=self.config.aws_region)
-        manifest = get_cadet_metadata_json(self.config.manifest_s3_uri)
-        self.latest_file_timestamp_lookup = self._build_latest_timestamp_lookup(manifest)
+        self.report = AddLatestFileTimestampReport()
+        # object counts from cached scans, used to plan listings
+        self.object_estimates: Dict[str, int] = {}
+        # how long it took to find each table in Glue
+        self.glue_seconds: Dict[tuple[str, str], float] = {}
+        # locations whose scan was reused from the cache
+        self.cached_locations: set[str] = set()
+        self.scanner = S3LocationScanner(
+            self.s3_client,
+            max_workers=self.config.scan_max_workers,
+            max_in_flight_per_bucket=self.config.scan_max_in_flight_per_bucket,
+            max_retries=self.config.scan_max_retries,
+            initial_backoff_seconds=self.config.scan_initial_backoff_seconds,
+            max_backoff_seconds=self.config.scan_max_backoff_seconds,
+            planner=(
+                ScanPlanner(
+                    estimate_objects=self.object_estimates.get,
+                    default_objects_per_location=self.config.scan_default_objects_per_location,
+                    shared_listing_overhead=self.config.scan_shared_listing_overhead,
+                )
+                if self.config.scan_share_listings
+                else None
+            ),
+        )
+        self.timestamps = _TimestampFutures()
+        executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="latest_file_timestamp"
+        )
+        self.lookup_future = executor.submit(self._run_lookup)
+        # the lookup keeps running, this just frees the thread when it's done
+        executor.shutdown(wait=False)
 
     @classmethod
     def create(
@@ -66,7 +182,7 @@ class AddLatestFileTimestamp(DatasetTransformer, metaclass=ABCMeta):
             return None
 
         in_dataset_properties_aspect = cast(DatasetPropertiesClass, aspect)
-        latest_file_timestamp = self.latest_file_timestamp_lookup.get(entity_urn)
+        latest_file_timestamp = self._wait_for_timestamp(entity_urn)
 
         if latest_file_timestamp:
             custom_properties = in_dataset_properties_aspect.customProperties or {}
@@ -75,68 +191,367 @@ class AddLatestFileTimestamp(DatasetTransformer, metaclass=ABCMeta):
 
         return cast(Aspect, in_dataset_properties_aspect)
 
-    def _build_latest_timestamp_lookup(self, manifest: dict) -> Dict[str, str]:
-        lookup: Dict[str, str] = {}
-        for node in manifest["nodes"].values():
-            if node.get("resource_type") != "model":
-                continue
-
-            if not validate_fqn(node["fqn"]):
-                continue
-
-            database_name, table_name = parse_database_and_table_names(node)
-            dataset_urn = mce_builder.make_dataset_urn_with_platform_instance(
-                name=f"{database_name}.{table_name}",
-                platform=PLATFORM,
-                platform_instance=INSTANCE,
-                env=ENV,
+    @property
+    def latest_file_timestamp_lookup(self) -> Dict[str, str]:
+        """Every timestamp, waiting for the lookup to finish"""
+        return self.lookup_future.result()
+
+    def _wait_for_timestamp(self, entity_urn: str) -> Optional[str]:
+        started = time.perf_counter()
+        try:
+            return self.timestamps.future(entity_urn).result(
+                timeout=self.config.lookup_wait_seconds
+            )
+        except FutureTimeoutError:
+            self.report.aspects_timed_out += 1
+            logging.warning(
+                "Timed out waiting for the latest_file_timestamp of %s", entity_urn
             )
+            return None
+        finally:
+            self.report.aspects_waited_seconds += time.perf_counter() - started
 
-            try:
-                table = self.glue_client.get_table(
-                    DatabaseName=database_name,
-                    Name=table_name,
+    def _run_lookup(self) -> Dict[str, str]:
+        started = time.perf_counter()
+        try:
+            manifest_index = get_cadet_manifest_index(
+                self.config.manifest_s3_uri, self.config.manifest_decoder
+            )
+            lookup = self._build_latest_timestamp_lookup(manifest_index)
+        except Exception as error:
+            logging.exception("Could not build the latest_file_timestamp lookup")
+            self.timestamps.fail(error)
+            raise
+        self.timestamps.resolve_all(lookup)
+        self.report.lookup_seconds = time.perf_counter() - started
+        return lookup
+
+    def _build_latest_timestamp_lookup(
+        self, manifest_index: CadetManifestIndex
+    ) -> Dict[str, str]:
+        models = manifest_index.of_type("model")
+        self.report.models = len(models)
+        if self.config.scan_displayed_only:
+            models = self._displayed(models)
+            self.report.s3_locations_skipped = self.report.models - len(models)
+        glue_tables = self._get_glue_tables(models)
+        locations = {
+            table_key: _get_location(table) for table_key, table in glue_tables.items()
+        }
+        glue_update_times: Dict[str, datetime] = {}
+        for table_key, table in glue_tables.items():
+            update_time = table.get("UpdateTime")
+            location = locations[table_key]
+            if update_time and (
+                location not in glue_update_times
+                or update_time > glue_update_times[location]
+            ):
+                glue_update_times[location] = update_time
+        partition_keys = {}
+        if self.config.scan_partitions:
+            for table_key, table in glue_tables.items():
+                if table.get("PartitionKeys"):
+                    partition_keys[locations[table_key]] = [
+                        (key["Name"], key.get("Type", ""))
+                        for key in table["PartitionKeys"]
+                    ]
+
+        urns_by_location: Dict[str, List[str]] = {}
+        for entry in models:
+            location = locations.get((entry.database, entry.table))
+            if location is not None:
+                urns_by_location.setdefault(location, []).append(entry.dataset_urn)
+        # anything else won't get a timestamp, so needn't wait for the scan
+        self.timestamps.expect(
+            urn for location_urns in urns_by_location.values() for urn in location_urns
+        )
+
+        def resolve(scan_results: Dict[str, Optional[datetime]]) -> None:
+            for location, latest_last_modified in scan_results.items():
+                for urn in urns_by_location.get(location, []):
+                    self.timestamps.resolve(
+                        urn,
+                        (
+                            latest_last_modified.isoformat()
+                            if latest_last_modified
+                            else None
+                        ),
+                    )
+
+        if self.config.inventory:
+            latest_by_location = self._read_inventory(locations.values())
+        else:
+            latest_by_location = self._scan(
+                locations.values(), partition_keys, glue_update_times, resolve
+            )
+        self.report.s3_locations_scanned = len(latest_by_location)
+        self.report.s3_list_calls = self.scanner.list_calls
+        self.report.s3_throttled_calls = self.scanner.throttled_calls
+        self.report.s3_shared_listings = self.scanner.shared_listings
+        self.report.s3_partitioned_scans = self.scanner.partitioned_scans
+
+        lookup: Dict[str, str] = {}
+        for location, location_urns in urns_by_location.items():
+            latest_last_modified = latest_by_location[location]
+            if latest_last_modified:
+                for urn in location_urns:
+                    lookup[urn] = latest_last_modified.isoformat()
+
+        self._report_metrics(locations)
+        logging.info(f"AddLatestFileTimestamp report: {self.report.as_string()}")
+        return lookup
+
+    def _report_metrics(self, locations: Dict[tuple[str, str], str]) -> None:
+        metrics = []
+        for (database_name, table_name), location in locations.items():
+            cost = self.scanner.costs.get(location)
+            metrics.append(
+                TableScanMetrics(
+                    table=f"{database_name}.{table_name}",
+                    location=location,
+                    glue_seconds=self.glue_seconds.get((database_name, table_name), 0),
+                    pages=cost.pages if cost else 0,
+                    objects=cost.objects if cost else 0,
+                    scan_seconds=cost.seconds if cost else 0,
+                    cached=location in self.cached_locations,
                 )
-                location = (
-                    table.get("Table", {})
-                    .get("StorageDescriptor", {})
-                    .get("Location", "")
+            )
+        self.report.slowest_tables = top_tables(metrics, self.config.metrics_top_n)
+        if self.config.metrics_path:
+            write_metrics(metrics, self.config.metrics_path)
+
+    def _scan(
+        self,
+        locations: Iterable[str],
+        partition_keys: Dict[str, List[tuple[str, str]]],
+        glue_update_times: Dict[str, datetime],
+        on_scanned: Callable[[Dict[str, Optional[datetime]]], None],
+    ) -> Dict[str, Optional[datetime]]:
+        """
+        The latest LastModified of each location, from the cache where it is
+        fresh, otherwise listing it. Listed locations are cached for next time.
+        """
+        if not self.config.cache_path:
+            return self.scanner.latest_last_modified(
+                locations, partition_keys, on_scanned=on_scanned
+            )
+
+        locations = set(locations)
+        cache = LocationTimestampCache(
+            self.config.cache_path, self.config.cache_ttl_seconds
+        )
+        try:
+            cached = cache.load(locations)
+            now = time.time()
+            fresh = {
+                location: scan
+                for location, scan in cached.items()
+                if cache.is_fresh(scan, glue_update_times.get(location), now)
+            }
+            for location, scan in cached.items():
+                if scan.objects is not None:
+                    self.object_estimates[location] = scan.objects
+
+            self.cached_locations = set(fresh)
+            cached_latest = {
+                location: scan.latest_last_modified for location, scan in fresh.items()
+            }
+            on_scanned(cached_latest)
+            latest_by_location = self.scanner.latest_last_modified(
+                locations - fresh.keys(), partition_keys, on_scanned=on_scanned
+            )
+
+            cache.store(
+                CachedScan(
+                    location,
+                    latest_by_location[location],
+                    *(stats or (None, None)),
+                    scanned_at=now,
+                    glue_update_time=glue_update_times.get(location),
                 )
+                for location, stats in self.scanner.object_stats.items()
+            )
+        finally:
+            cache.close()
+
+        self.report.cache_hits = len(fresh)
+        self.report.cache_misses = len(locations) - len(fresh)
+        if locations:
+            self.report.cache_hit_ratio = len(fresh) / len(locations)
+        self.report.cache_objects_saved = sum(
+            scan.objects or 0 for scan in fresh.values()
+        )
+        self.report.cache_bytes_saved = sum(scan.bytes or 0 for scan in fresh.values())
+        return {**latest_by_location, **cached_latest}
+
+    def _displayed(self, entries: List[CadetManifestEntry]) -> List[CadetManifestEntry]:
+        """
+        The entries that will appear in the catalogue. The others are either
+        hidden, or not emitted by the source at all, so never need a timestamp.
+        """
+        node_name_pattern = self._node_name_pattern()
+        return [
+            entry
+            for entry in entries
+            if "dc_display_in_catalogue" in entry.tags
+            and node_name_pattern.allowed(entry.unique_id)
+        ]
+
+    def _node_name_pattern(self) -> AllowDenyPattern:
+        """The dbt source's node_name_pattern, from the recipe"""
+        pipeline_config = self.ctx.pipeline_config
+        if pipeline_config is None:
+            return AllowDenyPattern.allow_all()
+        return AllowDenyPattern.parse_obj(
+            pipeline_config.source.config.get("node_name_pattern", {})
+        )
+
+    def _read_inventory(
+        self, locations: Iterable[str]
+    ) -> Dict[str, Optional[datetime]]:
+        inventory = load_inventory(self.config.inventory, self.s3_client)
+        index = InventoryIndex(locations)
+        index.add_inventory(inventory)
+        self.report.inventory_files = len(inventory.files)
+        self.report.inventory_rows = index.rows
+        return index.latest
+
+    def _get_glue_tables(
+        self, entries: List[CadetManifestEntry]
+    ) -> Dict[tuple[str, str], dict]:
+        """
+        The Glue table for each entry, keyed by database and table name. Each
+        database's tables are listed with paginated get_tables calls, and only
+        tables that weren't listed are looked up individually. Tables that
+        couldn't be found are left out. The time taken to find each table is
+        recorded in glue_seconds, with each database's listing time split
+        between its tables.
+        """
+        tables_by_database: Dict[str, set[str]] = {}
+        for entry in entries:
+            tables_by_database.setdefault(entry.database, set()).add(entry.table)
+
+        glue_tables: Dict[tuple[str, str], dict] = {}
+        paginator = self.glue_client.get_paginator("get_tables")
+        for database_name, table_names in tables_by_database.items():
+            stopwatch = Stopwatch()
+            try:
+                with stopwatch:
+                    for page in paginator.paginate(DatabaseName=database_name):
+                        self.report.glue_get_tables_calls += 1
+                        for table in page.get("TableList", []):
+                            table_name = table["Name"]
+                            if table_name in table_names:
+                                glue_tables[(database_name, table_name)] = table
             except ClientError as error:
+                self.report.glue_get_tables_calls += 1
                 logging.warning(
-                    "Skipping latest_file_timestamp for %s.%s due to Glue error: %s",
+                    "Could not list Glue tables in %s, looking them up one by one: %s",
                     database_name,
-                    table_name,
                     error,
                 )
-                continue
 
-            latest_last_modified = self._get_latest_last_modified(location)
-            if latest_last_modified:
-                lookup[dataset_urn] = latest_last_modified.isoformat()
+            for table_name in sorted(table_names):
+                self.glue_seconds[(database_name, table_name)] = (
+                    stopwatch.elapsed / len(table_names)
+                )
+                if (database_name, table_name) in glue_tables:
+                    continue
+                with Stopwatch() as table_stopwatch:
+                    table = self._get_glue_table(database_name, table_name)
+                self.glue_seconds[
+                    (database_name, table_name)
+                ] += table_stopwatch.elapsed
+                if table is not None:
+                    glue_tables[(database_name, table_name)] = table
 
-        return lookup
+        self.report.glue_calls = (
+            self.report.glue_get_tables_calls + self.report.glue_get_table_calls
+        )
+        self.report.glue_calls_baseline = sum(
+            len(table_names) for table_names in tables_by_database.values()
+        )
+        return glue_tables
 
-    def _get_latest_last_modified(self, s3_uri: str) -> Optional[datetime]:
-        parsed_s3_uri = urlparse(s3_uri)
-        if parsed_s3_uri.scheme != "s3" or not parsed_s3_uri.netloc:
+    def _get_glue_table(self, database_name: str, table_name: str) -> Optional[dict]:
+        self.report.glue_get_table_calls += 1
+        try:
+            table = self.glue_client.get_table(
+                DatabaseName=database_name,
+                Name=table_name,
+            )
+        except ClientError as error:
+            logging.warning(
+                "Skipping latest_file_timestamp for %s.%s due to Glue error: %s",
+                database_name,
+                table_name,
+                error,
+            )
             return None
+        return table.get("Table", {})
 
-        bucket = parsed_s3_uri.netloc
-        prefix = parsed_s3_uri.path.lstrip("/")
-
-        latest_last_modified: Optional[datetime] = None
-        paginator = self.s3_client.get_paginator("list_objects_v2")
-        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
-            for s3_object in page.get("Contents", []):
-                object_last_modified = s3_object.get("LastModified")
-                if (
-                    object_last_modified
-                    and (
-                        latest_last_modified is None
-                        or object_last_modified > latest_last_modified
-                    )
+
+class _TimestampFutures:
+    """
+    A future for the latest_file_timestamp of each dataset urn, resolved as
+    soon as the location of its table has been scanned. Until expect is
+    called any urn might get a timestamp, after that only the expected ones
+    can, and the rest resolve to None straight away.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.futures: Dict[str, Future] = {}
+        self.expected: Optional[set[str]] = None
+        self.finished = False
+        self.error: Optional[BaseException] = None
+
+    def future(self, urn: str) -> Future:
+        with self.lock:
+            if urn not in self.futures:
+                future: Future = Future()
+                if self.error is not None:
+                    future.set_exception(self.error)
+                elif self.finished or (
+                    self.expected is not None and urn not in self.expected
                 ):
-                    latest_last_modified = object_last_modified
+                    future.set_result(None)
+                self.futures[urn] = future
+            return self.futures[urn]
+
+    def expect(self, urns: Iterable[str]) -> None:
+        with self.lock:
+            self.expected = set(urns)
+            unexpected = [
+                future
+                for urn, future in self.futures.items()
+                if urn not in self.expected and not future.done()
+            ]
+        for future in unexpected:
+            future.set_result(None)
+
+    def resolve(self, urn: str, timestamp: Optional[str]) -> None:
+        future = self.future(urn)
+        if not future.done():
+            future.set_result(timestamp)
+
+    def resolve_all(self, lookup: Dict[str, str]) -> None:
+        """Resolve every urn from the finished lookup, and any others to None"""
+        for urn, timestamp in lookup.items():
+            self.resolve(urn, timestamp)
+        with self.lock:
+            self.finished = True
+            pending = [future for future in self.futures.values() if not future.done()]
+        for future in pending:
+            future.set_result(None)
+
+    def fail(self, error: BaseException) -> None:
+        with self.lock:
+            self.error = error
+            pending = [future for future in self.futures.values() if not future.done()]
+        for future in pending:
+            future.set_exception(error)
+
 
-        return latest_last_modified
\ No newline at end of file
+def _get_location(table: dict) -> str:
+    return table.get("StorageDescriptor", {}).get("Location", "")
@@ -2,8 +2,6 @@ import logging
 from abc import ABCMeta
 from typing import Dict, List, Optional, Union, cast
 
-import datahub.emitter.mce_builder as mce_builder
-import datahub.emitter.mcp_builder as mcp_builder
 from datahub.configuration.common import ConfigModel
 from datahub.emitter.mce_builder import Aspect
 from datahub.emitter.mcp import MetadataChangeProposalWrapper
@@ -17,13 +15,9 @@ from datahub.metadata.schema_classes import (
 )
 from datahub.utilities.urns.tag_urn import TagUrn
 
-from ingestion.config import ENV, INSTANCE, PLATFORM
-from ingestion.ingestion_utils import (
-    domains_to_subject_areas,
-    get_cadet_metadata_json,
-    parse_database_and_table_names,
-    validate_fqn,
-)
+from ingestion import urns
+from ingestion.cadet_manifest_index import get_cadet_manifest_index
+from ingestion.ingestion_utils import STREAMING_JSON_DECODER, domains_to_subject_areas
 from ingestion.utils import report_time
 
 logging.basicConfig(level=logging.DEBUG)
@@ -32,6 +26,8 @@ logging.basicConfig(level=logging.DEBUG)
 class AssignCadetDatabasesConfig(ConfigModel):
     # dataset_urn -> data product urn
     manifest_s3_uri: str
+    # how to read the manifest, see get_cadet_manifest_nodes
+    manifest_decoder: str = STREAMING_JSON_DECODER
 
 
 class AssignCadetDatabases(DatasetTransformer, metaclass=ABCMeta):
@@ -47,8 +43,9 @@ class AssignCadetDatabases(DatasetTransformer, metaclass=ABCMeta):
         self.ctx = ctx
         self.config = config
         self.processed_tags = {}
-        manifest = get_cadet_metadata_json(self.config.manifest_s3_uri)
-        self.mappings = self._get_table_database_mappings(manifest)
+        self.manifest_index = get_cadet_manifest_index(
+            self.config.manifest_s3_uri, self.config.manifest_decoder
+        )
 
     @classmethod
     def create(cls, config_dict: dict, ctx: PipelineContext) -> "AssignCadetDatabases":
@@ -64,11 +61,12 @@ class AssignCadetDatabases(DatasetTransformer, metaclass=ABCMeta):
         if aspect is None:
             return None
         in_global_tags_aspect: GlobalTagsClass = cast(GlobalTagsClass, aspect)
-        domain = self.mappings.get(entity_urn, {}).get("domain")
+        entry = self.manifest_index.get(entity_urn)
+        domain = entry.domain if entry else None
         if domain:
             subject_area = domains_to_subject_areas.get(domain.lower())
             subject_area_tag_urn = (
-                mce_builder.make_tag_urn(tag=subject_area) if subject_area else None
+                urns.tag_urn(subject_area) if subject_area else None
             )
             existing_tags = [tag.tag for tag in in_global_tags_aspect.tags]
             # Check if the tag already exists
@@ -105,10 +103,11 @@ class AssignCadetDatabases(DatasetTransformer, metaclass=ABCMeta):
 
         print("Assigning datasets to databases")
         for dataset_urn in self.entity_map.keys():
-            container_urn = self.mappings.get(dataset_urn, {}).get("database")
-            if not container_urn:
+            entry = self.manifest_index.get(dataset_urn)
+            if not entry:
                 logging.warning(f"No container mapping for {dataset_urn=}")
                 continue
+            container_urn = entry.database_urn
 
             print(f"Assigning {dataset_urn=} to {container_urn=}")
             mcps.append(
@@ -118,34 +117,6 @@ class AssignCadetDatabases(DatasetTransformer, metaclass=ABCMeta):
                 )
             )
 
-        return mcps
+        urns.log_urn_cache_stats()
 
-    @report_time
-    def _get_table_database_mappings(self, manifest) -> Dict[str, Dict[str, str]]:
-        mappings = {}
-        for node in manifest["nodes"]:
-            if manifest["nodes"][node]["resource_type"] in ["model", "seed"]:
-                fqn = manifest["nodes"][node]["fqn"]
-                if validate_fqn(fqn):
-                    database, table_name = parse_database_and_table_names(
-                        manifest["nodes"][node]
-                    )
-
-                    dataset_urn = mce_builder.make_dataset_urn_with_platform_instance(
-                        name=f"{database}.{table_name}",
-                        platform=PLATFORM,
-                        platform_instance=INSTANCE,
-                        env=ENV,
-                    )
-                    database_key = mcp_builder.DatabaseKey(
-                        database=database,
-                        platform=PLATFORM,
-                        instance=INSTANCE,
-                        env=ENV,
-                        backcompat_env_as_instance=True,
-                    )
-                    database_urn = database_key.as_urn()
-
-                    mappings[dataset_urn] = {"database": database_urn, "domain": fqn[1]}
-
-        return mappings
+        return mcps
@@ -0,0 +1,83 @@
+"""
+Memoized urn builders for CaDeT.
+
+Building a container urn serialises and hashes the whole container key, and
+we do it for every table of every database, so the urns are cached. The
+caches are bounded, and their hit and miss counts can be logged with
+log_urn_cache_stats.
+"""
+
+import logging
+from functools import lru_cache
+
+import datahub.emitter.mce_builder as mce_builder
+import datahub.emitter.mcp_builder as mcp_builder
+
+from ingestion.config import ENV, INSTANCE, PLATFORM
+
+# There are a few hundred CaDeT databases, but tens of thousands of tables
+DATABASE_CACHE_SIZE = 4096
+DATASET_CACHE_SIZE = 65536
+TAG_CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=DATABASE_CACHE_SIZE)
+def database_key(
+    database: str, platform: str = PLATFORM, instance: str = INSTANCE, env: str = ENV
+) -> mcp_builder.DatabaseKey:
+    """The container key of a database. It's shared, so must not be modified."""
+    return mcp_builder.DatabaseKey(
+        database=database,
+        platform=platform,
+        instance=instance,
+        env=env,
+        backcompat_env_as_instance=True,
+    )
+
+
+@lru_cache(maxsize=DATABASE_CACHE_SIZE)
+def database_urn(
+    database: str, platform: str = PLATFORM, instance: str = INSTANCE, env: str = ENV
+) -> str:
+    return database_key(database, platform, instance, env).as_urn()
+
+
+@lru_cache(maxsize=DATASET_CACHE_SIZE)
+def dataset_urn(
+    name: str, platform: str = PLATFORM, instance: str = INSTANCE, env: str = ENV
+) -> str:
+    return mce_builder.make_dataset_urn_with_platform_instance(
+        name=name, platform=platform, platform_instance=instance, env=env
+    )
+
+
+@lru_cache(maxsize=TAG_CACHE_SIZE)
+def tag_urn(tag: str) -> str:
+    return mce_builder.make_tag_urn(tag)
+
+
+_URN_CACHES = {
+    "database_key": database_key,
+    "database_urn": database_urn,
+    "dataset_urn": dataset_urn,
+    "tag_urn": tag_urn,
+}
+
+
+def urn_cache_stats() -> dict[str, dict[str, int]]:
+    """Hits, misses and current size of each urn cache"""
+    stats = {}
+    for name, cache in _URN_CACHES.items():
+        info = cache.cache_info()
+        stats[name] = {"hits": info.hits, "misses": info.misses, "size": info.currsize}
+    return stats
+
+
+def log_urn_cache_stats() -> None:
+    for name, stats in urn_cache_stats().items():
+        logging.info(f"urn cache {name}: {stats}")
+
+
+def clear_urn_caches() -> None:
+    for cache in _URN_CACHES.values():
+        cache.cache_clear()
@@ -65,6 +65,13 @@ class Stopwatch:
         joined_meta = ", ".join(f"{k}={v}" for k, v in meta.items())
         self.prefix = f"TIMING: {joined_meta}, " if joined_meta else "TIMING: "
 
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
     def start(self):
         self.start_time = time.time()
         self.running = True
@@ -0,0 +1,90 @@
+"""
+Compare the JSON decoder backends on a synthetic dbt manifest.
+
+Run from the repository root with:
+
+    python tests/benchmarks/benchmark_json_decoders.py --nodes 20000
+
+Each backend in JSON_DECODERS decodes the whole manifest, and the streaming
+ijson reader builds the slim node records used by the catalogue.
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.realpath(os.path.dirname(__file__) + "/../.."))
+
+from ingestion.ingestion_utils import (  # noqa: E402
+    JSON_DECODERS,
+    STREAMING_JSON_DECODER,
+    decode_json,
+    iter_manifest_nodes,
+)
+
+
+def make_manifest(node_count: int, control_characters: bool) -> bytes:
+    """A manifest with nodes shaped like CaDeT models, including bulky fields"""
+    nodes = {}
+    for i in range(node_count):
+        database = f"database_{i % 300}"
+        name = f"{database}__table_{i}"
+        nodes[f"model.mojap_derived_tables.{name}"] = {
+            "resource_type": "model",
+            "unique_id": f"model.mojap_derived_tables.{name}",
+            "fqn": ["mojap_derived_tables", "prison", database, name],
+            "schema": database,
+            "database": "awsdatacatalog",
+            "name": name,
+            "alias": None,
+            "tags": ["daily", "dc_display_in_catalogue"],
+            "raw_code": "select\n    *\nfrom {{ ref('upstream') }}\n" * 20,
+            "compiled_code": "select\n    *\nfrom upstream\n" * 20,
+            "columns": {
+                f"column_{c}": {"name": f"column_{c}", "description": "A column"}
+                for c in range(20)
+            },
+            "depends_on": {"nodes": [f"model.mojap_derived_tables.upstream_{i}"]},
+        }
+
+    content = json.dumps({"metadata": {"dbt_version": "1.7.0"}, "nodes": nodes})
+    if control_characters:
+        # raw newlines inside strings, as json.loads(strict=False) accepts
+        content = content.replace("\\n", "\n")
+    return content.encode("utf-8")
+
+
+def measure(label: str, decode, content: bytes):
+    tracemalloc.start()
+    start = time.perf_counter()
+    decode(content)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:>10}: {elapsed:8.3f}s, peak memory {peak / 1024 / 1024:8.1f}MiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=20000)
+    parser.add_argument(
+        "--control-characters",
+        action="store_true",
+        help="include raw control characters in strings, like some real manifests",
+    )
+    args = parser.parse_args()
+
+    content = make_manifest(args.nodes, args.control_characters)
+    print(f"Synthetic manifest: {args.nodes} nodes, {len(content) / 1024 / 1024:.1f}MiB")
+
+    for decoder in JSON_DECODERS:
+        measure(decoder, lambda c, d=decoder: decode_json(c, d), content)
+    measure(
+        STREAMING_JSON_DECODER,
+        lambda c: dict(iter_manifest_nodes(io.BytesIO(c))),
+        content,
+    )
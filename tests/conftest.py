@@ -17,6 +17,8 @@ from moto import mock_aws
 
 sys.path.append(os.path.realpath(os.path.dirname(__file__) + "/.."))
 
+from ingestion.cadet_manifest_index import CadetManifestIndex, clear_index_memo
+from ingestion.ingestion_utils import clear_metadata_memo
 from ingestion.post_ingestion_checks import _get_table_database_mappings
 
 
@@ -55,7 +57,9 @@ def manifest():
 @pytest.fixture
 def table_database_mappings(manifest, request):
     param = getattr(request, "param", False)
-    mappings = _get_table_database_mappings(manifest)
+    mappings = _get_table_database_mappings(
+        CadetManifestIndex.from_manifest(manifest)
+    )
     # allows for testing a missing relation scenario as we don;t return this in
     # the mocked get_related_entities method
     if param:
@@ -75,7 +79,9 @@ def mock_datahub_graph(manifest):
             """
             Create a new monkey-patched instance of the DataHubGraph graph client.
             """
-            self.table_database_mappings = _get_table_database_mappings(manifest)
+            self.table_database_mappings = _get_table_database_mappings(
+                CadetManifestIndex.from_manifest(manifest)
+            )
             # ensure this mock keeps the same api of the original class
             self.mock_graph = create_autospec(DataHubGraph)
             # Make server stateful ingestion capable
@@ -173,6 +179,19 @@ def mock_time(monkeypatch):
     yield
 
 
+@pytest.fixture(autouse=True)
+def isolated_metadata_cache(tmp_path, monkeypatch):
+    """
+    Stops metadata parsed or cached by one test leaking into another
+    """
+    monkeypatch.setenv("CADET_METADATA_CACHE_DIR", str(tmp_path / "metadata_cache"))
+    clear_metadata_memo()
+    clear_index_memo()
+    yield
+    clear_metadata_memo()
+    clear_index_memo()
+
+
 @pytest.fixture(autouse=True)
 def mock_metadata_in_s3():
     """
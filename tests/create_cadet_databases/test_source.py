@@ -8,10 +8,11 @@ from ingestion.create_cadet_databases_source.source import (
     CreateCadetDatabases,
     CreateCadetDatabasesConfig,
 )
+from ingestion.ingestion_utils import FQN_NOT_DATABASE_TABLE
 
 
-def run_source(mock_datahub_graph):
-    source = CreateCadetDatabases(
+def make_source(mock_datahub_graph):
+    return CreateCadetDatabases(
         config=CreateCadetDatabasesConfig(
             manifest_s3_uri="s3://test_bucket/prod/run_artefacts/latest/target/manifest.json",
             database_metadata_s3_uri="s3://test_bucket/prod/run_artefacts/latest/target/database_metadata.json",
@@ -22,7 +23,9 @@ def run_source(mock_datahub_graph):
         ctx=PipelineContext(run_id="abc", graph=mock_datahub_graph),
     )
 
-    return WorkunitInspector(source.get_workunits())
+
+def run_source(mock_datahub_graph):
+    return WorkunitInspector(make_source(mock_datahub_graph).get_workunits())
 
 
 def test_tags(mock_datahub_graph):
@@ -68,3 +71,15 @@ def test_tags(mock_datahub_graph):
     assert set(hq_database_tags) == {
         "urn:li:tag:dc_display_in_catalogue",
     }
+
+
+def test_report_summarises_invalid_names(mock_datahub_graph):
+    source = make_source(mock_datahub_graph)
+    list(source.get_workunits())
+
+    report = source.get_report()
+    assert report.manifest_tables_checked == 7
+    assert list(report.invalid_table_names[FQN_NOT_DATABASE_TABLE]) == [
+        "invalid_tablename"
+    ]
+    assert "ref_database" in list(report.databases_without_subject_area)
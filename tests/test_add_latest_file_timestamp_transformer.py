@@ -1,9 +1,18 @@
+import json
+import threading
+
+import boto3
 import datahub.emitter.mce_builder as mce_builder
 from datahub.ingestion.api.common import PipelineContext
+from datahub.ingestion.run.pipeline_config import PipelineConfig
 from datahub.metadata.schema_classes import DatasetPropertiesClass
 
+from ingestion import urns
 from ingestion.config import ENV, INSTANCE, PLATFORM
-from ingestion.transformers.add_latest_file_timestamp import AddLatestFileTimestamp
+from ingestion.transformers.add_latest_file_timestamp import (
+    AddLatestFileTimestamp,
+    _TimestampFutures,
+)
 
 
 class TestAddLatestFileTimestampTransformer:
@@ -108,4 +117,231 @@ class TestAddLatestFileTimestampTransformer:
             assert aspect.customProperties == {
                 "security_classification": "Official-Sensitive"
             }
-            assert "latest_file_timestamp" not in aspect.customProperties
\ No newline at end of file
+            assert "latest_file_timestamp" not in aspect.customProperties
+
+
+def create_glue_table(glue, database, table, location):
+    glue.create_table(
+        DatabaseName=database,
+        TableInput={"Name": table, "StorageDescriptor": {"Location": location}},
+    )
+
+
+def test_builds_lookup_with_batched_glue_lookups():
+    glue = boto3.client("glue", region_name="eu-west-1")
+    s3 = boto3.client("s3", region_name="eu-west-1")
+    s3.create_bucket(
+        Bucket="derived",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-1"},
+    )
+    s3.put_object(Bucket="derived", Key="prison_database/table1/part-0", Body=b"")
+    s3.put_object(Bucket="derived", Key="courts_data/table1/part-0", Body=b"")
+
+    for database, tables in {
+        "prison_database": ["table1", "table2"],
+        "courts_data": ["table1"],
+        "hq_database": [],
+    }.items():
+        glue.create_database(DatabaseInput={"Name": database})
+        for table in tables:
+            create_glue_table(glue, database, table, f"s3://derived/{database}/{table}")
+
+    transformer = AddLatestFileTimestamp.create(
+        {
+            "manifest_s3_uri": "s3://test_bucket/prod/run_artefacts/latest/target/manifest.json",
+            "aws_region": "eu-west-1",
+        },
+        PipelineContext(run_id="test_run"),
+    )
+
+    assert set(transformer.latest_file_timestamp_lookup) == {
+        urns.dataset_urn("prison_database.table1"),
+        urns.dataset_urn("courts_data.table1"),
+    }
+    report = transformer.report
+    assert report.models == 5
+    # one get_tables call per database, then get_table for the tables that
+    # weren't listed, in hq_database and the missing probation_database
+    assert report.glue_get_tables_calls == 4
+    assert report.glue_get_table_calls == 2
+    assert report.glue_calls == 6
+    assert report.glue_calls_baseline == 5
+    assert {table["table"] for table in report.slowest_tables} == {
+        "prison_database.table1",
+        "prison_database.table2",
+        "courts_data.table1",
+    }
+
+
+def test_builds_lookup_from_inventory(tmp_path):
+    glue = boto3.client("glue", region_name="eu-west-1")
+    glue.create_database(DatabaseInput={"Name": "prison_database"})
+    create_glue_table(
+        glue, "prison_database", "table1", "s3://derived/prison_database/table1"
+    )
+    (tmp_path / "part-0.csv").write_text(
+        '"derived","prison_database/table1/part-0","10","2024-03-01T00:00:00.000Z"\n'
+        '"derived","prison_database/table2/part-0","10","2024-04-01T00:00:00.000Z"\n'
+    )
+
+    transformer = AddLatestFileTimestamp.create(
+        {
+            "manifest_s3_uri": "s3://test_bucket/prod/run_artefacts/latest/target/manifest.json",
+            "aws_region": "eu-west-1",
+            "inventory": str(tmp_path),
+        },
+        PipelineContext(run_id="test_run"),
+    )
+
+    assert transformer.latest_file_timestamp_lookup == {
+        urns.dataset_urn("prison_database.table1"): "2024-03-01T00:00:00+00:00"
+    }
+    report = transformer.report
+    assert report.inventory_files == 1
+    assert report.inventory_rows == 2
+    assert report.s3_list_calls == 0
+
+
+def test_aspect_passes_through_when_wait_budget_runs_out(monkeypatch):
+    dataset_urn = urns.dataset_urn("prison_database.table1")
+    scanned = threading.Event()
+
+    def slow_lookup(self, manifest):
+        scanned.wait()
+        return {dataset_urn: "2026-05-14T10:20:30+00:00"}
+
+    monkeypatch.setattr(
+        AddLatestFileTimestamp, "_build_latest_timestamp_lookup", slow_lookup
+    )
+    transformer = AddLatestFileTimestamp.create(
+        {
+            "manifest_s3_uri": "s3://test_bucket/prod/run_artefacts/latest/target/manifest.json",
+            "lookup_wait_seconds": 0.01,
+        },
+        PipelineContext(run_id="test_run"),
+    )
+
+    aspect = transformer.transform_aspect(
+        entity_urn=dataset_urn,
+        aspect_name="datasetProperties",
+        aspect=DatasetPropertiesClass(name="table1", customProperties={}),
+    )
+    assert aspect.customProperties == {}
+    assert transformer.report.aspects_timed_out == 1
+
+    scanned.set()
+    transformer.lookup_future.result()
+    aspect = transformer.transform_aspect(
+        entity_urn=dataset_urn,
+        aspect_name="datasetProperties",
+        aspect=DatasetPropertiesClass(name="table1", customProperties={}),
+    )
+    assert aspect.customProperties == {
+        "latest_file_timestamp": "2026-05-14T10:20:30+00:00"
+    }
+
+
+def test_timestamp_futures_resolve_before_the_lookup_finishes():
+    timestamps = _TimestampFutures()
+    waiting = timestamps.future("urn:table1")
+    timestamps.expect(["urn:table1", "urn:table2"])
+
+    # urns that won't be scanned don't wait
+    assert timestamps.future("urn:seed").result(timeout=0) is None
+    assert not waiting.done()
+
+    timestamps.resolve("urn:table1", "2026-05-14T10:20:30+00:00")
+    assert waiting.result(timeout=0) == "2026-05-14T10:20:30+00:00"
+    assert not timestamps.future("urn:table2").done()
+
+    timestamps.resolve_all({})
+    assert timestamps.future("urn:table2").result(timeout=0) is None
+
+
+def test_scans_displayed_models_only():
+    glue = boto3.client("glue", region_name="eu-west-1")
+    s3 = boto3.client("s3", region_name="eu-west-1")
+    s3.create_bucket(
+        Bucket="derived",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-1"},
+    )
+    for database, table in [
+        ("prison_database", "table1"),
+        ("prison_database", "table2"),
+        ("courts_data", "table1"),
+    ]:
+        s3.put_object(Bucket="derived", Key=f"{database}/{table}/part-0", Body=b"")
+        if table == "table1":
+            glue.create_database(DatabaseInput={"Name": database})
+        create_glue_table(glue, database, table, f"s3://derived/{database}/{table}")
+
+    pipeline_config = PipelineConfig.parse_obj(
+        {
+            "source": {
+                "type": "ingestion.cadet_dbt_source.source.CadetDBTSource",
+                "config": {
+                    "node_name_pattern": {"deny": ["model.test_derived_tables.courts"]}
+                },
+            },
+            "sink": {"type": "console"},
+        }
+    )
+    transformer = AddLatestFileTimestamp.create(
+        {
+            "manifest_s3_uri": "s3://test_bucket/prod/run_artefacts/latest/target/manifest.json",
+            "scan_displayed_only": True,
+        },
+        PipelineContext(run_id="test_run", pipeline_config=pipeline_config),
+    )
+
+    # prison_database.table1 isn't tagged for display and courts is denied
+    assert list(transformer.latest_file_timestamp_lookup) == [
+        urns.dataset_urn("prison_database.table2")
+    ]
+    assert transformer.report.s3_locations_skipped == 2
+
+
+def test_reuses_cached_scans(tmp_path):
+    glue = boto3.client("glue", region_name="eu-west-1")
+    s3 = boto3.client("s3", region_name="eu-west-1")
+    s3.create_bucket(
+        Bucket="derived",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-1"},
+    )
+    glue.create_database(DatabaseInput={"Name": "prison_database"})
+    for table in ["table1", "table2"]:
+        s3.put_object(
+            Bucket="derived", Key=f"prison_database/{table}/part-0", Body=b"12345"
+        )
+        create_glue_table(
+            glue, "prison_database", table, f"s3://derived/prison_database/{table}"
+        )
+
+    def run():
+        transformer = AddLatestFileTimestamp.create(
+            {
+                "manifest_s3_uri": "s3://test_bucket/prod/run_artefacts/latest/target/manifest.json",
+                "cache_path": str(tmp_path / "timestamps.sqlite"),
+                "metrics_path": str(tmp_path / "metrics.json"),
+                "scan_share_listings": False,
+            },
+            PipelineContext(run_id="test_run"),
+        )
+        return transformer.latest_file_timestamp_lookup, transformer.report
+
+    first_lookup, first_report = run()
+    assert first_report.cache_misses == 2
+    assert first_report.s3_list_calls == 2
+
+    second_lookup, second_report = run()
+    assert second_lookup == first_lookup
+    assert second_report.cache_hits == 2
+    assert second_report.cache_hit_ratio == 1.0
+    assert second_report.cache_objects_saved == 2
+    assert second_report.cache_bytes_saved == 10
+    assert second_report.s3_list_calls == 0
+    metrics = json.loads((tmp_path / "metrics.json").read_text())
+    assert [(table["cached"], table["pages"]) for table in metrics] == [
+        (True, 0),
+        (True, 0),
+    ]
@@ -1,6 +1,10 @@
+import json
+import time
 from types import SimpleNamespace
 
-from datahub.ingestion.source.dbt.dbt_core import DBTCoreSource
+from datahub.ingestion.api.common import PipelineContext
+from datahub.ingestion.run.pipeline import Pipeline
+from datahub.ingestion.source.dbt.dbt_core import DBTCoreReport, DBTCoreSource
 
 from ingestion.cadet_dbt_source.source import CadetDBTSource
 
@@ -29,7 +33,9 @@ def test_load_manifest_and_catalog_removes_display_tag_for_excluded_nodes(monkey
     monkeypatch.setattr(DBTCoreSource, "loadManifestAndCatalog", fake_load_manifest_and_catalog)
 
     source = CadetDBTSource.__new__(CadetDBTSource)
-    source.config = SimpleNamespace(tag_prefix="")
+    source.config = SimpleNamespace(
+        tag_prefix="", prune_hidden_nodes=False, skip_unchanged_nodes=False
+    )
 
     nodes, *_ = CadetDBTSource.loadManifestAndCatalog(source)
 
@@ -53,8 +59,299 @@ def test_load_manifest_and_catalog_respects_tag_prefix(monkeypatch):
     monkeypatch.setattr(DBTCoreSource, "loadManifestAndCatalog", fake_load_manifest_and_catalog)
 
     source = CadetDBTSource.__new__(CadetDBTSource)
-    source.config = SimpleNamespace(tag_prefix="dbt:")
+    source.config = SimpleNamespace(
+        tag_prefix="dbt:", prune_hidden_nodes=False, skip_unchanged_nodes=False
+    )
 
     nodes, *_ = CadetDBTSource.loadManifestAndCatalog(source)
 
     assert nodes[0].tags == ["dbt:team_alpha"]
+
+
+def test_unpacks_consolidated_run_results(monkeypatch, tmp_path):
+    documents = [
+        {"metadata": {"invocation_id": "second"}, "results": []},
+        {"metadata": {"invocation_id": "first"}, "results": []},
+    ]
+    consolidated_path = tmp_path / "run_results.consolidated.json"
+    consolidated_path.write_text(json.dumps({"run_results": documents}))
+    other_path = str(tmp_path / "run_results.json")
+
+    monkeypatch.setattr(
+        DBTCoreSource,
+        "_expand_run_results_paths",
+        lambda self: [str(consolidated_path), other_path],
+    )
+    source = CadetDBTSource.__new__(CadetDBTSource)
+    source.config = SimpleNamespace(manifest_path="manifest.json", aws_connection=None)
+    source.run_results_documents = {}
+    monkeypatch.setattr(
+        DBTCoreSource,
+        "load_file_as_json",
+        staticmethod(
+            lambda uri, aws: (
+                json.loads(consolidated_path.read_text())
+                if uri == str(consolidated_path)
+                else {"uri": uri}
+            )
+        ),
+    )
+
+    paths = source._expand_run_results_paths()
+
+    assert paths == [f"{consolidated_path}#0", f"{consolidated_path}#1", other_path]
+    assert [source.load_file_as_json(path, None) for path in paths] == [
+        *documents,
+        {"uri": other_path},
+    ]
+    assert source.run_results_documents == {}
+
+
+def dbt_node(dbt_name, node_type="model", tags=(), upstream_nodes=(), ephemeral=False):
+    return SimpleNamespace(
+        dbt_name=dbt_name,
+        database="awsdatacatalog",
+        schema=dbt_name.split(".")[-1].split("__")[0],
+        name=dbt_name.split(".")[-1],
+        alias=None,
+        node_type=node_type,
+        tags=list(tags),
+        upstream_nodes=list(upstream_nodes),
+        is_ephemeral_model=lambda: ephemeral,
+    )
+
+
+def test_prune_hidden_nodes(monkeypatch):
+    display = ["dc_display_in_catalogue"]
+    nodes = [
+        dbt_node("source.project.raw__table"),
+        dbt_node(
+            "model.project.stg__table", upstream_nodes=["source.project.raw__table"]
+        ),
+        dbt_node(
+            "model.project.int__table",
+            upstream_nodes=["model.project.stg__table"],
+            ephemeral=True,
+        ),
+        dbt_node(
+            "model.project.curated__table",
+            tags=display,
+            upstream_nodes=["model.project.int__table"],
+        ),
+        dbt_node(
+            "test.project.not_null_curated__table",
+            node_type="test",
+            upstream_nodes=["model.project.curated__table"],
+        ),
+        dbt_node(
+            "test.project.not_null_stg__table",
+            node_type="test",
+            upstream_nodes=["model.project.stg__table"],
+        ),
+        dbt_node("seed.project.ref__lookup", node_type="seed"),
+        dbt_node("model.project.dev__table", tags=display),
+    ]
+    monkeypatch.setattr(
+        DBTCoreSource,
+        "loadManifestAndCatalog",
+        lambda self: (nodes, "m_schema", "m_ver", "athena", None, None),
+    )
+    monkeypatch.setattr(
+        "ingestion.cadet_dbt_source.source.EXCLUDED_NAME_MATCHER.match_nodes",
+        lambda named_nodes: {
+            index: ("schema", "dev")
+            for index, names in named_nodes
+            if names["schema"] == "dev"
+        },
+    )
+
+    monkeypatch.setattr(DBTCoreSource, "_is_allowed_node", lambda self, node: True)
+
+    source = CadetDBTSource.create(
+        {
+            "manifest_path": "manifest.json",
+            "target_platform": "athena",
+            "tag_prefix": "",
+            "prune_hidden_nodes": True,
+        },
+        PipelineContext(run_id="test"),
+    )
+    kept, *_ = source.loadManifestAndCatalog()
+
+    assert [node.dbt_name for node in kept] == [
+        "model.project.stg__table",
+        "model.project.int__table",
+        "model.project.curated__table",
+        "test.project.not_null_curated__table",
+        "seed.project.ref__lookup",
+    ]
+    assert source.lineage_stubs == {
+        "model.project.stg__table",
+        "model.project.int__table",
+    }
+    assert [node.dbt_name for node in kept if source._is_allowed_node(node)] == [
+        "model.project.curated__table",
+        "test.project.not_null_curated__table",
+        "seed.project.ref__lookup",
+    ]
+    # the stub's own upstreams aren't needed, except through ephemeral models
+    assert kept[0].upstream_nodes == []
+    assert kept[1].upstream_nodes == ["model.project.stg__table"]
+    assert source.report.hidden_nodes_pruned == 3
+    assert source.report.lineage_stubs == 2
+
+
+def manifest_node(name, code, resource_type="model", depends_on=()):
+    return {
+        "unique_id": f"{resource_type}.project.{name}",
+        "name": name,
+        "resource_type": resource_type,
+        "database": "awsdatacatalog",
+        "schema": "db",
+        "alias": name,
+        "package_name": "project",
+        "original_file_path": f"models/{name}.sql",
+        "path": f"{name}.sql",
+        "raw_code": code,
+        "language": "sql",
+        "checksum": {"name": "sha256", "checksum": code},
+        "config": {"materialized": "test" if resource_type == "test" else "table"},
+        "tags": [] if resource_type == "test" else ["dc_display_in_catalogue"],
+        "meta": {},
+        "description": "",
+        "columns": {},
+        "depends_on": {"nodes": list(depends_on)},
+        # changes every time dbt parses the project
+        "created_at": time.time(),
+    }
+
+
+def write_dbt_artefacts(directory, db__b_code):
+    nodes = [
+        manifest_node("db__a", "select 1 as x"),
+        manifest_node("db__b", db__b_code, depends_on=["model.project.db__a"]),
+        {
+            **manifest_node(
+                "not_null_db__a_x", "", "test", depends_on=["model.project.db__a"]
+            ),
+            "test_metadata": {"name": "not_null", "kwargs": {"column_name": "x"}},
+            "column_name": "x",
+        },
+    ]
+    manifest = {
+        "metadata": {
+            "dbt_schema_version": "https://schemas.getdbt.com/dbt/manifest/v12.json",
+            "dbt_version": "1.9.0",
+            "adapter_type": "athena",
+        },
+        "nodes": {node["unique_id"]: node for node in nodes},
+        "sources": {},
+    }
+    catalog = {
+        "metadata": {
+            "dbt_schema_version": "https://schemas.getdbt.com/dbt/catalog/v1.json",
+            "dbt_version": "1.9.0",
+            "generated_at": "2024-05-15T00:00:00Z",
+        },
+        "nodes": {
+            f"model.project.{name}": {
+                "unique_id": f"model.project.{name}",
+                "metadata": {"type": "table", "schema": "db", "name": name},
+                "columns": {
+                    "x": {"name": "x", "type": "int", "index": 1, "comment": None}
+                },
+                "stats": {},
+            }
+            for name in ["db__a", "db__b"]
+        },
+        "sources": {},
+    }
+    (directory / "manifest.json").write_text(json.dumps(manifest))
+    (directory / "catalog.json").write_text(json.dumps(catalog))
+
+
+def run_incremental_ingestion(directory, run):
+    output_path = directory / f"{run}.json"
+    pipeline = Pipeline.create(
+        {
+            "pipeline_name": "cadet_test",
+            "run_id": run,
+            "source": {
+                "type": "ingestion.cadet_dbt_source.source.CadetDBTSource",
+                "config": {
+                    "manifest_path": str(directory / "manifest.json"),
+                    "catalog_path": str(directory / "catalog.json"),
+                    "target_platform": "athena",
+                    "tag_prefix": "",
+                    "write_semantics": "OVERRIDE",
+                    "skip_unchanged_nodes": True,
+                    "stateful_ingestion": {
+                        "enabled": True,
+                        "remove_stale_metadata": True,
+                        "state_provider": {
+                            "type": "file",
+                            "config": {"filename": str(directory / "state.json")},
+                        },
+                    },
+                },
+            },
+            "sink": {"type": "file", "config": {"filename": str(output_path)}},
+        }
+    )
+    pipeline.run()
+    pipeline.raise_from_status()
+    with open(output_path) as output_file:
+        records = json.load(output_file)
+    datasets = {
+        record["proposedSnapshot"][
+            "com.linkedin.pegasus2avro.metadata.snapshot.DatasetSnapshot"
+        ]["urn"]
+        for record in records
+        if "proposedSnapshot" in record
+    } | {
+        record["entityUrn"]
+        for record in records
+        if record.get("entityType") == "dataset"
+    }
+    soft_deleted = {
+        record["entityUrn"]
+        for record in records
+        if record.get("aspectName") == "status" and record["aspect"]["json"]["removed"]
+    }
+    return pipeline.source.get_report(), datasets, soft_deleted
+
+
+def test_skips_unchanged_nodes(tmp_path, monkeypatch):
+    loaded = []
+    load_file_as_json = DBTCoreSource.load_file_as_json
+
+    def counting_load_file_as_json(uri, aws_connection):
+        loaded.append(uri)
+        return load_file_as_json(uri, aws_connection)
+
+    monkeypatch.setattr(
+        DBTCoreSource, "load_file_as_json", staticmethod(counting_load_file_as_json)
+    )
+
+    write_dbt_artefacts(tmp_path, "select 2 as x")
+    report, datasets, _ = run_incremental_ingestion(tmp_path, "first")
+    assert isinstance(report, DBTCoreReport)
+    # the manifest is only read once, for loading and fingerprinting nodes
+    assert loaded.count(str(tmp_path / "manifest.json")) == 1
+    assert report.changed_nodes == 2
+    assert len(datasets) == 4
+
+    write_dbt_artefacts(tmp_path, "select 2 as x")
+    report, datasets, soft_deleted = run_incremental_ingestion(tmp_path, "second")
+    assert (report.changed_nodes, report.unchanged_nodes_skipped) == (0, 2)
+    assert datasets == set()
+    assert soft_deleted == set()
+
+    write_dbt_artefacts(tmp_path, "select 3 as x")
+    report, datasets, soft_deleted = run_incremental_ingestion(tmp_path, "third")
+    assert (report.changed_nodes, report.unchanged_nodes_skipped) == (1, 1)
+    assert datasets == {
+        "urn:li:dataset:(urn:li:dataPlatform:dbt,awsdatacatalog.db.db__b,PROD)",
+        "urn:li:dataset:(urn:li:dataPlatform:athena,awsdatacatalog.db.db__b,PROD)",
+    }
+    assert soft_deleted == set()
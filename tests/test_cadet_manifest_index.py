@@ -0,0 +1,122 @@
+import io
+import json
+import os
+import pickle
+
+import datahub.emitter.mce_builder as mce_builder
+import pytest
+
+from ingestion.cadet_manifest_index import (
+    SNAPSHOT_EXTENSION,
+    SNAPSHOT_MAGIC,
+    CadetManifestIndex,
+    SnapshotError,
+    clear_index_memo,
+    get_cadet_manifest_index,
+)
+from ingestion.config import ENV, INSTANCE, PLATFORM
+from ingestion.ingestion_utils import clear_metadata_memo, get_metadata_cache_dir
+
+with open("tests/data/manifest.json") as f:
+    test_manifest = json.load(f)
+
+MANIFEST_URI = "s3://test_bucket/prod/run_artefacts/latest/target/manifest.json"
+
+
+def dataset_urn(name):
+    return mce_builder.make_dataset_urn_with_platform_instance(
+        name=name, platform=PLATFORM, platform_instance=INSTANCE, env=ENV
+    )
+
+
+def test_index_only_contains_valid_models_and_seeds():
+    index = CadetManifestIndex.from_manifest(test_manifest)
+
+    assert sorted(entry.unique_id for entry in index) == [
+        "model.test_derived_tables.courts",
+        "model.test_derived_tables.hq",
+        "model.test_derived_tables.prison",
+        "model.test_derived_tables.prison2",
+        "model.test_derived_tables.probation",
+        "seed.test_derived_tables.nope",
+    ]
+
+
+def test_index_lookups():
+    index = CadetManifestIndex.from_manifest(test_manifest)
+
+    entry = index.get(dataset_urn("prison_database.table2"))
+    assert entry.database == "prison_database"
+    assert entry.table == "table2"
+    assert entry.domain == "prison"
+    assert entry.database_urn == "urn:li:container:b17e173b8950dee2415a3119fb7c9d12"
+    assert entry.tags == {"dc_display_in_catalogue"}
+
+    assert [e.table for e in index.for_database("prison_database")] == [
+        "table1",
+        "table2",
+    ]
+    assert [e.database for e in index.for_domain("General")] == ["ref_database"]
+    assert [e.table for e in index.of_type("seed")] == ["postcodes"]
+    assert index.get(dataset_urn("unknown.table1")) is None
+
+
+def test_get_cadet_manifest_index_is_shared():
+    index = get_cadet_manifest_index(MANIFEST_URI)
+
+    assert len(index) == 6
+    assert get_cadet_manifest_index(MANIFEST_URI) is index
+
+
+def test_snapshot_round_trip(tmp_path):
+    index = CadetManifestIndex.from_manifest(test_manifest)
+    snapshot_path = tmp_path / "manifest.index"
+    with open(snapshot_path, "wb") as snapshot_file:
+        index.write_snapshot(snapshot_file)
+
+    loaded = CadetManifestIndex.load_snapshot(str(snapshot_path))
+
+    assert loaded.entries == index.entries
+    assert loaded.by_database.keys() == index.by_database.keys()
+
+
+def test_snapshot_with_another_format_version_is_rejected(tmp_path):
+    snapshot = io.BytesIO()
+    CadetManifestIndex.from_manifest(test_manifest).write_snapshot(snapshot)
+    content = bytearray(snapshot.getvalue())
+    content[8] += 1
+    snapshot_path = tmp_path / "manifest.index"
+    snapshot_path.write_bytes(content)
+
+    with pytest.raises(SnapshotError):
+        CadetManifestIndex.load_snapshot(str(snapshot_path))
+
+
+def test_snapshot_with_unexpected_payload_is_rejected(tmp_path):
+    snapshot = io.BytesIO()
+    CadetManifestIndex.from_manifest(test_manifest).write_snapshot(snapshot)
+    header = snapshot.getvalue()[: len(SNAPSHOT_MAGIC) + 2]
+    snapshot_path = tmp_path / "manifest.index"
+    snapshot_path.write_bytes(header + pickle.dumps({"rows": []}))
+
+    with pytest.raises(SnapshotError):
+        CadetManifestIndex.load_snapshot(str(snapshot_path))
+
+
+def test_get_cadet_manifest_index_reuses_snapshot_from_another_process(monkeypatch):
+    index = get_cadet_manifest_index(MANIFEST_URI)
+    assert any(
+        file_name.endswith(SNAPSHOT_EXTENSION)
+        for file_name in os.listdir(get_metadata_cache_dir())
+    )
+
+    # a new process should load the snapshot rather than the manifest
+    clear_metadata_memo()
+    clear_index_memo()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("manifest should not be loaded")
+
+    monkeypatch.setattr("ingestion.cadet_manifest_index.get_cadet_manifest_nodes", fail)
+
+    assert get_cadet_manifest_index(MANIFEST_URI).entries == index.entries
@@ -1,12 +1,25 @@
+import json
 import os
+import re
 from datetime import datetime, timedelta, timezone
 from unittest.mock import mock_open, patch
+from urllib.parse import quote_plus
 
+import boto3
+import pytest
 import yaml
 
 from ingestion.cadet_run_results import (
+    CONSOLIDATED_RUN_RESULTS_SUFFIX,
+    PRUNED_DISCOVERY,
+    EventFile,
+    RunResultsEventIndex,
+    SqsEventQueue,
+    consolidate_run_results,
+    embedded_date,
     get_cadet_run_result_paths,
     inject_run_result_paths_into_yaml_template,
+    merge_run_results,
 )
 
 yaml_data = {
@@ -141,3 +154,387 @@ def test_get_run_result_paths(mock_datetime, mock_boto3_client):
         "s3://mojap-derived-tables/prod/run_artefacts/run_results.json",
         "s3://mojap-derived-tables/prod/run_artefacts/123/run_results.json",
     ]
+
+
+class DatedS3Client:
+    """
+    Gives each object the LastModified it would have in real run artefacts:
+    an hour after the time in its run directory's name, or the given time for
+    the others
+    """
+
+    def __init__(self, s3_client, undated_last_modified):
+        self.s3_client = s3_client
+        self.undated_last_modified = undated_last_modified
+        self.requests = []
+        self.start_after = {}
+
+    def list_objects_v2(self, **request):
+        self.requests.append((request["Prefix"], request.get("Delimiter")))
+        if "StartAfter" in request:
+            self.start_after[request["Prefix"]] = request["StartAfter"]
+        page = self.s3_client.list_objects_v2(**request)
+        for obj in page.get("Contents", []):
+            run_time = re.search(r"run_time=([^/]+)/", obj["Key"])
+            obj["LastModified"] = (
+                datetime.fromisoformat(run_time.group(1)) + timedelta(hours=1)
+                if run_time
+                else self.undated_last_modified
+            )
+        return page
+
+    def get_paginator(self, operation_name):
+        client = self
+
+        class Paginator:
+            def paginate(self, **request):
+                while True:
+                    page = client.list_objects_v2(**request)
+                    yield page
+                    if not page.get("IsTruncated"):
+                        return
+                    request["ContinuationToken"] = page["NextContinuationToken"]
+
+        return Paginator()
+
+
+def create_run_artefacts(now):
+    s3 = boto3.client("s3", region_name="eu-west-1")
+    s3.create_bucket(
+        Bucket="mojap-derived-tables",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-1"},
+    )
+    keys = ["prod/run_artefacts/run_results.json"]
+    for days_ago in range(10):
+        run_time = (now - timedelta(days=days_ago)).isoformat()
+        for workflow in ["daily", "weekly", "deploy-docs"]:
+            keys += [
+                f"prod/run_artefacts/{workflow}/run_time={run_time}/target/run_results.json",
+                f"prod/run_artefacts/{workflow}/run_time={run_time}/target/manifest.json",
+            ]
+    keys += [
+        "prod/run_artefacts/123/run_results.json",
+        "prod/run_artefacts/latest/target/run_results.json",
+    ]
+    for key in keys:
+        s3.put_object(Bucket="mojap-derived-tables", Key=key, Body=b"{}")
+    return s3
+
+
+def test_pruned_discovery_matches_full_listing():
+    now = datetime.now(timezone.utc)
+    s3 = create_run_artefacts(now)
+
+    full_client = DatedS3Client(s3, now)
+    pruned_client = DatedS3Client(s3, now)
+    full = get_cadet_run_result_paths(days=2, s3_client=full_client)
+    pruned = get_cadet_run_result_paths(
+        days=2, discovery=PRUNED_DISCOVERY, s3_client=pruned_client
+    )
+
+    assert pruned == full
+    assert len(full) == 3 + 2 * 3
+    # runs more than a day older than the cutoff aren't listed
+    listed_runs = [
+        prefix for prefix, delimiter in pruned_client.requests if delimiter is None
+    ]
+    assert len(listed_runs) == 2 * 4
+
+
+def test_embedded_dates():
+    assert embedded_date("run_time=2024-05-14T02:00:00/") == datetime(
+        2024, 5, 14, tzinfo=timezone.utc
+    )
+    assert embedded_date("20240514/") == datetime(2024, 5, 14, tzinfo=timezone.utc)
+    assert embedded_date("123/") is None
+    assert embedded_date("12345678901/") is None
+    assert embedded_date("20241399/") is None
+
+
+def test_pruned_discovery_resumes_from_cursor(tmp_path):
+    now = datetime.now(timezone.utc)
+    s3 = create_run_artefacts(now)
+    cursor_path = str(tmp_path / "cursor.json")
+
+    def discover(**kwargs):
+        client = DatedS3Client(s3, now)
+        paths = get_cadet_run_result_paths(
+            days=2,
+            discovery=PRUNED_DISCOVERY,
+            s3_client=client,
+            cursor_location=cursor_path,
+            **kwargs,
+        )
+        return paths, client.start_after
+
+    first, start_after = discover()
+    assert start_after == {}
+    with open(cursor_path) as cursor_file:
+        cursor = json.load(cursor_file)["start_after"]
+    # the oldest runs are skipped, as is deploy-docs at the root
+    assert set(cursor) == {
+        "prod/run_artefacts/daily/",
+        "prod/run_artefacts/weekly/",
+    }
+
+    new_run = (now + timedelta(minutes=1)).isoformat()
+    s3.put_object(
+        Bucket="mojap-derived-tables",
+        Key=f"prod/run_artefacts/daily/run_time={new_run}/target/run_results.json",
+        Body=b"{}",
+    )
+    second, start_after = discover()
+    assert start_after == cursor
+    assert second == get_cadet_run_result_paths(
+        days=2, s3_client=DatedS3Client(s3, now)
+    )
+    assert len(second) == len(first) + 1
+
+    third, start_after = discover(full=True)
+    assert start_after == {}
+    assert third == second
+
+
+def test_cursor_does_not_skip_overwritten_keys(tmp_path):
+    now = datetime.now(timezone.utc)
+    s3 = create_run_artefacts(now)
+    cursor_path = str(tmp_path / "cursor.json")
+    latest = "s3://mojap-derived-tables/prod/run_artefacts/latest/target/run_results.json"
+
+    def discover(undated_last_modified):
+        return get_cadet_run_result_paths(
+            days=2,
+            discovery=PRUNED_DISCOVERY,
+            s3_client=DatedS3Client(s3, undated_last_modified),
+            cursor_location=cursor_path,
+        )
+
+    assert latest not in discover(now - timedelta(days=5))
+    # the same keys are overwritten, so are modified again
+    assert latest in discover(now)
+
+
+def run_results(invocation_id, generated_at, results, which="build"):
+    return {
+        "metadata": {
+            "dbt_schema_version": "https://schemas.getdbt.com/dbt/run-results/v6.json",
+            "dbt_version": "1.9.0",
+            "generated_at": generated_at,
+            "invocation_id": invocation_id,
+        },
+        "args": {"which": which, "vars": {"huge": "unused"}},
+        "results": results,
+    }
+
+
+def result(unique_id, started_at=None, status="pass"):
+    timing = [{"name": "execute", "started_at": started_at}] if started_at else []
+    return {"unique_id": unique_id, "status": status, "timing": timing}
+
+
+def test_merge_keeps_latest_result_per_unique_id():
+    older = run_results(
+        "older",
+        "2024-05-14T03:00:00Z",
+        [
+            result("test.a", "2024-05-14T02:00:00Z", status="fail"),
+            result("model.b", "2024-05-14T02:00:00Z"),
+            # no timings, so this is as of when the file was generated
+            result("test.c"),
+        ],
+    )
+    newer = run_results(
+        "newer",
+        "2024-05-15T03:00:00Z",
+        [
+            result("test.a", "2024-05-15T02:00:00Z"),
+            result("test.c", "2024-05-14T02:30:00Z"),
+        ],
+    )
+    docs = run_results(
+        "docs", "2024-05-16T00:00:00Z", [result("test.a")], which="generate"
+    )
+
+    merged = merge_run_results([newer, older, docs])
+
+    assert merged == {
+        "run_results": [
+            {
+                "metadata": newer["metadata"],
+                "args": {"which": "build"},
+                "results": [result("test.a", "2024-05-15T02:00:00Z")],
+            },
+            {
+                "metadata": older["metadata"],
+                "args": {"which": "build"},
+                "results": [
+                    result("model.b", "2024-05-14T02:00:00Z"),
+                    result("test.c"),
+                ],
+            },
+        ]
+    }
+
+
+def test_consolidate_run_results(tmp_path):
+    paths = []
+    for invocation_id, day in [("first", 14), ("second", 15)]:
+        path = tmp_path / invocation_id / "run_results.json"
+        path.parent.mkdir()
+        path.write_text(
+            json.dumps(
+                run_results(
+                    invocation_id,
+                    f"2024-05-{day}T03:00:00Z",
+                    [result("test.a", f"2024-05-{day}T02:00:00Z")],
+                )
+            )
+        )
+        paths.append(str(path))
+    output_path = str(tmp_path / "merged" / CONSOLIDATED_RUN_RESULTS_SUFFIX)
+
+    assert consolidate_run_results(paths, output_path) == output_path
+    with open(output_path) as output_file:
+        consolidated = json.load(output_file)
+    assert [
+        document["metadata"]["invocation_id"]
+        for document in consolidated["run_results"]
+    ] == ["second"]
+
+    with pytest.raises(ValueError):
+        consolidate_run_results(paths, str(tmp_path / "run_results.json"))
+
+
+def object_event(key, event_time, event_name="ObjectCreated:Put"):
+    return {
+        "eventName": event_name,
+        "eventTime": event_time.isoformat().replace("+00:00", "Z"),
+        "s3": {
+            "bucket": {"name": "mojap-derived-tables"},
+            # keys are url encoded in event notifications
+            "object": {"key": quote_plus(key, safe="/")},
+        },
+    }
+
+
+def test_event_index(tmp_path):
+    now = datetime(2024, 5, 15, 12, tzinfo=timezone.utc)
+    recent = "prod/run_artefacts/daily/run_time=2024-05-15T02:00/run_results.json"
+    removed = "prod/run_artefacts/weekly/run_results.json"
+    events_path = tmp_path / "events.jsonl"
+    events_path.write_text(
+        "\n".join(
+            json.dumps(message)
+            for message in [
+                {"Service": "Amazon S3", "Event": "s3:TestEvent"},
+                {"Records": [object_event(recent, now - timedelta(hours=10))]},
+                # forwarded by SNS
+                {
+                    "Type": "Notification",
+                    "Message": json.dumps(
+                        {"Records": [object_event(removed, now - timedelta(hours=2))]}
+                    ),
+                },
+                {
+                    "Records": [
+                        object_event(
+                            "prod/run_artefacts/deploy-docs/run_results.json", now
+                        ),
+                        object_event("prod/run_artefacts/daily/manifest.json", now),
+                        object_event("dev/run_artefacts/run_results.json", now),
+                        object_event(
+                            "prod/run_artefacts/old/run_results.json",
+                            now - timedelta(days=8),
+                        ),
+                        object_event(removed, now, "ObjectRemoved:Delete"),
+                    ]
+                },
+            ]
+        )
+    )
+
+    index = RunResultsEventIndex(str(tmp_path / "index.json"))
+    index.load()
+    assert index.add(EventFile(str(events_path)).receive(), now) == 2
+    index.save()
+
+    index = RunResultsEventIndex(str(tmp_path / "index.json"))
+    index.load()
+    # only events received since the index started are known
+    assert (
+        index.recent_paths("mojap-derived-tables", now - timedelta(days=1), now) is None
+    )
+    index.started_at = now - timedelta(days=2)
+    assert index.recent_paths("mojap-derived-tables", now - timedelta(days=1), now) == [
+        "s3://mojap-derived-tables/prod/run_artefacts/daily/"
+        "run_time=2024-05-15T02:00/run_results.json"
+    ]
+    assert index.recent_paths("other", now - timedelta(days=1), now) == []
+    assert (
+        index.recent_paths(
+            "mojap-derived-tables", now - timedelta(days=1), now + timedelta(hours=7)
+        )
+        is None
+    )
+
+
+def test_event_index_skips_malformed_events():
+    now = datetime(2024, 5, 15, 12, tzinfo=timezone.utc)
+    key = "prod/run_artefacts/daily/run_time=2024-05-15T02:00/run_results.json"
+    messages = [
+        {"Records": [{"eventName": "s3:TestEvent"}, object_event(key, now)]},
+        {"Records": [{**object_event(key, now), "eventTime": "yesterday"}]},
+        {"Type": "Notification", "Message": "not json"},
+        "not a message",
+    ]
+
+    index = RunResultsEventIndex("index.json")
+    assert index.add(messages, now) == 1
+    assert index.skipped_records == 4
+
+
+class FailingListS3Client:
+    def __init__(self, s3_client):
+        self.s3_client = s3_client
+
+    def list_objects_v2(self, **request):
+        raise AssertionError("listed the bucket")
+
+    def __getattr__(self, name):
+        return getattr(self.s3_client, name)
+
+
+def test_event_index_from_sqs(tmp_path):
+    now = datetime.now(timezone.utc)
+    s3 = create_run_artefacts(now)
+    sqs = boto3.client("sqs", region_name="eu-west-1")
+    queue_url = sqs.create_queue(QueueName="run-artefacts")["QueueUrl"]
+    key = f"prod/run_artefacts/daily/run_time={now.isoformat()}/target/run_results.json"
+    sqs.send_message(
+        QueueUrl=queue_url,
+        MessageBody=json.dumps({"Records": [object_event(key, now)]}),
+    )
+    index_path = str(tmp_path / "index.json")
+
+    # a new index doesn't cover the last day yet, so the bucket is listed
+    listed = get_cadet_run_result_paths(
+        days=1,
+        s3_client=s3,
+        event_index=RunResultsEventIndex(index_path),
+        event_source=SqsEventQueue(sqs, queue_url),
+    )
+    assert f"s3://mojap-derived-tables/{key}" in listed
+    assert "Messages" not in sqs.receive_message(QueueUrl=queue_url)
+
+    with open(index_path) as index_file:
+        saved = json.load(index_file)
+    saved["started_at"] = (now - timedelta(days=2)).isoformat()
+    with open(index_path, "w") as index_file:
+        json.dump(saved, index_file)
+
+    assert get_cadet_run_result_paths(
+        days=1,
+        s3_client=FailingListS3Client(s3),
+        event_index=RunResultsEventIndex(index_path),
+        event_source=SqsEventQueue(sqs, queue_url),
+    ) == [f"s3://mojap-derived-tables/{key}"]
@@ -1,12 +1,29 @@
+import io
 import json
+import os
 
+import boto3
 import pytest
+from botocore.exceptions import ClientError
 
 from ingestion.ingestion_utils import (
+    EXCLUDED_NAME_MATCHER,
+    FQN_MULTIPLE_DOUBLE_UNDERSCORES,
+    FQN_NOT_DATABASE_TABLE,
+    JSON_DECODERS,
+    clear_metadata_memo,
+    decode_json,
+    FqnValidationSummary,
+    download_s3_object,
+    get_cadet_manifest_nodes,
+    get_cadet_metadata_json,
+    get_metadata_cache_dir,
     get_tags,
     is_excluded_name,
+    iter_manifest_nodes,
     parse_database_and_table_names,
     should_display_dbt_manifest_node,
+    validate_fqn,
 )
 
 with open("tests/data/manifest.json") as f:
@@ -44,6 +61,29 @@ def test_parse_database_and_table_names(node, database, table):
     assert table_name == table
 
 
+def test_validate_fqn():
+    assert validate_fqn(["model", "prison", "prison_database__table1"])
+    assert validate_fqn(["model", "prison", "prison__database__table1"])
+    assert not validate_fqn(["model", "prison", "invalid_tablename"], log=False)
+
+
+def test_fqn_validation_summary_buckets_problems():
+    summary = FqnValidationSummary()
+    fqns = [
+        ["model", "prison", "prison_database__table1"],
+        ["model", "prison", "prison__database__table1"],
+        ["model", "prison", "invalid_tablename"],
+        ["model", "prison", "also_invalid"],
+    ]
+
+    assert [summary.validate(fqn) for fqn in fqns] == [True, True, False, False]
+    assert summary.checked == 4
+    assert summary.problems == {
+        FQN_MULTIPLE_DOUBLE_UNDERSCORES: ["prison__database__table1"],
+        FQN_NOT_DATABASE_TABLE: ["invalid_tablename", "also_invalid"],
+    }
+
+
 @pytest.mark.parametrize(
     "name, expected",
     [
@@ -72,6 +112,32 @@ def test_should_display_dbt_manifest_node_false_when_excluded_keyword_present():
     assert should_display_dbt_manifest_node(node) is False
 
 
+def test_excluded_name_matcher_reports_field_and_pattern():
+    fields = {
+        "unique_id": "model.project.curated__orders",
+        "schema": None,
+        "name": "Orders_TESTING",
+        "alias": "dev_orders",
+    }
+
+    assert EXCLUDED_NAME_MATCHER.match_fields(fields) == ("name", "testing")
+    assert EXCLUDED_NAME_MATCHER.match_fields({"name": "curated__orders"}) is None
+
+
+def test_excluded_name_matcher_batch():
+    nodes = [
+        ("a", {"name": "curated__orders", "alias": "intermediate"}),
+        ("b", {"name": "curated__orders"}),
+        ("c", {"schema": "x", "name": "st", "alias": "g"}),
+        ("d", {"schema": "stg_fms"}),
+    ]
+
+    assert EXCLUDED_NAME_MATCHER.match_nodes(nodes) == {
+        "a": ("alias", "intermediate"),
+        "d": ("schema", "stg"),
+    }
+
+
 def test_get_tags_omits_display_tag_for_excluded_node():
     node = {
         "tags": ["dc_display_in_catalogue"],
@@ -107,3 +173,169 @@ def test_get_tags_adds_display_tag_for_displayable_seed():
     }
 
     assert get_tags(node) == {"dc_display_in_catalogue"}
+
+
+MANIFEST_URI = "s3://test_bucket/prod/run_artefacts/latest/target/manifest.json"
+
+
+def test_get_cadet_metadata_json_parses_once_per_process():
+    first = get_cadet_metadata_json(MANIFEST_URI)
+    second = get_cadet_metadata_json(MANIFEST_URI)
+
+    assert first is second
+    assert first == test_manifest
+
+
+def test_get_cadet_metadata_json_can_skip_memoizing():
+    first = get_cadet_metadata_json(MANIFEST_URI, memoize=False)
+    second = get_cadet_metadata_json(MANIFEST_URI)
+
+    assert first is not second
+    assert first == second == test_manifest
+
+
+def test_get_cadet_metadata_json_uses_given_client(monkeypatch):
+    s3_client = boto3.client("s3")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("a new client should not be created")
+
+    monkeypatch.setattr("ingestion.ingestion_utils.boto3.client", fail)
+
+    assert get_cadet_metadata_json(MANIFEST_URI, s3=s3_client) == test_manifest
+
+
+def test_get_cadet_manifest_nodes_uses_given_client(monkeypatch):
+    s3_client = boto3.client("s3")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("a new client should not be created")
+
+    monkeypatch.setattr("ingestion.ingestion_utils.boto3.client", fail)
+
+    manifest = get_cadet_manifest_nodes(MANIFEST_URI, s3=s3_client)
+    assert manifest["nodes"].keys() == test_manifest["nodes"].keys()
+
+
+def test_get_cadet_metadata_json_reuses_on_disk_cache(monkeypatch):
+    get_cadet_metadata_json(MANIFEST_URI)
+    assert len(os.listdir(get_metadata_cache_dir())) == 1
+
+    # simulate a new process that can see the cache written by the first one
+    clear_metadata_memo()
+    s3_client = boto3.client("s3")
+    get_object_calls = []
+    monkeypatch.setattr(
+        "ingestion.ingestion_utils.boto3.client", lambda *args, **kwargs: s3_client
+    )
+    original_get_object = s3_client.get_object
+
+    def counting_get_object(**kwargs):
+        get_object_calls.append(kwargs)
+        return original_get_object(**kwargs)
+
+    monkeypatch.setattr(s3_client, "get_object", counting_get_object)
+
+    assert get_cadet_metadata_json(MANIFEST_URI) == test_manifest
+    assert get_object_calls == []
+
+
+def test_get_cadet_metadata_json_reloads_changed_object():
+    first = get_cadet_metadata_json(MANIFEST_URI)
+
+    boto3.client("s3").put_object(
+        Bucket="test_bucket",
+        Key="prod/run_artefacts/latest/target/manifest.json",
+        Body=json.dumps({"nodes": {}}).encode("utf-8"),
+    )
+    second = get_cadet_metadata_json(MANIFEST_URI)
+
+    assert first == test_manifest
+    assert second == {"nodes": {}}
+    # the copy of the old version is replaced rather than kept alongside
+    assert len(os.listdir(get_metadata_cache_dir())) == 1
+
+
+def test_metadata_cache_dir_is_private():
+    get_cadet_metadata_json(MANIFEST_URI)
+
+    assert os.stat(get_metadata_cache_dir()).st_mode & 0o777 == 0o700
+
+
+def test_iter_manifest_nodes_only_keeps_catalogue_fields():
+    manifest = {
+        "metadata": {"dbt_version": "1.7.0"},
+        "nodes": {
+            "model.project.prison_database__table1": {
+                "resource_type": "model",
+                "fqn": ["project", "prison", "prison_database__table1"],
+                "schema": "prison_database",
+                "tags": ["dc_display_in_catalogue"],
+                "compiled_code": "select *\nfrom somewhere",
+                "depends_on": {"nodes": ["source.project.a"]},
+            }
+        },
+        "sources": {"source.project.a": {"resource_type": "source"}},
+    }
+    # raw control characters are accepted, as they are by json.loads(strict=False)
+    content = json.dumps(manifest).replace("\\n", "\n").encode("utf-8")
+
+    nodes = list(iter_manifest_nodes(io.BytesIO(content)))
+
+    assert nodes == [
+        (
+            "model.project.prison_database__table1",
+            {
+                "resource_type": "model",
+                "fqn": ["project", "prison", "prison_database__table1"],
+                "schema": "prison_database",
+                "tags": ["dc_display_in_catalogue"],
+            },
+        )
+    ]
+
+
+def test_get_cadet_manifest_nodes_streams_and_caches_manifest():
+    manifest = get_cadet_manifest_nodes(MANIFEST_URI)
+
+    assert manifest == test_manifest
+    assert get_cadet_manifest_nodes(MANIFEST_URI) is manifest
+    # the streamed download is kept for get_cadet_metadata_json to reuse
+    assert len(os.listdir(get_metadata_cache_dir())) == 1
+    assert get_cadet_metadata_json(MANIFEST_URI) == test_manifest
+
+
+def test_download_s3_object_in_ranges():
+    s3_client = boto3.client("s3")
+    with open("tests/data/manifest.json", "rb") as f:
+        expected = f.read()
+
+    content = download_s3_object(
+        s3_client, MANIFEST_URI, len(expected), part_size=100, max_concurrency=4
+    )
+
+    assert isinstance(content, bytearray)
+    assert content == expected
+
+
+def test_download_s3_object_fails_if_object_changed():
+    s3_client = boto3.client("s3")
+
+    with pytest.raises(ClientError):
+        download_s3_object(s3_client, MANIFEST_URI, 100, etag='"not-the-etag"')
+
+
+@pytest.mark.parametrize("decoder", [None, *JSON_DECODERS, "not_installed"])
+def test_decode_json_accepts_control_characters(decoder):
+    content = b'{"description": "line one\nline two"}'
+
+    assert decode_json(content, decoder) == {"description": "line one\nline two"}
+
+
+def test_decode_json_warns_about_missing_decoder(caplog):
+    assert decode_json(b'{"a": 1}', "missing") == {"a": 1}
+    assert "JSON decoder missing is not available" in caplog.text
+
+
+def test_get_cadet_manifest_nodes_with_whole_manifest_decoder():
+    assert get_cadet_manifest_nodes(MANIFEST_URI, decoder="json") == test_manifest
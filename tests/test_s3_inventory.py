@@ -0,0 +1,122 @@
+import gzip
+import json
+from datetime import datetime, timezone
+
+import boto3
+import pytest
+
+from ingestion.s3_inventory import InventoryIndex, load_inventory
+
+LOCATIONS = [
+    "s3://derived/db/table1/",
+    "s3://derived/db/table1/nested/",
+    "s3://derived/db/table2",
+    "s3://derived/db/empty/",
+]
+
+ROWS = [
+    ("derived", "db/table1/part-0", "10", "2024-01-01T00:00:00.000Z"),
+    ("derived", "db/table1/part-1", "10", "2024-03-01T00:00:00.000Z"),
+    ("derived", "db/table1/nested/part-0", "10", "2024-05-01T00:00:00.000Z"),
+    (
+        "derived",
+        "db/table2/snapshot_date%3D2024-01-01/file+1",
+        "10",
+        "2024-02-01T00:00:00.000Z",
+    ),
+    ("derived", "db/untracked/part-0", "10", "2024-06-01T00:00:00.000Z"),
+    # a sibling of db/table2, not part of it
+    ("derived", "db/table2_old/part-0", "10", "2024-06-01T00:00:00.000Z"),
+    ("other", "db/table2/part-0", "10", "2024-06-01T00:00:00.000Z"),
+]
+
+EXPECTED = {
+    "s3://derived/db/empty/": None,
+    "s3://derived/db/table1/": datetime(2024, 3, 1, tzinfo=timezone.utc),
+    "s3://derived/db/table1/nested/": datetime(2024, 5, 1, tzinfo=timezone.utc),
+    "s3://derived/db/table2": datetime(2024, 2, 1, tzinfo=timezone.utc),
+}
+
+
+def inventory_csv(rows):
+    return "".join(",".join(f'"{value}"' for value in row) + "\n" for row in rows)
+
+
+def latest_from(inventory):
+    index = InventoryIndex(LOCATIONS)
+    index.add_inventory(inventory)
+    return index
+
+
+def test_local_directory_of_csv_files(tmp_path):
+    with gzip.open(tmp_path / "part-0.csv.gz", "wt") as inventory_file:
+        inventory_file.write(inventory_csv(ROWS[:3]))
+    (tmp_path / "part-1.csv").write_text(inventory_csv(ROWS[3:]))
+
+    index = latest_from(load_inventory(str(tmp_path)))
+
+    assert index.latest == EXPECTED
+    assert index.rows == len(ROWS)
+
+
+def test_local_manifest(tmp_path):
+    with gzip.open(tmp_path / "data.csv.gz", "wt") as inventory_file:
+        inventory_file.write(inventory_csv((row[1], row[3], row[0]) for row in ROWS))
+    (tmp_path / "manifest.json").write_text(
+        json.dumps(
+            {
+                "fileFormat": "CSV",
+                "fileSchema": "Key, LastModifiedDate, Bucket",
+                "files": [{"key": "inventory/data/data.csv.gz"}],
+            }
+        )
+    )
+
+    assert latest_from(load_inventory(str(tmp_path))).latest == EXPECTED
+
+
+def test_s3_manifest():
+    s3 = boto3.client("s3", region_name="eu-west-1")
+    s3.create_bucket(
+        Bucket="inventory",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-1"},
+    )
+    s3.put_object(
+        Bucket="inventory",
+        Key="derived/config/data/part-0.csv.gz",
+        Body=gzip.compress(inventory_csv(ROWS).encode()),
+    )
+    s3.put_object(
+        Bucket="inventory",
+        Key="derived/config/2024-06-02T01-00Z/manifest.json",
+        Body=json.dumps(
+            {
+                "sourceBucket": "derived",
+                "destinationBucket": "arn:aws:s3:::inventory",
+                "fileFormat": "CSV",
+                "fileSchema": "Bucket, Key, Size, LastModifiedDate",
+                "files": [{"key": "derived/config/data/part-0.csv.gz"}],
+            }
+        ),
+    )
+
+    inventory = load_inventory(
+        "s3://inventory/derived/config/2024-06-02T01-00Z/manifest.json", s3
+    )
+
+    assert latest_from(inventory).latest == EXPECTED
+
+
+def test_other_formats_are_not_supported(tmp_path):
+    (tmp_path / "manifest.json").write_text(
+        json.dumps(
+            {
+                "fileFormat": "Parquet",
+                "fileSchema": "message s3.inventory { }",
+                "files": [{"key": "inventory/data/data.parquet"}],
+            }
+        )
+    )
+
+    with pytest.raises(ValueError):
+        latest_from(load_inventory(str(tmp_path)))
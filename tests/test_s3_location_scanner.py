@@ -0,0 +1,156 @@
+from datetime import datetime, timezone
+
+import boto3
+from botocore.exceptions import ClientError
+
+from ingestion.s3_location_scanner import S3LocationScanner
+
+
+def client_error(code):
+    return ClientError({"Error": {"Code": code}}, "ListObjectsV2")
+
+
+class FlakyS3Client:
+    """Fails each listing with the given errors before succeeding"""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+
+    def list_objects_v2(self, **request):
+        if self.errors:
+            raise self.errors.pop(0)
+        return {
+            "Contents": [
+                {
+                    "Key": "a/table1/part-0",
+                    "LastModified": datetime(2026, 1, 1, tzinfo=timezone.utc),
+                },
+                {
+                    "Key": "a/table1/part-1",
+                    "LastModified": datetime(2026, 3, 1, tzinfo=timezone.utc),
+                },
+            ]
+        }
+
+
+def test_scans_many_locations():
+    s3 = boto3.client("s3", region_name="eu-west-1")
+    s3.create_bucket(
+        Bucket="derived",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-1"},
+    )
+    for key in ["a/table1/part-0", "a/table1/part-1", "a/table2/part-0"]:
+        s3.put_object(Bucket="derived", Key=key, Body=b"")
+
+    scanner = S3LocationScanner(s3, max_workers=4, max_in_flight_per_bucket=2)
+    results = scanner.latest_last_modified(
+        [
+            "s3://derived/a/table2",
+            "s3://derived/a/table1",
+            "s3://derived/a/empty",
+            "s3://derived/a/table1",
+            "not-s3",
+        ]
+    )
+
+    assert list(results) == [
+        "not-s3",
+        "s3://derived/a/empty",
+        "s3://derived/a/table1",
+        "s3://derived/a/table2",
+    ]
+    assert results["not-s3"] is None
+    assert results["s3://derived/a/empty"] is None
+    assert results["s3://derived/a/table1"] is not None
+    assert scanner.list_calls == 3
+
+
+def test_retries_when_throttled():
+    scanner = S3LocationScanner(
+        FlakyS3Client([client_error("SlowDown"), client_error("SlowDown")]),
+        initial_backoff_seconds=0,
+    )
+
+    results = scanner.latest_last_modified(["s3://derived/a/table1"])
+
+    assert results["s3://derived/a/table1"] == datetime(2026, 3, 1, tzinfo=timezone.utc)
+    assert scanner.list_calls == 3
+    assert scanner.throttled_calls == 2
+
+
+def test_gives_up_on_other_errors_and_too_many_retries():
+    scanner = S3LocationScanner(
+        FlakyS3Client([client_error("AccessDenied")]), initial_backoff_seconds=0
+    )
+    assert scanner.latest_last_modified(["s3://derived/a"]) == {"s3://derived/a": None}
+
+    scanner = S3LocationScanner(
+        FlakyS3Client([client_error("SlowDown")] * 3),
+        max_retries=2,
+        initial_backoff_seconds=0,
+    )
+    assert scanner.latest_last_modified(["s3://derived/a"]) == {"s3://derived/a": None}
+    assert scanner.throttled_calls == 3
+
+
+class RecordingS3Client:
+    """Records the prefix and delimiter of each listing"""
+
+    def __init__(self, s3_client):
+        self.s3_client = s3_client
+        self.requests = []
+
+    def list_objects_v2(self, **request):
+        self.requests.append((request["Prefix"], request.get("Delimiter")))
+        return self.s3_client.list_objects_v2(**request)
+
+
+def test_scans_newest_partition_only():
+    s3 = boto3.client("s3", region_name="eu-west-1")
+    s3.create_bucket(
+        Bucket="derived",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-1"},
+    )
+    for key in [
+        "db/table/snapshot_date=2024-01-01/part=9/file",
+        "db/table/snapshot_date=2024-02-01/part=9/file",
+        "db/table/snapshot_date=2024-02-01/part=10/file",
+        "db/table/_SUCCESS",
+        "db/unpartitioned/file",
+    ]:
+        s3.put_object(Bucket="derived", Key=key, Body=b"")
+
+    client = RecordingS3Client(s3)
+    scanner = S3LocationScanner(client, max_workers=1)
+    results = scanner.latest_last_modified(
+        ["s3://derived/db/table", "s3://derived/db/unpartitioned/"],
+        {"s3://derived/db/table": [("snapshot_date", "date"), ("part", "int")]},
+    )
+
+    assert all(results.values())
+    assert scanner.partitioned_scans == 1
+    assert sorted(client.requests) == [
+        ("db/table/", "/"),
+        ("db/table/snapshot_date=2024-02-01/", "/"),
+        # part is an int, so 10 is newer than 9
+        ("db/table/snapshot_date=2024-02-01/part=10/", None),
+        ("db/unpartitioned/", None),
+    ]
+
+
+def test_partitioned_scan_falls_back_to_full_listing():
+    s3 = boto3.client("s3", region_name="eu-west-1")
+    s3.create_bucket(
+        Bucket="derived",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-1"},
+    )
+    s3.put_object(Bucket="derived", Key="db/table/not_a_partition/file", Body=b"")
+
+    client = RecordingS3Client(s3)
+    results = S3LocationScanner(client).latest_last_modified(
+        ["s3://derived/db/table/"],
+        {"s3://derived/db/table/": [("snapshot_date", "date")]},
+    )
+
+    assert results["s3://derived/db/table/"] is not None
+    assert client.requests == [("db/table/", "/"), ("db/table/", None)]
@@ -0,0 +1,101 @@
+import boto3
+
+from ingestion.s3_location_scanner import S3LocationScanner
+from ingestion.s3_scan_planner import LocationTrie, ScanListing, ScanPlanner
+
+
+def test_location_trie_routes_to_deepest_location():
+    trie = LocationTrie()
+    trie.add("db/table1/", "s3://bucket/db/table1/")
+    trie.add("db/table1/nested", "s3://bucket/db/table1/nested")
+    trie.add("db/table10", "s3://bucket/db/table10")
+
+    assert trie.route("db/table1/part-0") == "s3://bucket/db/table1/"
+    assert trie.route("db/table1/nested/part-0") == "s3://bucket/db/table1/nested"
+    assert trie.route("db/table10/part-0") == "s3://bucket/db/table10"
+    assert trie.route("db/other/part-0") is None
+    assert trie.route("db/table10") is None
+
+
+def test_small_tables_share_a_listing():
+    locations = [f"s3://bucket/db/table{i}/" for i in range(5)]
+
+    assert ScanPlanner().plan(locations) == [
+        ScanListing("bucket", "db/", tuple(sorted(locations)))
+    ]
+
+
+def test_large_tables_are_listed_separately():
+    locations = ["s3://bucket/db/table1/", "s3://bucket/db/table2/", "not-s3"]
+    planner = ScanPlanner(estimate_objects=lambda location: 5000)
+
+    assert planner.plan(locations) == [
+        ScanListing("bucket", "db/table1/", ("s3://bucket/db/table1/",)),
+        ScanListing("bucket", "db/table2/", ("s3://bucket/db/table2/",)),
+    ]
+
+
+def test_buckets_and_single_tables_are_not_shared():
+    locations = ["s3://bucket/db1/table1", "s3://bucket/db2/table1", "s3://other/t"]
+
+    assert [listing.prefix for listing in ScanPlanner().plan(locations)] == [
+        "db1/table1/",
+        "db2/table1/",
+        "t/",
+    ]
+
+
+def test_shared_listing_gives_same_results_as_separate_listings():
+    s3 = boto3.client("s3", region_name="eu-west-1")
+    s3.create_bucket(
+        Bucket="derived",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-1"},
+    )
+    keys = [
+        "db/table1/part-0",
+        "db/table1/part-1",
+        "db/table2/part-0",
+        "db/table3/nested/part-0",
+        "db/untracked/part-0",
+    ]
+    for key in keys:
+        s3.put_object(Bucket="derived", Key=key, Body=b"")
+    locations = [
+        "s3://derived/db/table1/",
+        "s3://derived/db/table2",
+        "s3://derived/db/table3/",
+        "s3://derived/db/empty/",
+    ]
+
+    separate = S3LocationScanner(s3)
+    shared = S3LocationScanner(s3, planner=ScanPlanner())
+
+    assert shared.latest_last_modified(locations) == separate.latest_last_modified(
+        locations
+    )
+    assert shared.shared_listings == 1
+    assert shared.list_calls == 1
+    assert separate.list_calls == 4
+    # the shared listing's cost is split between its locations
+    assert sum(cost.pages for cost in shared.costs.values()) == 1
+    assert sum(cost.objects for cost in shared.costs.values()) == 5
+
+
+def test_sibling_prefixes_are_not_part_of_a_table():
+    s3 = boto3.client("s3", region_name="eu-west-1")
+    s3.create_bucket(
+        Bucket="derived",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-1"},
+    )
+    s3.put_object(Bucket="derived", Key="db/t_old/part-0", Body=b"")
+    s3.put_object(Bucket="derived", Key="db/u/part-0", Body=b"")
+    locations = ["s3://derived/db/t", "s3://derived/db/u"]
+
+    separate = S3LocationScanner(s3).latest_last_modified(locations)
+    shared = S3LocationScanner(s3, planner=ScanPlanner()).latest_last_modified(
+        locations
+    )
+
+    assert separate == shared
+    assert separate["s3://derived/db/t"] is None
+    assert separate["s3://derived/db/u"] is not None
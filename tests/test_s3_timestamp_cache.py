@@ -0,0 +1,40 @@
+from datetime import datetime, timezone
+
+from ingestion.s3_timestamp_cache import CachedScan, LocationTimestampCache
+
+SCANNED_AT = 1_000_000.0
+UPDATED = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def test_stores_scans_between_runs(tmp_path):
+    path = str(tmp_path / "cache" / "timestamps.sqlite")
+    scans = [
+        CachedScan(
+            "s3://derived/db/table1",
+            datetime(2026, 3, 1, tzinfo=timezone.utc),
+            2,
+            20,
+            SCANNED_AT,
+            UPDATED,
+        ),
+        CachedScan("s3://derived/db/partitioned", None, None, None, SCANNED_AT, None),
+    ]
+    cache = LocationTimestampCache(path, ttl_seconds=60)
+    cache.store(scans)
+    cache.close()
+
+    cache = LocationTimestampCache(path, ttl_seconds=60)
+    loaded = cache.load(["s3://derived/db/table1", "s3://derived/db/partitioned", "x"])
+    assert loaded == {scan.location: scan for scan in scans}
+
+
+def test_scans_expire_or_change_in_glue(tmp_path):
+    cache = LocationTimestampCache(str(tmp_path / "timestamps.sqlite"), 60)
+    scan = CachedScan("s3://derived/db/table1", None, 0, 0, SCANNED_AT, UPDATED)
+
+    assert cache.is_fresh(scan, UPDATED, now=SCANNED_AT + 59)
+    assert cache.is_fresh(scan, None, now=SCANNED_AT + 59)
+    assert not cache.is_fresh(scan, UPDATED, now=SCANNED_AT + 60)
+    assert not cache.is_fresh(
+        scan, datetime(2026, 2, 1, tzinfo=timezone.utc), now=SCANNED_AT + 1
+    )
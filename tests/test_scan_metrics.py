@@ -0,0 +1,53 @@
+import json
+import os
+
+from ingestion.scan_metrics import TableScanMetrics, top_tables, write_metrics
+
+METRICS = [
+    TableScanMetrics("db.fast", "s3://derived/db/fast", 0.1, 1, 10, 0.1),
+    TableScanMetrics("db.slow", "s3://derived/db/slow", 0.1, 20, 20000, 5.0),
+    TableScanMetrics("db.glue", "s3://derived/db/glue", 2.0, 1, 10, 0.1),
+]
+
+
+def test_top_tables_are_slowest_first():
+    assert [table["table"] for table in top_tables(METRICS, 2)] == [
+        "db.slow",
+        "db.glue",
+    ]
+
+
+def test_writes_json(tmp_path):
+    path = tmp_path / "metrics" / "scan.json"
+    write_metrics(METRICS, str(path))
+
+    written = json.loads(path.read_text())
+    assert [table["table"] for table in written] == ["db.fast", "db.slow", "db.glue"]
+    assert written[1]["pages"] == 20
+
+
+def test_writes_prometheus_text_format(tmp_path):
+    path = tmp_path / "scan.prom"
+    write_metrics(METRICS, str(path))
+
+    lines = path.read_text().splitlines()
+    assert "# TYPE cadet_latest_file_timestamp_pages gauge" in lines
+    assert (
+        'cadet_latest_file_timestamp_pages{table="db.slow",'
+        'location="s3://derived/db/slow"} 20' in lines
+    )
+
+
+def test_escapes_prometheus_label_values(tmp_path):
+    path = tmp_path / "scan.prom"
+    write_metrics(
+        [TableScanMetrics('db."odd"', "s3://derived/db/back\\slash\nline", pages=1)],
+        str(path),
+    )
+
+    assert (
+        'cadet_latest_file_timestamp_pages{table="db.\\"odd\\"",'
+        'location="s3://derived/db/back\\\\slash\\nline"} 1'
+    ) in path.read_text().splitlines()
+    # only the finished file is left in the directory
+    assert os.listdir(tmp_path) == ["scan.prom"]
@@ -0,0 +1,40 @@
+import datahub.emitter.mce_builder as mce_builder
+import datahub.emitter.mcp_builder as mcp_builder
+
+from ingestion import urns
+from ingestion.config import ENV, INSTANCE, PLATFORM
+
+
+def test_urns_match_datahub_builders():
+    assert (
+        urns.database_urn("prison_database")
+        == mcp_builder.DatabaseKey(
+            database="prison_database",
+            platform=PLATFORM,
+            instance=INSTANCE,
+            env=ENV,
+            backcompat_env_as_instance=True,
+        ).as_urn()
+    )
+    assert urns.dataset_urn(
+        "prison_database.table1"
+    ) == mce_builder.make_dataset_urn_with_platform_instance(
+        name="prison_database.table1",
+        platform=PLATFORM,
+        platform_instance=INSTANCE,
+        env=ENV,
+    )
+    assert urns.tag_urn("Prison") == mce_builder.make_tag_urn("Prison")
+
+
+def test_urn_cache_stats():
+    urns.clear_urn_caches()
+
+    for _ in range(3):
+        urns.database_urn("prison_database")
+    urns.database_urn("probation_database")
+
+    stats = urns.urn_cache_stats()
+    assert stats["database_urn"] == {"hits": 2, "misses": 2, "size": 2}
+    assert stats["database_key"]["misses"] == 2
+    assert stats["tag_urn"] == {"hits": 0, "misses": 0, "size": 0}
@@ -63,3 +63,11 @@ def test_report_generate_time(caplog):
         messages[0],
     )
     assert "function=foo, " in messages[0]
+
+
+def test_stopwatch_as_context_manager():
+    with Stopwatch() as s:
+        assert s.running
+
+    assert not s.running
+    assert s.elapsed >= 0